@@ -0,0 +1,230 @@
+"""Кэш в файле SQLite, общий для всех процессов на одном хосте.
+
+В отличие от LocMemCache копия кэша одна на все воркеры gunicorn, и
+инвалидация из одного процесса видна остальным. Внешний сервис не нужен:
+файл открывается в режиме WAL, читатели не блокируют писателя.
+
+Размер ограничен MAX_SIZE байт и MAX_ENTRIES записей; при превышении
+удаляются просроченные записи, а затем давно не читавшиеся (LRU).
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL,'
+    ' accessed REAL NOT NULL, size INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE TABLE IF NOT EXISTS cache_stats ('
+    ' id INTEGER PRIMARY KEY CHECK (id = 0),'
+    ' entries INTEGER NOT NULL, size INTEGER NOT NULL)',
+    'INSERT OR IGNORE INTO cache_stats VALUES (0, 0, 0)',
+    'CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN'
+    ' UPDATE cache_stats SET entries = entries + 1, size = size + NEW.size;'
+    ' END',
+    'CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN'
+    ' UPDATE cache_stats SET entries = entries - 1, size = size - OLD.size;'
+    ' END',
+    'CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache'
+    ' BEGIN UPDATE cache_stats SET size = size - OLD.size + NEW.size; END',
+)
+# Время последнего чтения обновляется не чаще раза в секунду, чтобы
+# горячие ключи не превращали каждое чтение в запись.
+ACCESS_RESOLUTION = 1.0
+# Ограничение SQLite на число параметров в запросе.
+QUERY_CHUNK = 500
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+
+    def _connection(self):
+        # Соединение своё у каждого потока и у каждого процесса после fork.
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self._path,
+                                         timeout=self._busy_timeout,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            # Иначе INSERT OR REPLACE не вызывает триггер удаления и
+            # счётчики cache_stats расходятся с таблицей.
+            connection.execute('PRAGMA recursive_triggers=ON')
+            with connection:
+                for statement in SCHEMA:
+                    connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def _write(self):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        return connection
+
+    def _fetch(self, connection, keys):
+        now = time.time()
+        rows = []
+        for start in range(0, len(keys), QUERY_CHUNK):
+            chunk = keys[start:start + QUERY_CHUNK]
+            rows += connection.execute(
+                'SELECT key, value, expires, accessed FROM cache'
+                ' WHERE key IN (%s)' % ','.join('?' * len(chunk)), chunk
+            ).fetchall()
+        found, expired, touched = {}, [], []
+        for key, value, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                expired.append(key)
+                continue
+            found[key] = pickle.loads(value)
+            if now - accessed > ACCESS_RESOLUTION:
+                touched.append(key)
+        if expired or touched:
+            with connection:
+                connection.executemany('DELETE FROM cache WHERE key = ?'
+                                       ' AND expires <= ?',
+                                       [(key, now) for key in expired])
+                connection.executemany(
+                    'UPDATE cache SET accessed = ? WHERE key = ?',
+                    [(now, key) for key in touched]
+                )
+        return found
+
+    def _store(self, connection, key, value, timeout):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        connection.execute(
+            'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)',
+            (key, data, self.get_backend_timeout(timeout), time.time(),
+             len(data)),
+        )
+
+    def _cull(self, connection):
+        entries, size = connection.execute(
+            'SELECT entries, size FROM cache_stats'
+        ).fetchone()
+        if entries <= self._max_entries and size <= self._max_size:
+            return
+        connection.execute('DELETE FROM cache WHERE expires <= ?',
+                           (time.time(),))
+        while True:
+            entries, size = connection.execute(
+                'SELECT entries, size FROM cache_stats'
+            ).fetchone()
+            if (entries == 0 or entries <= self._max_entries
+                    and size <= self._max_size):
+                return
+            if self._cull_frequency == 0:
+                connection.execute('DELETE FROM cache')
+                return
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache'
+                ' ORDER BY accessed LIMIT ?)',
+                (max(entries // self._cull_frequency, 1),),
+            )
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._fetch(self._connection(), [key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        made = {self.make_key(key, version=version): key for key in keys}
+        for key in made:
+            self.validate_key(key)
+        if not made:
+            return {}
+        found = self._fetch(self._connection(), list(made))
+        return {made[key]: value for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._write()
+        with connection:
+            self._store(connection, key, value, timeout)
+            self._cull(connection)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        connection = self._write()
+        with connection:
+            for key, value in data.items():
+                key = self.make_key(key, version=version)
+                self.validate_key(key)
+                self._store(connection, key, value, timeout)
+            self._cull(connection)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._write()
+        with connection:
+            exists = connection.execute(
+                'SELECT 1 FROM cache WHERE key = ?'
+                ' AND (expires IS NULL OR expires > ?)', (key, time.time())
+            ).fetchone()
+            if exists:
+                return False
+            self._store(connection, key, value, timeout)
+            self._cull(connection)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._write()
+        with connection:
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or row[1] is not None and row[1] <= time.time():
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            connection.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (data, len(data), key),
+            )
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._write()
+        with connection:
+            updated = connection.execute(
+                'UPDATE cache SET expires = ? WHERE key = ?'
+                ' AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, time.time()),
+            ).rowcount
+        return bool(updated)
+
+    def has_key(self, key, version=None):
+        return self.get(key, version=version) is not None
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._write()
+        with connection:
+            connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def clear(self):
+        connection = self._write()
+        with connection:
+            connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединения живут всё время работы потока: их открытие дороже
+        # самих операций с кэшем.
+        pass
@@ -0,0 +1,219 @@
+"""Двухуровневый кэш: LRU в памяти процесса (L1) перед общим кэшем (L2).
+
+Горячие ключи — главная страница, группы, записи sorl-thumbnail — читаются
+почти в каждом запросе, и даже общий кэш тратит на них запрос к файлу и
+распаковку. L1 хранит такие значения в процессе ограниченное время.
+
+Ключи разложены по STAMP_BUCKETS корзинам, у каждой корзины в L2 есть
+метка версии. Любая запись увеличивает метку своей корзины, процессы
+перечитывают метки не чаще раза в STAMP_INTERVAL секунд и отбрасывают
+записи L1 с устаревшей меткой. Поэтому запись из другого процесса видна
+не позже чем через STAMP_INTERVAL, а своя — сразу.
+"""
+import pickle
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter, OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+STAMP_KEY = 'tiered:stamp:{}'
+EPOCH_KEY = 'tiered:epoch'
+
+# Состояние L1 общее для всех потоков процесса, как у LocMemCache.
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class _Tier:
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stamps = {}
+        self.epoch = None
+        self.refreshed = 0.0
+        self.stats = Counter()
+
+
+class TieredCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = options.get('L2', 'shared')
+        self._l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self._l1_timeout = float(options.get('L1_TIMEOUT', 5))
+        self._stamp_interval = float(options.get('STAMP_INTERVAL', 1))
+        self._buckets = int(options.get('STAMP_BUCKETS', 64))
+        with _tiers_lock:
+            self._tier = _tiers.setdefault(name, _Tier())
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def _bucket(self, made_key):
+        return zlib.crc32(made_key.encode()) % self._buckets
+
+    def _refresh_stamps(self):
+        tier = self._tier
+        now = time.monotonic()
+        if now - tier.refreshed < self._stamp_interval:
+            return
+        keys = [STAMP_KEY.format(bucket) for bucket in range(self._buckets)]
+        values = self.l2.get_many(keys + [EPOCH_KEY])
+        epoch = values.get(EPOCH_KEY)
+        if epoch is None:
+            self.l2.add(EPOCH_KEY, uuid.uuid4().hex, None)
+            epoch = self.l2.get(EPOCH_KEY)
+        with tier.lock:
+            if epoch != tier.epoch:
+                tier.entries.clear()
+                tier.epoch = epoch
+            tier.stamps = {bucket: values.get(key)
+                           for bucket, key in enumerate(keys)}
+            tier.refreshed = now
+
+    def _bump(self, made_key):
+        bucket = self._bucket(made_key)
+        stamp_key = STAMP_KEY.format(bucket)
+        try:
+            stamp = self.l2.incr(stamp_key)
+        except ValueError:
+            self.l2.add(stamp_key, 1, None)
+            stamp = self.l2.get(stamp_key)
+        with self._tier.lock:
+            self._tier.stamps[bucket] = stamp
+        return bucket, stamp
+
+    def _l1_get(self, made_key):
+        tier = self._tier
+        with tier.lock:
+            entry = tier.entries.get(made_key)
+            if entry is None:
+                return None
+            pickled, expires, bucket, stamp = entry
+            if expires <= time.monotonic() or tier.stamps.get(
+                    bucket) != stamp:
+                del tier.entries[made_key]
+                return None
+            tier.entries.move_to_end(made_key)
+        return pickled
+
+    def _l1_set(self, made_key, value, bucket=None, stamp=None,
+                timeout=DEFAULT_TIMEOUT):
+        timeout = self._l1_timeout if timeout in (
+            DEFAULT_TIMEOUT, None) else min(timeout, self._l1_timeout)
+        if timeout <= 0:
+            return
+        tier = self._tier
+        if bucket is None:
+            bucket = self._bucket(made_key)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with tier.lock:
+            if stamp is None:
+                stamp = tier.stamps.get(bucket)
+            tier.entries[made_key] = (pickled, time.monotonic() + timeout,
+                                      bucket, stamp)
+            tier.entries.move_to_end(made_key)
+            while len(tier.entries) > self._l1_max_entries:
+                tier.entries.popitem(last=False)
+
+    def _l1_delete(self, made_key):
+        with self._tier.lock:
+            self._tier.entries.pop(made_key, None)
+
+    def _count(self, name, amount=1):
+        with self._tier.lock:
+            self._tier.stats[name] += amount
+
+    def get(self, key, default=None, version=None):
+        made_key = self.l2.make_key(key, version=version)
+        self._refresh_stamps()
+        pickled = self._l1_get(made_key)
+        if pickled is not None:
+            self._count('l1_hits')
+            return pickle.loads(pickled)
+        value = self.l2.get(key, version=version)
+        if value is None:
+            self._count('misses')
+            return default
+        self._count('l2_hits')
+        self._l1_set(made_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._refresh_stamps()
+        found, missing = {}, []
+        for key in keys:
+            pickled = self._l1_get(self.l2.make_key(key, version=version))
+            if pickled is None:
+                missing.append(key)
+            else:
+                found[key] = pickle.loads(pickled)
+        self._count('l1_hits', len(found))
+        if missing:
+            from_l2 = self.l2.get_many(missing, version=version)
+            self._count('l2_hits', len(from_l2))
+            self._count('misses', len(missing) - len(from_l2))
+            for key, value in from_l2.items():
+                self._l1_set(self.l2.make_key(key, version=version), value)
+            found.update(from_l2)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        made_key = self.l2.make_key(key, version=version)
+        self.l2.set(key, value, timeout, version=version)
+        bucket, stamp = self._bump(made_key)
+        self._l1_set(made_key, value, bucket, stamp, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if not self.l2.add(key, value, timeout, version=version):
+            return False
+        made_key = self.l2.make_key(key, version=version)
+        bucket, stamp = self._bump(made_key)
+        self._l1_set(made_key, value, bucket, stamp, timeout)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        made_key = self.l2.make_key(key, version=version)
+        self._l1_delete(made_key)
+        value = self.l2.incr(key, delta, version=version)
+        self._bump(made_key)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, version=version) is not None
+
+    def delete(self, key, version=None):
+        made_key = self.l2.make_key(key, version=version)
+        self._l1_delete(made_key)
+        self.l2.delete(key, version=version)
+        self._bump(made_key)
+
+    def clear(self):
+        self.l2.clear()
+        self.l2.set(EPOCH_KEY, uuid.uuid4().hex, None)
+        with self._tier.lock:
+            self._tier.entries.clear()
+            self._tier.refreshed = 0.0
+
+    def stats(self):
+        """Попадания в L1 и L2 и промахи текущего процесса."""
+        with self._tier.lock:
+            stats = {name: self._tier.stats[name]
+                     for name in ('l1_hits', 'l2_hits', 'misses')}
+            stats['l1_entries'] = len(self._tier.entries)
+        total = stats['l1_hits'] + stats['l2_hits'] + stats['misses']
+        reached_l2 = stats['l2_hits'] + stats['misses']
+        stats['l1_hit_ratio'] = stats['l1_hits'] / total if total else 0.0
+        stats['l2_hit_ratio'] = (stats['l2_hits'] / reached_l2
+                                 if reached_l2 else 0.0)
+        return stats
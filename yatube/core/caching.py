@@ -0,0 +1,157 @@
+"""Кэширование страниц с ключами, версионируемыми поколениями.
+
+Каждая закэшированная страница зависит от набора областей (scopes),
+например 'index' или 'group:<slug>'. У области есть поколение —
+счётчик в кэше; он входит в ключ страницы и увеличивается сигналами
+при записи. После увеличения старые копии страниц больше не находятся
+и вытесняются по таймауту, поэтому страницы можно держать в кэше долго
+и всё равно отдавать свежими сразу после записи.
+
+Истёкшую по таймауту страницу пересчитывает один запрос, остальные в это
+время получают устаревшую копию (stale-while-revalidate) или ждут.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.core.cache import caches
+from django.utils.cache import (get_cache_key, learn_cache_key,
+                                patch_vary_headers)
+
+GENERATION_KEY = 'generation:{}'
+LOCK_KEY = 'page_lock:{}'
+LOCK_TIMEOUT = 30
+WAIT_TIMEOUT = 5
+WAIT_INTERVAL = 0.05
+STATS = ('hit', 'miss', 'stale', 'recompute')
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _initial_generation():
+    # Поколение, потерянное при вытеснении, не должно начаться заново
+    # с номера, под которым в кэше ещё лежат старые страницы.
+    return int(time.time() * 1000)
+
+
+def get_generations(scopes, cache):
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, _initial_generation(), None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def bump_generations(*scopes, cache_alias='default'):
+    """Делает недействительными все страницы, зависящие от scopes."""
+    cache = caches[cache_alias]
+    for scope in set(scopes):
+        key = GENERATION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_generation(), None)
+
+
+def _stats_add(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cache_stats():
+    """Счётчики кэша страниц текущего процесса."""
+    with _stats_lock:
+        return {name: _stats[name] for name in STATS}
+
+
+def _wait(cache, request, prefix, lock_key, lock_timeout, wait_timeout):
+    """Ждёт, пока страницу посчитает другой запрос.
+
+    Возвращает (response, False) или (None, locked), если дождаться не
+    удалось и страницу придётся считать самому.
+    """
+    deadline = time.time() + wait_timeout
+    while time.time() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        cache_key = get_cache_key(request, prefix, 'GET', cache=cache)
+        entry = cache.get(cache_key) if cache_key else None
+        if entry is not None:
+            _stats_add('hit')
+            return entry[0], False
+        if cache.add(lock_key, 1, lock_timeout):
+            return None, True
+    return None, False
+
+
+def _store(cache, request, response, timeout, stale, prefix):
+    patch_vary_headers(response, ('Cookie',))
+    if (response.streaming or response.status_code != 200
+            or 'private' in response.get('Cache-Control', ())):
+        return
+    cache_key = learn_cache_key(request, response, timeout + stale, prefix,
+                                cache=cache)
+    cache.set(cache_key, (response, time.time() + timeout), timeout + stale)
+
+
+def cache_page_versioned(timeout, key_prefix='', scopes=None, stale=0,
+                         cache_alias='default', lock_timeout=LOCK_TIMEOUT,
+                         wait_timeout=WAIT_TIMEOUT):
+    """Аналог cache_page с поколениями, single-flight и stale-while-revalidate.
+
+    scopes — функция от аргументов представления, возвращающая список
+    областей страницы. Страница свежая timeout секунд и ещё stale секунд
+    может отдаваться устаревшей, пока её пересчитывает один запрос. При
+    полном промахе страницу считает один запрос, остальные ждут его
+    до wait_timeout секунд. Страницы различаются по Cookie, так как
+    шаблоны показывают текущего пользователя.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            cache = caches[cache_alias]
+            scope_list = scopes(*args, **kwargs) if scopes else []
+            generations = get_generations(scope_list, cache)
+            prefix = '.'.join([key_prefix] + [
+                f'{scope}={generation}'
+                for scope, generation in zip(scope_list, generations)
+            ])
+            cache_key = get_cache_key(request, prefix, 'GET', cache=cache)
+            lock_key = LOCK_KEY.format(cache_key or hashlib.md5(
+                f'{prefix}.{request.build_absolute_uri()}'.encode()
+            ).hexdigest())
+            entry = cache.get(cache_key) if cache_key else None
+            if entry is not None:
+                response, fresh_until = entry
+                if time.time() < fresh_until:
+                    _stats_add('hit')
+                    return response
+                locked = cache.add(lock_key, 1, lock_timeout)
+                if not locked:
+                    _stats_add('stale')
+                    return response
+            else:
+                _stats_add('miss')
+                locked = cache.add(lock_key, 1, lock_timeout)
+                if not locked:
+                    response, locked = _wait(cache, request, prefix,
+                                             lock_key, lock_timeout,
+                                             wait_timeout)
+                    if response is not None:
+                        return response
+            _stats_add('recompute')
+            try:
+                response = view(request, *args, **kwargs)
+                _store(cache, request, response, timeout, stale, prefix)
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,107 @@
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from statistics import quantiles
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'filebased': 'django.core.cache.backends.filebased.FileBasedCache',
+    'sqlite': 'core.cache_backends.sqlite.SQLiteCache',
+}
+
+
+def _location(name, directory):
+    if name == 'filebased':
+        return os.path.join(directory, 'filebased')
+    if name == 'sqlite':
+        return os.path.join(directory, 'cache.sqlite3')
+    return 'bench'
+
+
+def _worker(args):
+    name, directory, seed, operations, keys, value_size, read_ratio = args
+    cache = import_string(BACKENDS[name])(
+        _location(name, directory), {'OPTIONS': {'MAX_ENTRIES': keys * 2}}
+    )
+    rng = random.Random(seed)
+    value = os.urandom(value_size)
+    get_times, set_times, hits = [], [], 0
+    for _ in range(operations):
+        key = f'key{rng.randrange(keys)}'
+        started = time.perf_counter()
+        if rng.random() < read_ratio:
+            hits += cache.get(key) is not None
+            get_times.append(time.perf_counter() - started)
+        else:
+            cache.set(key, value, 300)
+            set_times.append(time.perf_counter() - started)
+    return get_times, set_times, hits
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает задержки get/set LocMemCache, FileBasedCache и '
+            'SQLiteCache при одновременной работе нескольких процессов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--operations', type=int, default=2000,
+                            help='Операций на процесс.')
+        parser.add_argument('--keys', type=int, default=500)
+        parser.add_argument('--value-size', type=int, default=20 * 1024)
+        parser.add_argument('--read-ratio', type=float, default=0.9)
+        parser.add_argument('--backend', choices=BACKENDS, action='append')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"бэкенд":<11}{"get p50":>9}{"get p99":>9}{"set p50":>9}'
+            f'{"set p99":>9}{"оп/с":>9}{"попаданий":>11}'
+        )
+        self.stdout.write(f'{"":<11}{"мкс":>9}{"мкс":>9}{"мкс":>9}'
+                          f'{"мкс":>9}')
+        for name in options['backend'] or BACKENDS:
+            directory = tempfile.mkdtemp()
+            try:
+                self.run(name, directory, options)
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def run(self, name, directory, options):
+        tasks = [
+            (name, directory, seed, options['operations'], options['keys'],
+             options['value_size'], options['read_ratio'])
+            for seed in range(options['processes'])
+        ]
+        context = multiprocessing.get_context('fork')
+        with context.Pool(options['processes']) as pool:
+            # Прогрев: ключи записывает один процесс, читают остальные.
+            pool.apply(_worker, [(
+                name, directory, -1, options['keys'] * 5, options['keys'],
+                options['value_size'], 0,
+            )])
+            started = time.perf_counter()
+            results = pool.map(_worker, tasks)
+        elapsed = time.perf_counter() - started
+        get_times = [t for result in results for t in result[0]]
+        set_times = [t for result in results for t in result[1]]
+        hits = sum(result[2] for result in results)
+
+        def percentiles(times):
+            if len(times) < 2:
+                return 0, 0
+            cuts = quantiles(times, n=100)
+            return cuts[49] * 1e6, cuts[98] * 1e6
+
+        get_p50, get_p99 = percentiles(get_times)
+        set_p50, set_p99 = percentiles(set_times)
+        total = len(get_times) + len(set_times)
+        hit_ratio = hits / len(get_times) if get_times else 0
+        self.stdout.write(
+            f'{name:<11}{get_p50:>9.1f}{get_p99:>9.1f}{set_p50:>9.1f}'
+            f'{set_p99:>9.1f}{total / elapsed:>9.0f}{hit_ratio:>11.0%}'
+        )
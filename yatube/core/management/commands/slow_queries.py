@@ -0,0 +1,83 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import slow_queries
+
+ORDERS = {
+    'total': lambda row: row['total'],
+    'count': lambda row: row['count'],
+    'max': lambda row: row['max'],
+}
+
+
+def aggregate(entries):
+    """Сводка по формам запросов: число, суммарное и наибольшее время,
+    страницы, последний план."""
+    rows = {}
+    for entry in entries:
+        row = rows.setdefault(entry['shape'], {
+            'shape': entry['shape'], 'count': 0, 'total': 0.0, 'max': 0.0,
+            'views': set(), 'plan': None, 'full_scans': [],
+        })
+        row['count'] += 1
+        row['total'] += entry['duration']
+        row['max'] = max(row['max'], entry['duration'])
+        row['views'].add(entry['view'] or '-')
+        if entry['plan']:
+            row['plan'] = entry['plan']
+            row['full_scans'] = entry['full_scans']
+    return list(rows.values())
+
+
+class Command(BaseCommand):
+    help = ('Сводка журнала медленных запросов (SLOW_QUERY_LOG) по формам '
+            'запросов: число, суммарное, среднее и наибольшее время, '
+            'страницы и план выполнения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--order', choices=ORDERS, default='total')
+        parser.add_argument('--view', help='Только запросы этой страницы '
+                                           '(имя URL).')
+        parser.add_argument('--full-scans', action='store_true',
+                            help='Только запросы с полным просмотром '
+                                 'таблицы.')
+        parser.add_argument('--log', help='Файл журнала; по умолчанию '
+                                          'SLOW_QUERY_LOG.')
+        parser.add_argument('--clear', action='store_true',
+                            help='Удалить журнал после вывода.')
+
+    def handle(self, *args, **options):
+        path = options['log'] or settings.SLOW_QUERY_LOG
+        entries = [
+            entry for entry in slow_queries.read(path)
+            if (not options['view'] or entry['view'] == options['view'])
+            and (not options['full_scans'] or entry['full_scans'])
+        ]
+        rows = sorted(aggregate(entries), key=ORDERS[options['order']],
+                      reverse=True)[:options['top']]
+        self.stdout.write(f'Записей: {len(entries)}, форм запросов: '
+                          f'{len(rows)}')
+        self.stdout.write(f'{"число":>7}{"всего, с":>10}{"сред, мс":>10}'
+                          f'{"макс, мс":>10}  запрос')
+        for row in rows:
+            self.stdout.write(
+                f'{row["count"]:>7}{row["total"]:>10.3f}'
+                f'{row["total"] / row["count"] * 1000:>10.1f}'
+                f'{row["max"] * 1000:>10.1f}  {row["shape"]}'
+            )
+            self.stdout.write(f'{"":>9}страницы: '
+                              f'{", ".join(sorted(row["views"]))}')
+            if row['full_scans']:
+                self.stdout.write(f'{"":>9}полный просмотр: '
+                                  f'{", ".join(row["full_scans"])}')
+            for line in row['plan'] or ():
+                self.stdout.write(f'{"":>9}{line}')
+        if options['clear']:
+            for name in (path, f'{path}.1'):
+                try:
+                    os.remove(name)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,289 @@
+"""Метрики в текстовом формате Prometheus.
+
+Каждый процесс копит счётчики в памяти — обновление занимает короткую
+блокировку потоков этого процесса — и не чаще раза в
+METRICS_FLUSH_INTERVAL секунд атомарно переписывает свой файл
+METRICS_DIR/<pid>-<id>.json. Представление metrics складывает файлы всех
+процессов, поэтому видны все воркеры и пул миниатюр, а процессы друг
+друга не ждут. Счётчики завершившихся процессов collect() переносит в
+общий файл ARCHIVE_NAME и удаляет их файлы: каталог не растёт с
+перезапусками воркеров, а суммы не уменьшаются — иначе Prometheus принял
+бы уменьшение за сброс счётчика и показал ложный всплеск в rate() и
+increase(). Перенос и чтение файлов разделены блокировкой каталога
+(flock), поэтому параллельные запросы к /metrics не учтут файл дважды.
+
+Страница доступна сотрудникам и по заголовку
+Authorization: Bearer <METRICS_TOKEN> (см. authorized).
+
+Запросы учитывает record_request из SERVER_TIMING_SINKS (см.
+core.timing), остальное — inc() и observe() в коде.
+"""
+import fcntl
+import hmac
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .caching import cache_stats
+
+# Имя: (тип, описание).
+METRICS = {
+    'yatube_http_request_duration_seconds': (
+        'histogram', 'Время обработки запроса по имени URL.'),
+    'yatube_http_responses_total': (
+        'counter', 'Ответы по имени URL и коду.'),
+    'yatube_db_queries_total': (
+        'counter', 'SQL-запросы по имени URL.'),
+    'yatube_db_query_seconds_total': (
+        'counter', 'Время SQL-запросов по имени URL.'),
+    'yatube_cache_operations_total': (
+        'counter', 'Операции с кэшем по имени URL.'),
+    'yatube_cache_operation_seconds_total': (
+        'counter', 'Время операций с кэшем по имени URL.'),
+    'yatube_page_cache_total': (
+        'counter', 'Кэш страниц: hit, miss, stale, recompute.'),
+    'yatube_cache_lookups_total': (
+        'counter', 'Чтения многоуровневого кэша: l1_hits, l2_hits, '
+                   'misses.'),
+    'yatube_thumbnails_generated_total': (
+        'counter', 'Созданные миниатюры по формату.'),
+}
+TIERED_STATS = ('l1_hits', 'l2_hits', 'misses')
+ARCHIVE_NAME = 'archived.json'
+LOCK_NAME = '.lock'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_values = Counter()
+_lock = threading.Lock()
+_flushed = 0.0
+_file_name = None
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    """Увеличивает счётчик name с метками labels."""
+    key = _key(name, labels)
+    with _lock:
+        _values[key] += amount
+
+
+def observe(name, value, **labels):
+    """Добавляет значение value в гистограмму name."""
+    updates = [_key(f'{name}_bucket', {**labels, 'le': repr(float(bound))})
+               for bound in settings.METRICS_BUCKETS if value <= bound]
+    updates.append(_key(f'{name}_bucket', {**labels, 'le': '+Inf'}))
+    updates.append(_key(f'{name}_count', labels))
+    with _lock:
+        for key in updates:
+            _values[key] += 1
+        _values[_key(f'{name}_sum', labels)] += value
+
+
+def _reset_after_fork():
+    # Порождённый fork процесс ведёт свой файл и свои счётчики, а не
+    # продолжает родительские.
+    global _lock, _file_name, _flushed
+    _lock = threading.Lock()
+    _values.clear()
+    _file_name = None
+    _flushed = 0.0
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _process_path():
+    global _file_name
+    if _file_name is None:
+        _file_name = f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json'
+    return os.path.join(settings.METRICS_DIR, _file_name)
+
+
+def _snapshot():
+    with _lock:
+        values = dict(_values)
+    for result, count in cache_stats().items():
+        values[_key('yatube_page_cache_total', {'result': result})] = count
+    backend = caches['default']
+    if hasattr(backend, 'stats'):
+        stats = backend.stats()
+        for result in TIERED_STATS:
+            values[_key('yatube_cache_lookups_total',
+                        {'result': result})] = stats[result]
+    return values
+
+
+def flush(force=True):
+    """Записывает счётчики процесса в его файл.
+
+    Без force пишет не чаще раза в METRICS_FLUSH_INTERVAL секунд.
+    """
+    global _flushed
+    now = time.monotonic()
+    if not force and now - _flushed < settings.METRICS_FLUSH_INTERVAL:
+        return
+    _flushed = now
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    _write(_process_path(), _snapshot())
+
+
+def _write(path, values):
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as target:
+        json.dump([[name, labels, value]
+                   for (name, labels), value in values.items()], target)
+    os.replace(temp_path, path)
+
+
+def _read(path, totals):
+    """Добавляет счётчики из файла path к totals."""
+    try:
+        with open(path) as source:
+            rows = json.load(source)
+    except (OSError, ValueError):
+        return
+    for name, labels, value in rows:
+        totals[name, tuple(map(tuple, labels))] += value
+
+
+@contextmanager
+def _locked(operation):
+    with open(os.path.join(settings.METRICS_DIR, LOCK_NAME), 'a') as lock:
+        fcntl.flock(lock, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _dead(file_name):
+    """Файл принадлежит завершившемуся процессу."""
+    pid = file_name.split('-', 1)[0]
+    return pid.isdigit() and not _alive(int(pid))
+
+
+def _archive():
+    """Переносит счётчики завершившихся процессов в ARCHIVE_NAME."""
+    directory = settings.METRICS_DIR
+    dead = [name for name in os.listdir(directory)
+            if name.endswith(('.json', '.json.tmp')) and _dead(name)]
+    if not dead:
+        return
+    with _locked(fcntl.LOCK_EX):
+        archive_path = os.path.join(directory, ARCHIVE_NAME)
+        archived = Counter()
+        _read(archive_path, archived)
+        paths = [os.path.join(directory, name) for name in dead]
+        for path in paths:
+            # Недописанный .tmp не учитывается: его данные есть в
+            # предыдущей версии файла.
+            if path.endswith('.json'):
+                _read(path, archived)
+        _write(archive_path, archived)
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def collect():
+    """Сумма счётчиков всех процессов, включая завершившиеся:
+    {(имя, метки): значение}."""
+    flush()
+    _archive()
+    totals = Counter()
+    with _locked(fcntl.LOCK_SH):
+        for entry in os.scandir(settings.METRICS_DIR):
+            if entry.name.endswith('.json'):
+                _read(entry.path, totals)
+    return totals
+
+
+def _family(name):
+    for suffix in ('_bucket', '_count', '_sum'):
+        if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+            return name[:-len(suffix)]
+    return name
+
+
+def _bound(labels):
+    le = dict(labels).get('le')
+    return float(le) if le is not None else 0.0
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def render(totals):
+    """Текст в формате Prometheus."""
+    families = {}
+    for (name, labels), value in totals.items():
+        families.setdefault(_family(name), []).append((name, labels, value))
+    lines = []
+    for family in sorted(families):
+        kind, description = METRICS.get(family, ('untyped', ''))
+        lines.append(f'# HELP {family} {description}')
+        lines.append(f'# TYPE {family} {kind}')
+        samples = sorted(families[family], key=lambda sample: (
+            sample[0], [item for item in sample[1] if item[0] != 'le'],
+            _bound(sample[1]),
+        ))
+        for name, labels, value in samples:
+            label_text = ','.join(f'{label}="{_escape(text)}"'
+                                  for label, text in labels)
+            if label_text:
+                name = f'{name}{{{label_text}}}'
+            lines.append(f'{name} {value!r}')
+    return '\n'.join(lines) + '\n'
+
+
+def authorized(request):
+    """Запрос предъявил METRICS_TOKEN; без токена в настройках — нет."""
+    token = settings.METRICS_TOKEN
+    if not token:
+        return False
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())
+
+
+def record_request(request, response, timings):
+    """Приёмник core.timing: время, код ответа, SQL и кэш запроса."""
+    match = request.resolver_match
+    view = match.view_name if match else 'unmatched'
+    observe('yatube_http_request_duration_seconds', timings.total,
+            view=view)
+    inc('yatube_http_responses_total', view=view,
+        status=str(response.status_code))
+    if timings.counts['db']:
+        inc('yatube_db_queries_total', timings.counts['db'], view=view)
+        inc('yatube_db_query_seconds_total', timings.durations['db'],
+            view=view)
+    if timings.counts['cache']:
+        inc('yatube_cache_operations_total', timings.counts['cache'],
+            view=view)
+        inc('yatube_cache_operation_seconds_total',
+            timings.durations['cache'], view=view)
+    flush(force=False)
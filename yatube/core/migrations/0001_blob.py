@@ -0,0 +1,22 @@
+# Generated by Django 2.2.16 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('size', models.PositiveIntegerField()),
+                ('refcount', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
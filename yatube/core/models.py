@@ -0,0 +1,11 @@
+from django.db import models
+
+
+class Blob(models.Model):
+    """Файл в ContentAddressedStorage и число ссылок на него."""
+    name = models.CharField(max_length=255, primary_key=True)
+    size = models.PositiveIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
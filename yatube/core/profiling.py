@@ -0,0 +1,164 @@
+"""Профилирование выбранных страниц по выборке запросов.
+
+ProfilingMiddleware профилирует долю PROFILING_SAMPLE_RATE запросов к
+URL из PROFILING_URL_NAMES и пишет результат в PROFILING_DIR:
+
+* 'sampler' — статистический сэмплер: отдельный поток раз в
+  PROFILING_INTERVAL секунд снимает стек потока запроса. Файл .collapsed
+  в формате «кадр;кадр;кадр число» открывают flamegraph.pl и speedscope.
+  Запрос почти не замедляется, поэтому режим годится для работы.
+* 'cprofile' — cProfile, файл .prof для pstats и snakeviz; точнее, но
+  замедляет профилируемый запрос в разы.
+
+Имя файла — время, имя URL и длительность запроса. Когда файлы
+занимают больше PROFILING_MAX_BYTES, старые удаляются. Список — на
+странице admin/profiles/ для сотрудников.
+"""
+import cProfile
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+
+EXTENSIONS = {'sampler': '.collapsed', 'cprofile': '.prof'}
+FILE_NAME = re.compile(
+    r'^(?P<created>\d{8}T\d{6})-(?P<view>[\w.-]+)-(?P<duration>\d+)ms-'
+    r'\w+(?P<extension>\.collapsed|\.prof)$'
+)
+
+
+class StackSampler:
+    """Снимает стек потока thread_id раз в interval секунд."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} '
+                             f'({code.co_filename}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n'
+                       for stack, count in self.stacks.most_common())
+
+
+def _rotate(directory, limit):
+    """Удаляет самые старые профили, пока их размер больше limit."""
+    entries = sorted(
+        (entry for entry in os.scandir(directory)
+         if FILE_NAME.match(entry.name)),
+        key=lambda entry: entry.name,
+    )
+    total = sum(entry.stat().st_size for entry in entries)
+    for entry in entries:
+        if total <= limit:
+            break
+        total -= entry.stat().st_size
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def save(view_name, duration, mode, write):
+    """Сохраняет профиль; write(path) записывает файл."""
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+    name = (f'{timezone.now():%Y%m%dT%H%M%S}-'
+            f'{view_name.replace(":", ".")}-{round(duration * 1000)}ms-'
+            f'{uuid.uuid4().hex[:8]}{EXTENSIONS[mode]}')
+    path = os.path.join(directory, name)
+    write(f'{path}.tmp')
+    os.replace(f'{path}.tmp', path)
+    _rotate(directory, settings.PROFILING_MAX_BYTES)
+    return path
+
+
+def profiles():
+    """Сохранённые профили, новые первыми: словари с name, view,
+    created, duration (мс) и size."""
+    try:
+        entries = list(os.scandir(settings.PROFILING_DIR))
+    except FileNotFoundError:
+        return []
+    found = []
+    for entry in entries:
+        match = FILE_NAME.match(entry.name)
+        if not match:
+            continue
+        found.append({
+            'name': entry.name,
+            'view': match['view'].replace('.', ':'),
+            'created': datetime.strptime(
+                match['created'], '%Y%m%dT%H%M%S'
+            ).replace(tzinfo=timezone.utc),
+            'duration': int(match['duration']),
+            'format': 'pstats' if match['extension'] == '.prof'
+                      else 'collapsed',
+            'size': entry.stat().st_size,
+        })
+    return sorted(found, key=lambda profile: profile['name'], reverse=True)
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.PROFILING_SAMPLE_RATE
+        if not rate or random.random() >= rate:
+            return self.get_response(request)
+        try:
+            view_name = resolve(request.path_info).view_name
+        except Resolver404:
+            return self.get_response(request)
+        if view_name not in settings.PROFILING_URL_NAMES:
+            return self.get_response(request)
+        mode = settings.PROFILING_MODE
+        started = time.perf_counter()
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            response = profiler.runcall(self.get_response, request)
+            write = profiler.dump_stats
+        else:
+            sampler = StackSampler(threading.get_ident(),
+                                   settings.PROFILING_INTERVAL)
+            sampler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                sampler.stop()
+
+            def write(path):
+                with open(path, 'w') as target:
+                    target.write(sampler.collapsed())
+        save(view_name, time.perf_counter() - started, mode, write)
+        return response
@@ -0,0 +1,182 @@
+"""Учёт SQL-запросов запроса: N+1 и бюджеты по именам URL.
+
+QueryBudgetMiddleware записывает все запросы к базе за время обработки
+запроса (connection.execute_wrapper) и проверяет две вещи:
+
+* N+1 — один и тот же запрос с точностью до параметров повторился
+  QUERY_REPEAT_THRESHOLD раз и больше, например автор каждого поста
+  читается отдельно;
+* бюджет — запросов больше, чем QUERY_BUDGETS[<namespace:name>].
+
+Страница, число запросов которой законно зависит от данных (например,
+запрос на каждый источник ленты), сообщает об этом expect_queries:
+бюджет и порог повторов растут на это число.
+
+Проверяется доля QUERY_BUDGET_SAMPLE_RATE запросов. Нарушение
+записывается в лог 'core.queries', а при QUERY_BUDGET_RAISE на страницах
+из QUERY_BUDGETS поднимает QueryBudgetExceeded; остальные страницы
+(например, админка) только пишутся в лог. В тестах то же проверяет
+QueryBudgetMixin.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LIST = re.compile(r'\((?:\s*(?:%s|\?),?)+\s*\)')
+_SPACE = re.compile(r'\s+')
+# Управление транзакцией — не обращение к данным.
+_TRANSACTION = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT',
+                'BEGIN', 'COMMIT', 'ROLLBACK')
+
+_local = threading.local()
+
+
+def shape(sql):
+    """Запрос без значений: литералы — '?', списки IN (...) — '(...)'."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _LIST.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class QueryBudgetExceeded(Exception):
+    """Запрос превысил бюджет или выполнил N+1."""
+
+
+class QueryLog:
+    """Запросы ко всем базам: список (alias, sql, секунды)."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __len__(self):
+        return len(self.queries)
+
+    def counted(self):
+        """Запросы к данным без таблиц из QUERY_BUDGET_IGNORE."""
+        ignored = settings.QUERY_BUDGET_IGNORE
+        return [
+            query for query in self.queries
+            if not query[1].lstrip().upper().startswith(_TRANSACTION)
+            and not any(table in query[1] for table in ignored)
+        ]
+
+    def wrapper(self, alias):
+        def record(execute, sql, params, many, context):
+            if getattr(_local, 'untracked', False):
+                return execute(sql, params, many, context)
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.queries.append(
+                    (alias, sql, time.perf_counter() - started)
+                )
+        return record
+
+    def repeated(self, threshold=None):
+        """Формы запросов, повторившиеся threshold раз и больше."""
+        if threshold is None:
+            threshold = settings.QUERY_REPEAT_THRESHOLD
+        counts = Counter(shape(sql) for _, sql, _ in self.counted())
+        return [(sql, count) for sql, count in counts.most_common()
+                if count >= threshold]
+
+    def problems(self, url_name=None, budget=None, expected=0):
+        """Описания нарушений; пустой список, если их нет. expected —
+        запросы сверх бюджета, о которых сообщила страница."""
+        if budget is None and url_name:
+            budget = settings.QUERY_BUDGETS.get(url_name)
+        found = []
+        count = len(self.counted())
+        if budget is not None:
+            budget += expected
+            if count > budget:
+                found.append(f'{count} запросов при бюджете {budget}')
+        found.extend(f'N+1: {count} раз {sql}' for sql, count in
+                     self.repeated(settings.QUERY_REPEAT_THRESHOLD
+                                   + expected))
+        return found
+
+
+@contextmanager
+def record_queries():
+    """Записывает запросы ко всем базам внутри блока в QueryLog."""
+    log = QueryLog()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(
+                connections[alias].execute_wrapper(log.wrapper(alias))
+            )
+        yield log
+
+
+@contextmanager
+def untracked():
+    """Не учитывать запросы блока: работа, которая обычно идёт в фоне,
+    но выполнена в запросе (например, миниатюры при THUMBNAIL_WORKERS
+    = 0)."""
+    previous = getattr(_local, 'untracked', False)
+    _local.untracked = True
+    try:
+        yield
+    finally:
+        _local.untracked = previous
+
+
+def expect_queries(request, count):
+    """Страница выполнит ещё count запросов, зависящих от данных."""
+    request.expected_queries = getattr(request, 'expected_queries', 0) + count
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.QUERY_BUDGET_SAMPLE_RATE:
+            return self.get_response(request)
+        with record_queries() as log:
+            response = self.get_response(request)
+        match = request.resolver_match
+        url_name = match.view_name if match else None
+        problems = log.problems(
+            url_name, expected=getattr(request, 'expected_queries', 0)
+        )
+        if problems:
+            message = (f'{request.method} {request.path} ({url_name}): '
+                       + '; '.join(problems))
+            if (settings.QUERY_BUDGET_RAISE
+                    and url_name in settings.QUERY_BUDGETS):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+class QueryBudgetMixin:
+    """Проверки бюджета и N+1 для TestCase."""
+
+    @contextmanager
+    def assertQueryBudget(self, url_name=None, budget=None, expected=0):
+        """Блок укладывается в бюджет url_name (или budget) и не
+        повторяет одну форму запроса QUERY_REPEAT_THRESHOLD раз; expected
+        — как у expect_queries."""
+        with record_queries() as log:
+            yield log
+        problems = log.problems(url_name, budget, expected)
+        if problems:
+            self.fail('\n'.join(problems + [
+                f'{number}. {sql}'
+                for number, (_, sql, _) in enumerate(log.queries, 1)
+            ]))
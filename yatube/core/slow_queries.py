@@ -0,0 +1,149 @@
+"""Журнал медленных SQL-запросов с планом выполнения.
+
+Обёртка ставится на каждое соединение с базой (connection_created, см.
+CoreConfig.ready), поэтому видит запросы и страниц, и команд. Запрос
+дольше SLOW_QUERY_THRESHOLD секунд пишется в лог 'core.slow_queries' и
+строкой JSON в SLOW_QUERY_LOG: время, длительность, имя URL страницы
+(SlowQueryMiddleware), форма запроса без значений (core.queries.shape) и
+план — для SELECT выполняется EXPLAIN QUERY PLAN (на других базах —
+EXPLAIN) с теми же параметрами. Таблицы, которые план читает целиком
+(SCAN на SQLite), попадают в full_scans.
+
+Когда журнал больше SLOW_QUERY_LOG_MAX_BYTES, он переименовывается в
+<файл>.1 (предыдущий удаляется). Сводку по формам запросов печатает
+команда slow_queries.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .queries import shape
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_write_lock = threading.Lock()
+_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+
+def install(sender, connection, **kwargs):
+    """Обработчик connection_created: ставит обёртку первой в списке,
+    чтобы не мешать execute_wrapper(), снимающим последнюю."""
+    if _wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _wrapper)
+
+
+def _wrapper(execute, sql, params, many, context):
+    threshold = settings.SLOW_QUERY_THRESHOLD
+    if threshold is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        if duration >= threshold:
+            _record(context['connection'], sql, params, many, duration)
+
+
+def explain(connection, sql, params):
+    """Строки плана запроса или None, если план получить нельзя."""
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    prefix = ('EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite'
+              else 'EXPLAIN ')
+    try:
+        # Курсор драйвера без обёрток Django: EXPLAIN не должен попадать
+        # ни в этот журнал, ни в счётчики запросов страницы.
+        cursor = connection.create_cursor()
+        try:
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+    except Exception:
+        logger.debug('Не удалось получить план запроса', exc_info=True)
+        return None
+    if connection.vendor == 'sqlite':
+        return [str(row[-1]) for row in rows]
+    return [' '.join(map(str, row)) for row in rows]
+
+
+def full_scans(plan):
+    """Таблицы, которые план читает целиком."""
+    return sorted({match[1] for line in plan or ()
+                   for match in [_SCAN.match(line.strip())] if match})
+
+
+def _record(connection, sql, params, many, duration):
+    plan = None if many else explain(connection, sql, params)
+    entry = {
+        'time': timezone.now().isoformat(),
+        'duration': round(duration, 6),
+        'view': getattr(_local, 'view', None),
+        'alias': connection.alias,
+        'shape': shape(sql),
+        'plan': plan,
+        'full_scans': full_scans(plan),
+    }
+    logger.warning(
+        'Медленный запрос %.1f мс (%s)%s: %s', duration * 1000,
+        entry['view'] or '-',
+        f', полный просмотр {", ".join(entry["full_scans"])}'
+        if entry['full_scans'] else '',
+        entry['shape'],
+    )
+    if settings.SLOW_QUERY_LOG:
+        _append(entry)
+
+
+def _append(entry):
+    path = settings.SLOW_QUERY_LOG
+    line = json.dumps(entry, ensure_ascii=False) + '\n'
+    with _write_lock:
+        try:
+            if os.path.getsize(path) >= settings.SLOW_QUERY_LOG_MAX_BYTES:
+                os.replace(path, f'{path}.1')
+        except FileNotFoundError:
+            pass
+        with open(path, 'a', encoding='utf-8') as target:
+            target.write(line)
+
+
+def read(path=None):
+    """Записи журнала, сначала из <файл>.1."""
+    path = path or settings.SLOW_QUERY_LOG
+    for name in (f'{path}.1', path):
+        try:
+            source = open(name, encoding='utf-8')
+        except FileNotFoundError:
+            continue
+        with source:
+            for line in source:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+class SlowQueryMiddleware:
+    """Запоминает имя URL страницы для записей журнала."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.view = request.path_info
+        try:
+            return self.get_response(request)
+        finally:
+            _local.view = None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _local.view = request.resolver_match.view_name
@@ -0,0 +1,96 @@
+"""Хранилище файлов с адресацией по содержимому.
+
+Имя файла — SHA-256 его содержимого, поэтому одинаковые загрузки лежат
+на диске один раз, а sorl-thumbnail, который строит имя миниатюры из
+имени исходника, делает миниатюры тоже один раз. Хэш считается по
+кускам, пока файл пишется во временный, целиком в память он не читается.
+
+Число ссылок на файл хранится в core.models.Blob: save() увеличивает
+его, delete() уменьшает и удаляет файл, когда ссылок не осталось.
+add_references() добавляет ссылки на уже сохранённые файлы, например
+при импорте постов с готовыми именами картинок.
+Файлы, сохранённые до перехода на это хранилище, delete() не трогает.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+from .models import Blob
+
+INCOMING_DIR = '.incoming'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым в _save(), суффиксы не нужны.
+        return name
+
+    def _save(self, name, content):
+        directory, basename = os.path.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        incoming = self.path(INCOMING_DIR)
+        os.makedirs(incoming, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=incoming)
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    size += len(chunk)
+                    temp_file.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = os.path.join(directory, hexdigest[:2],
+                                hexdigest + extension).replace('\\', '/')
+            full_path = self.path(name)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            with transaction.atomic():
+                Blob.objects.get_or_create(name=name,
+                                           defaults={'size': size})
+                if not os.path.exists(full_path):
+                    file_move_safe(temp_path, full_path,
+                                   allow_overwrite=True)
+                Blob.objects.filter(name=name).update(
+                    refcount=F('refcount') + 1
+                )
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return name
+
+    def delete(self, name):
+        with transaction.atomic():
+            blob = Blob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                return
+            if blob.refcount > 1:
+                Blob.objects.filter(name=name).update(
+                    refcount=F('refcount') - 1
+                )
+                return
+            blob.delete()
+            super().delete(name)
+
+    def add_references(self, counts):
+        """Добавляет ссылки на файлы: counts — {имя: число ссылок}.
+
+        Имена без записи Blob пропускаются.
+        """
+        with transaction.atomic():
+            for name, count in counts.items():
+                Blob.objects.filter(name=name).update(
+                    refcount=F('refcount') + count
+                )
+
+    def refcount(self, name):
+        blob = Blob.objects.filter(name=name).first()
+        return blob.refcount if blob else 0
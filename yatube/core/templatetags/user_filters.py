@@ -1,3 +1,4 @@
+from core.utils import CURSOR_NEXT, CURSOR_PREV, encode_cursor
 from django import template
 
 
@@ -7,3 +8,23 @@ register = template.Library()
 @register.filter
 def addclass(field, css):
     return field.as_widget(attrs={'class': css})
+
+
+def _key(page_obj):
+    paginator = page_obj.paginator
+    return (getattr(paginator, 'date_field', 'pub_date'),
+            getattr(paginator, 'pk_field', 'pk'))
+
+
+@register.filter
+def next_cursor(page_obj):
+    if not page_obj:
+        return ''
+    return encode_cursor(page_obj[-1], CURSOR_NEXT, *_key(page_obj))
+
+
+@register.filter
+def previous_cursor(page_obj):
+    if not page_obj:
+        return ''
+    return encode_cursor(page_obj[0], CURSOR_PREV, *_key(page_obj))
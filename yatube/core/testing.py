@@ -0,0 +1,38 @@
+"""Запуск тестов проекта."""
+import copy
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """Тесты пишут метрики, общий кэш, лог медленных запросов и профили
+    во временный каталог, а не в файлы работающего сайта."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.temp_dir = tempfile.mkdtemp()
+        metrics_dir = os.path.join(self.temp_dir, 'metrics')
+        os.mkdir(metrics_dir)
+        caches = copy.deepcopy(settings.CACHES)
+        for alias, options in caches.items():
+            if options.get('LOCATION', '').endswith('.sqlite3'):
+                options['LOCATION'] = os.path.join(
+                    self.temp_dir, f'{alias}.sqlite3'
+                )
+        self.temp_settings = override_settings(
+            METRICS_DIR=metrics_dir,
+            CACHES=caches,
+            SLOW_QUERY_LOG=os.path.join(self.temp_dir, 'slow_queries.jsonl'),
+            PROFILING_DIR=os.path.join(self.temp_dir, 'profiles'),
+        )
+        self.temp_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.temp_settings.disable()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
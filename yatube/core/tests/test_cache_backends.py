@@ -0,0 +1,153 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from ..cache_backends.sqlite import SQLiteCache
+from ..cache_backends.tiered import TieredCache
+
+
+def _incr_many(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_basic_operations(self):
+        """set/get/add/delete/get_many работают как у встроенных кэшей."""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertTrue(self.cache.add('new', 'value'))
+        self.assertEqual(self.cache.get_many(['key', 'new', 'missing']),
+                         {'key': {'value': 1}, 'new': 'value'})
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        with self.assertRaises(ValueError):
+            self.cache.incr('key')
+
+    def test_expired_entries_are_missing(self):
+        """Просроченная запись не возвращается и не мешает add."""
+        self.cache.set('key', 'value', 10)
+        with mock.patch('core.cache_backends.sqlite.time.time',
+                        return_value=10 ** 10):
+            self.assertIsNone(self.cache.get('key'))
+            self.assertTrue(self.cache.add('key', 'new', 10))
+
+    def test_shared_between_instances(self):
+        """Запись одного экземпляра видна другому с тем же файлом."""
+        self.cache.set('key', 'value')
+        self.assertEqual(self.make_cache().get('key'), 'value')
+
+    def test_least_recently_used_evicted(self):
+        """При превышении MAX_ENTRIES удаляются давно не читавшиеся."""
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3)
+        with mock.patch('core.cache_backends.sqlite.time.time') as now:
+            for second, key in enumerate(['a', 'b', 'c'], start=1):
+                now.return_value = 1000 + second * 10
+                cache.set(key, key, None)
+            now.return_value = 1100
+            cache.get('a')
+            cache.set('d', 'd', None)
+        self.assertEqual(cache.get_many(['a', 'b', 'c', 'd']),
+                         {'a': 'a', 'c': 'c', 'd': 'd'})
+
+    def test_size_limit(self):
+        """Суммарный размер значений не превышает MAX_SIZE."""
+        cache = self.make_cache(MAX_SIZE=10 * 1024)
+        for i in range(20):
+            cache.set(f'key{i}', b'x' * 1024)
+        entries, size = cache._connection().execute(
+            'SELECT entries, size FROM cache_stats'
+        ).fetchone()
+        self.assertLessEqual(size, 10 * 1024)
+        self.assertEqual(entries, len(cache.get_many(
+            [f'key{i}' for i in range(20)]
+        )))
+
+    def test_incr_is_atomic_across_processes(self):
+        """incr из нескольких процессов не теряет обновлений."""
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=_incr_many, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        settings = override_settings(CACHES={'l2': {
+            'BACKEND': 'core.cache_backends.sqlite.SQLiteCache',
+            'LOCATION': os.path.join(self.directory, 'cache.sqlite3'),
+        }})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.process = self.make_cache('first', STAMP_INTERVAL=0)
+        self.other_process = self.make_cache('second', STAMP_INTERVAL=0)
+        self.process.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, name, **options):
+        return TieredCache(f'{self.id()}-{name}',
+                           {'OPTIONS': {'L2': 'l2', **options}})
+
+    def test_hot_key_served_from_l1(self):
+        """Повторное чтение идёт из L1 и отдаёт копию значения."""
+        self.other_process.set('key', ['value'])
+        first = self.process.get('key')
+        first.append('изменено')
+        self.assertEqual(self.process.get('key'), ['value'])
+        stats = self.process.stats()
+        self.assertEqual((stats['l1_hits'], stats['l2_hits']), (1, 1))
+        self.assertEqual(stats['l1_hit_ratio'], 0.5)
+
+    def test_write_in_other_process_invalidates_l1(self):
+        """Запись другого процесса сбрасывает L1 через метку в L2."""
+        self.process.set('key', 'old')
+        self.assertEqual(self.process.get('key'), 'old')
+        self.other_process.set('key', 'new')
+        self.assertEqual(self.process.get('key'), 'new')
+        self.other_process.delete('key')
+        self.assertIsNone(self.process.get('key'))
+
+    def test_stale_l1_bounded_by_stamp_interval(self):
+        """Без перечитывания меток L1 отдаёт старое значение, пока не
+        пройдёт STAMP_INTERVAL.
+        """
+        process = self.make_cache('lazy', STAMP_INTERVAL=60)
+        process.set('key', 'old')
+        self.assertEqual(process.get('key'), 'old')
+        self.other_process.set('key', 'new')
+        self.assertEqual(process.get('key'), 'old')
+        process._tier.refreshed = 0.0
+        self.assertEqual(process.get('key'), 'new')
+
+    def test_clear_drops_l1_everywhere(self):
+        """clear() в одном процессе очищает L1 остальных."""
+        self.process.set('key', 'value')
+        self.other_process.clear()
+        self.assertIsNone(self.process.get('key'))
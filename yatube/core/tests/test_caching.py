@@ -0,0 +1,73 @@
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+from ..caching import bump_generations, cache_page_versioned, cache_stats
+
+
+class CachePageVersionedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.calls = 0
+        self.concurrent_response = None
+
+        @cache_page_versioned(10, 'test_page', lambda: ['test'], stale=10)
+        def view(request):
+            self.calls += 1
+            if self.calls == 2:
+                # Параллельный запрос, пришедший во время пересчёта.
+                self.concurrent_response = view(self.factory.get('/'))
+            return HttpResponse(f'ответ {self.calls}')
+
+        self.view = view
+
+    def get(self):
+        return self.view(self.factory.get('/')).content.decode()
+
+    def test_hit_and_invalidation(self):
+        """Повторный запрос берётся из кэша, смена поколения области
+        делает страницу недействительной.
+        """
+        before = cache_stats()
+        self.assertEqual(self.get(), 'ответ 1')
+        self.assertEqual(self.get(), 'ответ 1')
+        self.calls = 2
+        bump_generations('test')
+        self.assertEqual(self.get(), 'ответ 3')
+        after = cache_stats()
+        self.assertEqual(after['hit'] - before['hit'], 1)
+        self.assertEqual(after['miss'] - before['miss'], 2)
+        self.assertEqual(after['recompute'] - before['recompute'], 2)
+
+    def test_stale_served_while_single_request_recomputes(self):
+        """Истёкшую страницу пересчитывает один запрос, параллельный
+        получает устаревшую копию, а не считает её ещё раз.
+        """
+        self.get()
+        before = cache_stats()
+        with mock.patch('core.caching.time') as fake_time:
+            fake_time.time.return_value = time.time() + 15
+            self.assertEqual(self.get(), 'ответ 2')
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.concurrent_response.content.decode(),
+                         'ответ 1')
+        self.assertEqual(cache_stats()['stale'] - before['stale'], 1)
+        self.assertEqual(self.get(), 'ответ 2')
+
+
+class TestRunnerCacheTests(TestCase):
+    def test_shared_cache_is_not_site_cache(self):
+        """cache.clear() в тестах не стирает кэш работающего сайта."""
+        location = settings.CACHES['shared']['LOCATION']
+        self.assertFalse(location.startswith(settings.BASE_DIR))
+        self.assertFalse(settings.SLOW_QUERY_LOG.startswith(
+            settings.BASE_DIR
+        ))
+        self.assertFalse(settings.PROFILING_DIR.startswith(
+            settings.BASE_DIR
+        ))
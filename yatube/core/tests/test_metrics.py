@@ -0,0 +1,142 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from .. import metrics
+
+TEMP_METRICS_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+
+
+def _child(flushed=None, done=None):
+    metrics.inc('yatube_thumbnails_generated_total', 2, format='JPEG')
+    metrics.flush()
+    if flushed is not None:
+        flushed.set()
+        done.wait(10)
+
+
+@override_settings(METRICS_DIR=TEMP_METRICS_DIR, METRICS_TOKEN='secret')
+class MetricsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_METRICS_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(TEMP_METRICS_DIR, ignore_errors=True)
+        with metrics._lock:
+            metrics._values.clear()
+
+    def scrape(self, client=None):
+        response = (client or self.client).get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    def test_request_metrics(self):
+        """Гистограмма времени, коды ответов и SQL по имени URL."""
+        self.client.get(reverse('posts:index'))
+        self.client.get('/missing/')
+        text = self.scrape()
+        self.assertIn('# TYPE yatube_http_request_duration_seconds '
+                      'histogram', text)
+        self.assertIn('yatube_http_request_duration_seconds_bucket'
+                      '{le="+Inf",view="posts:index"} 1', text)
+        self.assertIn('yatube_http_request_duration_seconds_count'
+                      '{view="posts:index"} 1', text)
+        self.assertIn('yatube_http_responses_total'
+                      '{status="200",view="posts:index"} 1', text)
+        self.assertIn('yatube_http_responses_total'
+                      '{status="404",view="unmatched"} 1', text)
+        self.assertRegex(text, r'yatube_db_queries_total'
+                               r'\{view="posts:index"\} \d+')
+        self.assertIn('yatube_page_cache_total{result="miss"}', text)
+
+    def test_buckets_cumulative(self):
+        for value in (0.001, 0.03, 20):
+            metrics.observe('yatube_http_request_duration_seconds', value,
+                            view='test')
+        text = metrics.render(metrics.collect())
+        for le, count in (('0.005', 1), ('0.05', 2), ('10.0', 2),
+                          ('+Inf', 3)):
+            self.assertIn('yatube_http_request_duration_seconds_bucket'
+                          f'{{le="{le}",view="test"}} {count}', text)
+        self.assertIn('yatube_http_request_duration_seconds_sum'
+                      '{view="test"} 20.031', text)
+
+    def test_processes_summed(self):
+        """Счётчики других живых процессов складываются со своими."""
+        metrics.inc('yatube_thumbnails_generated_total', format='JPEG')
+        metrics.flush()
+        context = multiprocessing.get_context('fork')
+        flushed, done = context.Event(), context.Event()
+        process = context.Process(target=_child, args=(flushed, done))
+        process.start()
+        try:
+            flushed.wait(10)
+            totals = metrics.collect()
+        finally:
+            done.set()
+            process.join()
+        self.assertEqual(
+            totals['yatube_thumbnails_generated_total',
+                   (('format', 'JPEG'),)],
+            3,
+        )
+
+    def test_dead_processes_archived(self):
+        """Счётчики завершившихся процессов переносятся в общий файл и не
+        пропадают из суммы, а их файлы удаляются."""
+        metrics.inc('yatube_thumbnails_generated_total', format='JPEG')
+        process = multiprocessing.get_context('fork').Process(target=_child)
+        process.start()
+        process.join()
+        for _ in range(2):
+            totals = metrics.collect()
+            self.assertEqual(
+                totals['yatube_thumbnails_generated_total',
+                       (('format', 'JPEG'),)],
+                3,
+            )
+        self.assertEqual(
+            sorted(name for name in os.listdir(TEMP_METRICS_DIR)
+                   if name.endswith('.json')),
+            sorted([metrics.ARCHIVE_NAME,
+                    os.path.basename(metrics._process_path())]),
+        )
+
+    def test_access(self):
+        """Без токена и входа сотрудника страницы нет, даже с локального
+        адреса прокси."""
+        for headers in ({'REMOTE_ADDR': '127.0.0.1'},
+                        {'HTTP_AUTHORIZATION': 'Bearer wrong'}):
+            with self.subTest(headers=headers):
+                response = self.client.get(reverse('metrics'), **headers)
+                self.assertEqual(response.status_code, 404)
+        with self.settings(METRICS_TOKEN=None):
+            response = self.client.get(reverse('metrics'),
+                                       HTTP_AUTHORIZATION='Bearer None')
+            self.assertEqual(response.status_code, 404)
+        self.scrape()
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code,
+                         200)
+
+
+class TestRunnerTests(SimpleTestCase):
+    def test_metrics_dir_isolated(self):
+        """Тесты не пишут в METRICS_DIR сайта."""
+        self.assertNotEqual(settings.METRICS_DIR,
+                            os.path.join(settings.BASE_DIR, 'metrics'))
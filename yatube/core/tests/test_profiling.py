@@ -0,0 +1,98 @@
+import os
+import pstats
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import profiling
+
+TEMP_PROFILING_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+
+
+@override_settings(PROFILING_DIR=TEMP_PROFILING_DIR,
+                   PROFILING_SAMPLE_RATE=1,
+                   PROFILING_URL_NAMES=['posts:index'],
+                   PROFILING_INTERVAL=0.001)
+class ProfilingTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_PROFILING_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(TEMP_PROFILING_DIR, ignore_errors=True)
+
+    def test_sampler_writes_collapsed_stacks(self):
+        """Только выбранные страницы; стеки в формате flamegraph."""
+        self.client.get(reverse('about:author'))
+        self.assertEqual(profiling.profiles(), [])
+        sampler = profiling.StackSampler(0, 0.001)
+        sampler.stacks['a;b'] = 2
+        self.assertEqual(sampler.collapsed(), 'a;b 2\n')
+        self.client.get(reverse('posts:index'))
+        [profile] = profiling.profiles()
+        self.assertEqual(profile['view'], 'posts:index')
+        self.assertEqual(profile['format'], 'collapsed')
+        path = os.path.join(TEMP_PROFILING_DIR, profile['name'])
+        with open(path) as source:
+            for line in source:
+                self.assertRegex(line, r'^\S.*;.* \d+$')
+
+    @override_settings(PROFILING_MODE='cprofile')
+    def test_cprofile_writes_pstats(self):
+        self.client.get(reverse('posts:index'))
+        [profile] = profiling.profiles()
+        self.assertEqual(profile['format'], 'pstats')
+        stats = pstats.Stats(
+            os.path.join(TEMP_PROFILING_DIR, profile['name'])
+        )
+        self.assertTrue(any(function == 'index'
+                            for _, _, function in stats.stats))
+
+    @override_settings(PROFILING_MAX_BYTES=250)
+    def test_rotation(self):
+        """Старые профили удаляются сверх PROFILING_MAX_BYTES."""
+        def write(path):
+            with open(path, 'w') as target:
+                target.write('x' * 100)
+
+        # Длительности растут, поэтому и в одну секунду имена идут по
+        # порядку создания.
+        names = [
+            os.path.basename(profiling.save(
+                'posts:index', number / 1000, 'sampler', write
+            ))
+            for number in range(3)
+        ]
+        self.assertEqual(
+            sorted(profile['name'] for profile in profiling.profiles()),
+            names[1:],
+        )
+
+    def test_staff_page(self):
+        self.client.get(reverse('posts:index'))
+        [profile] = profiling.profiles()
+        response = self.client.get(reverse('profiles'))
+        self.assertEqual(response.status_code, 302)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('profiles'))
+        self.assertContains(response, 'posts:index')
+        self.assertEqual(response.context['slowest'][0]['name'],
+                         profile['name'])
+        response = self.client.get(
+            reverse('profile_file', args=[profile['name']])
+        )
+        self.assertEqual(response.status_code, 200)
+        response.close()
+        response = self.client.get(
+            reverse('profile_file', args=['..settings.py'])
+        )
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,82 @@
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from ..queries import (QueryBudgetExceeded, QueryBudgetMiddleware,
+                       QueryBudgetMixin, record_queries, shape, untracked)
+
+User = get_user_model()
+
+
+class ShapeTests(TestCase):
+    def test_values_and_lists_removed(self):
+        """Запросы, отличающиеся только значениями, дают одну форму."""
+        self.assertEqual(
+            shape("SELECT * FROM t WHERE a = 'x' AND b IN (1, 2, 3) "
+                  "LIMIT 21"),
+            shape('SELECT * FROM t WHERE a = \'it\'\'s\' AND b IN (7) '
+                  'LIMIT  5'),
+        )
+        self.assertEqual(shape('SELECT * FROM t WHERE a IN (%s, %s)'),
+                         'SELECT * FROM t WHERE a IN (...)')
+
+
+@override_settings(QUERY_BUDGETS={'users': 2}, QUERY_REPEAT_THRESHOLD=3,
+                   QUERY_BUDGET_SAMPLE_RATE=1, QUERY_BUDGET_RAISE=True)
+class QueryBudgetMiddlewareTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(3):
+            User.objects.create_user(username=f'user{number}')
+
+    def request(self, queries, url_name='users'):
+        def view(request):
+            for number in range(queries):
+                User.objects.filter(username=f'user{number}').exists()
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.resolver_match = type('Match', (), {'view_name': url_name})
+        return QueryBudgetMiddleware(view)(request)
+
+    def test_within_budget(self):
+        self.assertEqual(self.request(2).status_code, 200)
+
+    def test_repeated_query_raises(self):
+        """Одна форма запроса QUERY_REPEAT_THRESHOLD раз — N+1."""
+        with override_settings(QUERY_BUDGETS={'users': 5}):
+            with self.assertRaisesMessage(QueryBudgetExceeded,
+                                          'N+1: 3 раз'):
+                self.request(3)
+
+    def test_unlisted_page_only_logged(self):
+        """Страницы без бюджета не падают, нарушение пишется в лог."""
+        with self.assertLogs('core.queries', 'WARNING') as logs:
+            self.assertEqual(self.request(3, url_name='other').status_code,
+                             200)
+        self.assertIn('N+1: 3 раз', logs.output[0])
+
+    def test_budget_breach_logged_without_raise(self):
+        with override_settings(QUERY_BUDGET_RAISE=False):
+            with self.assertLogs('core.queries', 'WARNING') as logs:
+                self.assertEqual(self.request(3).status_code, 200)
+        self.assertIn('3 запросов при бюджете 2', logs.output[0])
+
+    def test_sampling(self):
+        with override_settings(QUERY_BUDGET_SAMPLE_RATE=0):
+            self.assertEqual(self.request(3).status_code, 200)
+
+    def test_untracked_queries_not_counted(self):
+        with record_queries() as log:
+            User.objects.exists()
+            with untracked():
+                User.objects.count()
+        self.assertEqual(len(log), 1)
+
+    def test_mixin(self):
+        with self.assertQueryBudget(budget=1):
+            User.objects.exists()
+        with self.assertRaises(AssertionError):
+            with self.assertQueryBudget('users'):
+                for number in range(3):
+                    User.objects.filter(username=f'user{number}').exists()
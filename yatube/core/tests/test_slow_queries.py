@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from .. import slow_queries
+from ..queries import record_queries
+
+TEMP_LOG_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_LOG = os.path.join(TEMP_LOG_DIR, 'slow_queries.jsonl')
+User = get_user_model()
+
+
+@override_settings(SLOW_QUERY_LOG=TEMP_LOG)
+class SlowQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_LOG_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(TEMP_LOG_DIR, ignore_errors=True)
+        os.makedirs(TEMP_LOG_DIR)
+
+    def slow(self):
+        """Все запросы блока считаются медленными."""
+        return self.settings(SLOW_QUERY_THRESHOLD=0)
+
+    def test_full_scan_plan(self):
+        """Поиск по тексту (search_fields админки) читает таблицу целиком."""
+        with self.slow(), self.assertLogs('core.slow_queries', 'WARNING'):
+            with record_queries() as log:
+                list(Post.objects.filter(text__icontains='пост'))
+        [entry] = slow_queries.read()
+        self.assertIn('posts_post', entry['full_scans'])
+        self.assertTrue(any('SCAN' in line for line in entry['plan']))
+        self.assertNotIn('%', entry['shape'].replace('%s', ''))
+        # EXPLAIN идёт мимо обёрток и не попадает в счётчики страницы.
+        self.assertEqual(len(log), 1)
+
+    def test_view_recorded(self):
+        with self.slow(), self.assertLogs('core.slow_queries', 'WARNING'):
+            self.client.get(reverse('posts:index'))
+        views = {entry['view'] for entry in slow_queries.read()}
+        self.assertIn('posts:index', views)
+
+    def test_fast_queries_skipped(self):
+        with self.settings(SLOW_QUERY_THRESHOLD=60):
+            list(Post.objects.all())
+        self.assertEqual(list(slow_queries.read()), [])
+
+    def test_command_report(self):
+        with self.slow(), self.assertLogs('core.slow_queries', 'WARNING'):
+            for _ in range(3):
+                list(Post.objects.filter(text__icontains='пост'))
+            Post.objects.filter(pk=0).exists()
+        out = StringIO()
+        call_command('slow_queries', '--full-scans', '--clear', stdout=out)
+        report = out.getvalue()
+        self.assertIn('форм запросов: 1', report)
+        self.assertRegex(report, r'\n\s+3 .*LIKE')
+        self.assertIn('полный просмотр: posts_post', report)
+        self.assertFalse(os.path.exists(TEMP_LOG))
+
+    @override_settings(SLOW_QUERY_LOG_MAX_BYTES=1)
+    def test_rotation(self):
+        with self.slow(), self.assertLogs('core.slow_queries', 'WARNING'):
+            for _ in range(3):
+                list(Post.objects.all())
+        self.assertTrue(os.path.exists(f'{TEMP_LOG}.1'))
+        self.assertEqual(len(list(slow_queries.read())), 2)
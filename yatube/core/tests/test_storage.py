@@ -0,0 +1,67 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from ..models import Blob
+from ..storage import ContentAddressedStorage
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.storage = ContentAddressedStorage()
+
+    def test_name_is_content_digest(self):
+        """Имя файла — SHA-256 содержимого с исходным расширением."""
+        digest = hashlib.sha256(b'meme').hexdigest()
+        name = self.storage.save('posts/Meme.GIF', ContentFile(b'meme'))
+        self.assertEqual(name, f'posts/{digest[:2]}/{digest}.gif')
+        with self.storage.open(name) as file_:
+            self.assertEqual(file_.read(), b'meme')
+
+    def test_duplicates_are_stored_once(self):
+        """Одинаковые загрузки дают одно имя и один файл со счётчиком."""
+        names = {
+            self.storage.save(f'posts/{number}.gif', ContentFile(b'same'))
+            for number in range(3)
+        }
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertEqual(self.storage.refcount(name), 3)
+        self.assertEqual(Blob.objects.get(name=name).size, 4)
+        directory = os.path.dirname(self.storage.path(name))
+        self.assertEqual(len(os.listdir(directory)), 1)
+        self.assertEqual(
+            os.listdir(self.storage.path('.incoming')), []
+        )
+
+    def test_delete_removes_file_with_last_reference(self):
+        """Файл удаляется, только когда снята последняя ссылка."""
+        name = self.storage.save('a.gif', ContentFile(b'shared'))
+        self.storage.save('b.gif', ContentFile(b'shared'))
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.storage.refcount(name), 1)
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(Blob.objects.filter(name=name).exists())
+
+    def test_delete_ignores_unmanaged_files(self):
+        """Файлы, сохранённые в обход хранилища, delete() не трогает."""
+        path = self.storage.path('legacy.gif')
+        with open(path, 'wb') as file_:
+            file_.write(b'old')
+        self.storage.delete('legacy.gif')
+        self.assertTrue(os.path.exists(path))
@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.test import RequestFactory, TestCase, override_settings
+
+from ..timing import ServerTimingMiddleware, current, timed
+
+User = get_user_model()
+received = []
+
+
+def sink(request, response, timings):
+    received.append((request.path, dict(timings.counts)))
+
+
+def failing_sink(request, response, timings):
+    raise RuntimeError('сбой')
+
+
+@override_settings(SERVER_TIMING_HEADER=True,
+                   SERVER_TIMING_SINKS=[f'{__name__}.sink'])
+class ServerTimingMiddlewareTests(TestCase):
+    def setUp(self):
+        received.clear()
+
+    def request(self, view, path='/'):
+        return ServerTimingMiddleware(view)(RequestFactory().get(path))
+
+    def test_phases_in_header_and_sink(self):
+        """SQL, кэш, шаблоны и помеченные блоки попадают в заголовок."""
+        def view(request):
+            User.objects.exists()
+            User.objects.count()
+            cache.set('timing', 1)
+            cache.get('timing')
+            with timed('thumbnail'):
+                with timed('thumbnail'):
+                    pass
+            return render(request, 'core/404.html', {'path': '/'})
+
+        response = self.request(view, '/page/')
+        header = response['Server-Timing']
+        self.assertRegex(header, r'db;dur=[\d.]+;desc="2"')
+        self.assertRegex(header, r'template;dur=[\d.]+;desc="1"')
+        self.assertRegex(header, r'thumbnail;dur=[\d.]+;desc="1"')
+        self.assertIn('cache;dur=', header)
+        self.assertRegex(header, r'total;dur=[\d.]+$')
+        path, counts = received[0]
+        self.assertEqual(path, '/page/')
+        self.assertEqual(counts['db'], 2)
+        # L2 внутри многоуровневого кэша отдельно не считается.
+        self.assertEqual(counts['cache'], 2)
+
+    def test_nothing_measured_outside_request(self):
+        self.request(lambda request: HttpResponse())
+        self.assertIsNone(current())
+        with timed('db'):
+            User.objects.exists()
+
+    def test_header_disabled_and_sink_errors_logged(self):
+        with override_settings(SERVER_TIMING_HEADER=False,
+                               SERVER_TIMING_SINKS=[
+                                   f'{__name__}.failing_sink',
+                                   f'{__name__}.sink',
+                               ]):
+            with mock.patch('core.timing.logger') as logger:
+                response = self.request(lambda request: HttpResponse())
+        self.assertNotIn('Server-Timing', response)
+        logger.exception.assert_called_once()
+        self.assertEqual(len(received), 1)
@@ -0,0 +1,46 @@
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import RequestDataTooBig
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..uploads import BoundedUploadHandler
+
+User = get_user_model()
+
+
+@override_settings(FILE_UPLOAD_MAX_SIZE=1024, DATA_UPLOAD_MAX_MEMORY_SIZE=512)
+class BoundedUploadHandlerTests(TestCase):
+    def test_rejects_by_content_length(self):
+        """Тело больше лимита отклоняется до чтения, ответ 400."""
+        user = User.objects.create_user(username='auth')
+        client = Client()
+        client.force_login(user)
+        response = client.post(reverse('posts:post_create'), {
+            'text': 'проверка',
+            'image': SimpleUploadedFile('big.gif', b'x' * 4096,
+                                        content_type='image/gif'),
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_while_streaming(self):
+        """Если Content-Length занижен, загрузка обрывается на лимите."""
+        handler = BoundedUploadHandler()
+        handler.handle_raw_input(BytesIO(), {}, 100, b'boundary')
+        handler.new_file('image', 'big.gif', 'image/gif', None)
+        handler.receive_data_chunk(b'x' * 1000, 0)
+        with self.assertRaises(RequestDataTooBig):
+            handler.receive_data_chunk(b'x' * 1000, 1000)
+        self.assertTrue(handler.file.closed)
+
+    def test_small_upload_goes_to_disk(self):
+        """Даже маленький файл пишется во временный файл."""
+        handler = BoundedUploadHandler()
+        handler.handle_raw_input(BytesIO(), {}, 100, b'boundary')
+        handler.new_file('image', 'small.gif', 'image/gif', 10)
+        handler.receive_data_chunk(b'x' * 10, 0)
+        uploaded = handler.file_complete(10)
+        self.assertTrue(hasattr(uploaded, 'temporary_file_path'))
+        uploaded.close()
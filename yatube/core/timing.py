@@ -0,0 +1,179 @@
+"""Время запроса по фазам: SQL, шаблоны, кэш, миниатюры.
+
+ServerTimingMiddleware на время запроса заводит в потоке счётчики
+фаз. Фазы собирают обёртки вокруг курсора базы (execute_wrapper),
+Template.render шаблонного движка Django, операций бэкендов из CACHES
+и всё, что помечено timed() (миниатюры, см. posts.thumbnails). Вложенные
+вызовы той же фазы (L1 кэша вызывает L2, шаблон формы внутри страницы)
+не считаются повторно, а разные фазы могут пересекаться: время миниатюр
+включает их запросы к кэшу и базе.
+
+Итог уходит в заголовок Server-Timing (SERVER_TIMING_HEADER) и в
+функции из SERVER_TIMING_SINKS, которые получают (request, response,
+timings).
+
+Накладные расходы (timeit, Python 3.11): middleware — около 20 мкс на
+запрос, обёрнутая операция — около 1,5 мкс в запросе и 1 мкс вне его.
+Страница index или profile делает 15–20 таких операций, то есть
+получается меньше 0,1 мс при p50 от 20 мс (bench_views, scale 0.1, кэш
+выключен). Бюджет — 100 мкс на запрос и не больше 1 % p50 страницы;
+сравнить можно через bench_views --without-middleware
+core.timing.ServerTimingMiddleware.
+"""
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+PHASES = ('db', 'template', 'cache', 'thumbnail')
+CACHE_METHODS = ('add', 'get', 'set', 'touch', 'delete', 'get_many',
+                 'has_key', 'incr', 'decr', 'set_many', 'delete_many',
+                 'clear')
+
+_local = threading.local()
+_install_lock = threading.Lock()
+_installed = False
+
+
+class Timings:
+    """Суммарное время (секунды) и число операций по фазам."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.durations = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(PHASES, 0)
+        self.active = set()
+
+    @property
+    def total(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def header(self):
+        """Значение заголовка Server-Timing."""
+        metrics = [
+            f'{phase};dur={self.durations[phase] * 1000:.2f};'
+            f'desc="{self.counts[phase]}"'
+            for phase in PHASES if self.counts[phase]
+        ]
+        metrics.append(f'total;dur={self.total * 1000:.2f}')
+        return ', '.join(metrics)
+
+
+def current():
+    """Счётчики текущего запроса или None."""
+    return getattr(_local, 'timings', None)
+
+
+def _measure(phase, function, *args, **kwargs):
+    timings = getattr(_local, 'timings', None)
+    if timings is None or phase in timings.active:
+        return function(*args, **kwargs)
+    timings.active.add(phase)
+    started = time.perf_counter()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        timings.active.discard(phase)
+        timings.durations[phase] += time.perf_counter() - started
+        timings.counts[phase] += 1
+
+
+@contextmanager
+def timed(phase):
+    """Добавляет время блока к фазе phase текущего запроса.
+
+    Работает и как декоратор. Вне запроса и внутри той же фазы ничего
+    не измеряет.
+    """
+    timings = current()
+    if timings is None or phase in timings.active:
+        yield
+        return
+    timings.active.add(phase)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.active.discard(phase)
+        timings.durations[phase] += time.perf_counter() - started
+        timings.counts[phase] += 1
+
+
+def _timed_method(method, phase):
+    # Без contextmanager: обёртка стоит на каждой операции кэша.
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        if getattr(_local, 'timings', None) is None:
+            return method(*args, **kwargs)
+        return _measure(phase, method, *args, **kwargs)
+    wrapper.timed = True
+    return wrapper
+
+
+def _wrap(cls, name, phase):
+    method = cls.__dict__.get(name)
+    if method is not None and not getattr(method, 'timed', False):
+        setattr(cls, name, _timed_method(method, phase))
+
+
+def install():
+    """Оборачивает Template.render и методы бэкендов кэша; один раз."""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        _wrap(Template, 'render', 'template')
+        for params in settings.CACHES.values():
+            backend = import_string(params['BACKEND'])
+            for cls in backend.__mro__:
+                for name in CACHE_METHODS:
+                    _wrap(cls, name, 'cache')
+        _installed = True
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    return _measure('db', execute, sql, params, many, context)
+
+
+def log_sink(request, response, timings):
+    """Пишет фазы запроса в лог 'core.timing' на уровне DEBUG."""
+    logger.debug('%s %s %s', request.method, request.path, timings.header())
+
+
+class ServerTimingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sinks = [import_string(path)
+                      for path in settings.SERVER_TIMING_SINKS]
+        install()
+
+    def __call__(self, request):
+        timings = Timings()
+        _local.timings = timings
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(_db_wrapper)
+                    )
+                response = self.get_response(request)
+        finally:
+            _local.timings = None
+            timings.finished = time.perf_counter()
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = timings.header()
+        for sink in self.sinks:
+            try:
+                sink(request, response, timings)
+            except Exception:
+                logger.exception('Ошибка в приёмнике метрик %r', sink)
+        return response
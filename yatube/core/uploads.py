@@ -0,0 +1,38 @@
+"""Обработчик загрузок с ограничением размера.
+
+Файлы всегда пишутся во временный файл на диске кусками по chunk_size,
+в памяти процесса целиком не оказываются. Загрузка больше
+FILE_UPLOAD_MAX_SIZE прерывается, как только это становится известно:
+по заголовку Content-Length ещё до чтения тела или по мере получения
+кусков, если клиент его не прислал или прислал неверный. Запрос в этом
+случае завершается ответом 400, как и при превышении
+DATA_UPLOAD_MAX_MEMORY_SIZE.
+"""
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class BoundedUploadHandler(TemporaryFileUploadHandler):
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        limit = settings.FILE_UPLOAD_MAX_SIZE
+        if settings.DATA_UPLOAD_MAX_MEMORY_SIZE is not None:
+            # Кроме файла в теле есть обычные поля формы.
+            limit += settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        if content_length > limit:
+            raise RequestDataTooBig(
+                'Тело запроса больше FILE_UPLOAD_MAX_SIZE.'
+            )
+        self.received = 0
+
+    def new_file(self, *args, **kwargs):
+        self.received = 0
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.FILE_UPLOAD_MAX_SIZE:
+            self.file.close()
+            raise RequestDataTooBig('Файл больше FILE_UPLOAD_MAX_SIZE.')
+        return super().receive_data_chunk(raw_data, start)
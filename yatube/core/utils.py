@@ -1,9 +1,130 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import json
+from contextlib import contextmanager
 
+from django.core.paginator import Page, Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 
-def page(request, post_list):
-    COUNT_POST = 10
-    paginator = Paginator(post_list, COUNT_POST)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+COUNT_POST = 10
+CURSOR_NEXT = 'next'
+CURSOR_PREV = 'prev'
+
+
+def encode_cursor(obj, direction=CURSOR_NEXT, date_field='pub_date',
+                  pk_field='pk'):
+    """Непрозрачный токен позиции объекта в ленте."""
+    raw = json.dumps([direction, getattr(obj, date_field).isoformat(),
+                      getattr(obj, pk_field)])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разбирает токен в (direction, date, pk) или возвращает None."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, value, pk = json.loads(raw)
+        date = parse_datetime(value)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if (direction not in (CURSOR_NEXT, CURSOR_PREV) or date is None
+            or not isinstance(pk, int)):
+        return None
+    return direction, date, pk
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу (date_field, pk_field) без COUNT(*) и OFFSET.
+
+    Стоимость страницы не зависит от её глубины: каждая страница —
+    это один запрос с условием по ключу и LIMIT per_page + 1. Ключом
+    может быть и аннотация, если лента упорядочена по полям другой
+    таблицы.
+
+    Страницы — обычные Page: номер 1 или 2 (есть ли предыдущая) и
+    num_pages на единицу больше, если есть следующая, так что
+    has_next() и has_previous() отвечают без COUNT(*).
+    """
+
+    def __init__(self, object_list, per_page, date_field='pub_date',
+                 pk_field='pk'):
+        super().__init__(object_list, per_page)
+        self.date_field = date_field
+        self.pk_field = pk_field
+
+    def get_page(self, cursor=None):
+        field, pk_field = self.date_field, self.pk_field
+        decoded = decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            direction, queryset = CURSOR_NEXT, self.object_list
+        else:
+            direction, date, pk = decoded
+            lookup = 'lt' if direction == CURSOR_NEXT else 'gt'
+            queryset = self.object_list.filter(
+                Q(**{f'{field}__{lookup}': date})
+                | Q(**{field: date, f'{pk_field}__{lookup}': pk})
+            )
+        if direction == CURSOR_NEXT:
+            ordering = (f'-{field}', f'-{pk_field}')
+        else:
+            ordering = (field, pk_field)
+        items = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if decoded is not None and not items:
+            # Курсор за концом ленты: устаревшая ссылка или подделка.
+            return self.get_page()
+        if direction == CURSOR_NEXT:
+            return self._page(items, has_more, decoded is not None)
+        if not has_more:
+            return self.get_page()
+        items.reverse()
+        return self._page(items, True, True)
+
+    def _page(self, items, has_next, has_previous):
+        number = 2 if has_previous else 1
+        self.num_pages = number + has_next
+        return Page(items, number, self)
+
+
+def page(request, post_list, **key):
+    """Страница ленты по курсору; key — date_field и pk_field для
+    CursorPaginator.
+
+    Номер страницы (?page=) понимается только ради старых ссылок: такая
+    страница считает COUNT(*) и читает с OFFSET.
+    """
+    number = request.GET.get('page')
+    if number is not None and 'cursor' not in request.GET:
+        return Paginator(post_list, COUNT_POST).get_page(number)
+    return CursorPaginator(post_list, COUNT_POST, **key).get_page(
+        request.GET.get('cursor')
+    )
+
+
+@contextmanager
+def explicit_auto_now_add(model, *field_names):
+    """Отключает auto_now_add у полей модели, чтобы bulk_create сохранил
+    даты, заданные явно (перенос и генерация данных).
+    """
+    fields = [model._meta.get_field(name) for name in field_names]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def bulk_batch_size(model, batch_size, objs):
+    """batch_size для bulk_create в пределах лимитов базы.
+
+    Django 2.2 не ограничивает заданный batch_size сам, а SQLite
+    не принимает больше 999 параметров и 500 строк в одном INSERT.
+    """
+    return min(batch_size, max(
+        connection.ops.bulk_batch_size(model._meta.concrete_fields, objs), 1
+    ))
@@ -1,7 +1,16 @@
+import os
 from http import HTTPStatus
 
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.conf import settings
+from django.contrib import admin
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from django.shortcuts import render
 
+from . import metrics, profiling
+from .caching import cache_stats
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path},
@@ -19,3 +28,47 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=HTTPStatus.FORBIDDEN)
+
+
+@staff_member_required
+def page_cache_stats(request):
+    stats = {'pages': cache_stats()}
+    if hasattr(cache, 'stats'):
+        stats['backend'] = cache.stats()
+    return JsonResponse(stats)
+
+
+def prometheus_metrics(request):
+    """Метрики всех процессов для Prometheus; доступны сотрудникам и по
+    токену METRICS_TOKEN."""
+    if not request.user.is_staff and not metrics.authorized(request):
+        raise Http404
+    return HttpResponse(metrics.render(metrics.collect()),
+                        content_type=metrics.CONTENT_TYPE)
+
+
+@staff_member_required
+def profiles(request):
+    found = profiling.profiles()
+    return render(request, 'core/profiles.html', {
+        **admin.site.each_context(request),
+        'title': 'Профили запросов',
+        'recent': found[:settings.PROFILING_LIST_SIZE],
+        'slowest': sorted(
+            found, key=lambda profile: profile['duration'], reverse=True
+        )[:settings.PROFILING_LIST_SIZE],
+        'sample_rate': settings.PROFILING_SAMPLE_RATE,
+        'url_names': settings.PROFILING_URL_NAMES,
+        'mode': settings.PROFILING_MODE,
+    })
+
+
+@staff_member_required
+def profile_file(request, name):
+    if not profiling.FILE_NAME.match(name):
+        raise Http404
+    try:
+        file_ = open(os.path.join(settings.PROFILING_DIR, name), 'rb')
+    except FileNotFoundError:
+        raise Http404
+    return FileResponse(file_, as_attachment=True, filename=name)
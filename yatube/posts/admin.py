@@ -1,14 +1,46 @@
 from django.contrib import admin
+from django.http import StreamingHttpResponse
 
+from . import export
 from .models import Comment, Follow, Group, Post
 
 
+def _export_action(name, format_):
+    def action(modeladmin, request, queryset):
+        response = StreamingHttpResponse(
+            export.lines(name, format_, queryset),
+            content_type=export.CONTENT_TYPES[format_],
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{name}.{format_}"'
+        )
+        return response
+
+    action.short_description = f'Выгрузить в {format_.upper()}'
+    action.__name__ = f'export_{format_}'
+    return action
+
+
+def export_actions(name):
+    return [_export_action(name, format_) for format_ in export.FORMATS]
+
+
 class PostAdmin(admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
+    actions = export_actions('posts')
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'group':
+            # Список групп читается один раз при сборке формы, а не в
+            # каждой строке list_editable.
+            field.choices = list(field.choices)
+        return field
 
 
 admin.site.register(Post, PostAdmin)
@@ -25,6 +57,7 @@ class CommentAdmin(admin.ModelAdmin):
     list_display = ('pk', 'post', 'author', 'text', 'created')
     search_fields = ('text',)
     list_filter = ('created',)
+    actions = export_actions('comments')
 
 
 admin.site.register(Comment, CommentAdmin)
@@ -33,6 +66,7 @@ admin.site.register(Comment, CommentAdmin)
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'author')
     search_fields = ('author',)
+    actions = export_actions('follows')
 
 
 admin.site.register(Follow, FollowAdmin)
@@ -0,0 +1,27 @@
+"""Области кэша страниц приложения posts (см. core.caching)."""
+import hashlib
+
+INDEX = 'index'
+GROUPS = 'groups'
+
+
+def _digest(value):
+    # slug и username могут содержать символы, недопустимые в ключах
+    # memcached, поэтому в ключ идёт хэш.
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+def group_scope(slug):
+    return f'group:{_digest(slug)}'
+
+
+def author_scope(username):
+    return f'author:{_digest(username)}'
+
+
+def post_scopes(post):
+    """Области лент, в которых показан пост."""
+    scopes = [INDEX, author_scope(post.author.username)]
+    if post.group_id:
+        scopes.append(group_scope(post.group.slug))
+    return scopes
@@ -0,0 +1,121 @@
+"""Денормализованные счётчики постов, комментариев и подписчиков.
+
+Счётчики обновляются сигналами атомарно через F-выражения. Массовые
+операции в обход сигналов (bulk_create, update, delete на queryset без
+сигналов) приводят к расхождению, его исправляет команда
+repair_counters.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import AuthorCounter, Comment, Follow, Group, Post
+
+BATCH_SIZE = 500
+
+
+def _add(field, delta):
+    # Разошедшийся с данными счётчик может уже быть нулём: уменьшение не
+    # должно нарушать ограничение PositiveIntegerField.
+    if delta < 0:
+        return Greatest(F(field) + delta, 0)
+    return F(field) + delta
+
+
+def _change_author(author_id, field, delta):
+    updated = AuthorCounter.objects.filter(user_id=author_id).update(
+        **{field: _add(field, delta)}
+    )
+    if not updated and delta > 0:
+        AuthorCounter.objects.get_or_create(user_id=author_id)
+        updated = AuthorCounter.objects.filter(user_id=author_id).update(
+            **{field: _add(field, delta)}
+        )
+    return updated
+
+
+def change_author_posts(author_id, delta):
+    _change_author(author_id, 'post_count', delta)
+
+
+def change_author_followers(author_id, delta):
+    """Меняет число подписчиков автора и возвращает новое значение или
+    None, если счётчика автора нет.
+    """
+    if _change_author(author_id, 'follower_count', delta):
+        return AuthorCounter.objects.filter(user_id=author_id).values_list(
+            'follower_count', flat=True
+        ).first()
+    return None
+
+
+def change_group_posts(group_id, delta):
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(
+            post_count=_add('post_count', delta)
+        )
+
+
+def change_post_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comment_count=_add('comment_count', delta)
+    )
+
+
+def _count(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def repair():
+    """Пересчитывает счётчики по данным и возвращает число исправленных
+    строк по каждому счётчику.
+    """
+    repaired = {}
+    groups = Group.objects.annotate(actual=_count(Post, 'group'))
+    repaired['group.post_count'] = groups.exclude(
+        post_count=F('actual')
+    ).count()
+    Group.objects.update(post_count=_count(Post, 'group'))
+
+    posts = Post.objects.annotate(actual=_count(Comment, 'post'))
+    repaired['post.comment_count'] = posts.exclude(
+        comment_count=F('actual')
+    ).count()
+    Post.objects.update(comment_count=_count(Comment, 'post'))
+
+    def totals(model, field):
+        return dict(model.objects.order_by().values(field).annotate(
+            total=Count('pk')
+        ).values_list(field, 'total'))
+
+    posts = totals(Post, 'author')
+    followers = totals(Follow, 'author')
+    stored = {row[0]: row[1:] for row in AuthorCounter.objects.values_list(
+        'user', 'post_count', 'follower_count'
+    )}
+    actual = {user_id: (posts.get(user_id, 0), followers.get(user_id, 0))
+              for user_id in posts.keys() | followers.keys()}
+    empty = (0, 0)
+    wrong = {user_id for user_id in actual.keys() | stored.keys()
+             if actual.get(user_id, empty) != stored.get(user_id, empty)}
+    for index, name in enumerate(('author.post_count',
+                                  'author.follower_count')):
+        repaired[name] = sum(
+            actual.get(user_id, empty)[index]
+            != stored.get(user_id, empty)[index]
+            for user_id in wrong
+        )
+    wrong = sorted(wrong)
+    for start in range(0, len(wrong), BATCH_SIZE):
+        chunk = wrong[start:start + BATCH_SIZE]
+        AuthorCounter.objects.filter(user_id__in=chunk).delete()
+        AuthorCounter.objects.bulk_create(
+            AuthorCounter(user_id=user_id, post_count=actual[user_id][0],
+                          follower_count=actual[user_id][1])
+            for user_id in chunk if user_id in actual
+        )
+    return repaired
@@ -0,0 +1,105 @@
+"""Гибридная лента подписок: push для обычных авторов, pull для популярных.
+
+Посты популярных авторов (см. posts.timeline) не раскладываются по
+лентам при публикации, а читаются в момент запроса — отдельным запросом
+с LIMIT на каждого такого автора из подписок, диапазоном индекса
+post_author_pub_date, — и сливаются с материализованной лентой через
+heapq.merge. Поэтому страница ленты выполняет на запрос больше на
+каждого популярного автора; follow_index сообщает об этом бюджету
+запросов (core.queries.expect_queries).
+
+Лента упорядочена по ключу FEED_KEY — дате и id поста из TimelineEntry,
+чтобы страница читалась по индексу timeline_user_feed, а не сортировала
+всю ленту пользователя. Его передают в core.utils.page и
+CursorPaginator.
+"""
+import heapq
+from itertools import islice
+from operator import attrgetter
+
+from django.db.models import F
+
+from .models import Post
+from .timeline import pulled_follows
+
+FEED_KEY = {'date_field': 'feed_date', 'pk_field': 'feed_id'}
+FEED_ORDERING = ('-feed_date', '-feed_id')
+
+
+class MergedFeed:
+    """Ленивое k-way слияние querysets с одинаковым порядком сортировки.
+
+    Поддерживает ровно то, что нужно Paginator и CursorPaginator:
+    filter(), order_by(), count() и срезы. counted — querysets, сумма
+    COUNT(*) которых равна длине слияния (по умолчанию сами querysets):
+    так много источников можно посчитать одним запросом.
+    """
+    ordered = True
+
+    def __init__(self, *querysets, ordering=('-pub_date', '-pk'),
+                 counted=None):
+        self.querysets = querysets
+        self.ordering = tuple(ordering)
+        self.counted = querysets if counted is None else tuple(counted)
+
+    def filter(self, *args, **kwargs):
+        return MergedFeed(
+            *(qs.filter(*args, **kwargs) for qs in self.querysets),
+            ordering=self.ordering,
+            counted=[qs.filter(*args, **kwargs) for qs in self.counted],
+        )
+
+    def order_by(self, *fields):
+        return MergedFeed(*self.querysets, ordering=fields,
+                          counted=self.counted)
+
+    def count(self):
+        return sum(qs.count() for qs in self.counted)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start, stop = key.start or 0, key.stop
+        sources = [qs.order_by(*self.ordering) for qs in self.querysets]
+        if stop is not None:
+            sources = [qs[:stop] for qs in sources]
+        merged = heapq.merge(
+            *sources,
+            key=attrgetter(*(field.lstrip('-') for field in self.ordering)),
+            reverse=self.ordering[0].startswith('-'),
+        )
+        return list(islice(merged, start, stop))
+
+
+def pulled_posts(author_ids):
+    """Посты авторов в порядке FEED_KEY."""
+    return Post.objects.filter(author_id__in=author_ids).annotate(
+        feed_date=F('pub_date'), feed_id=F('pk'),
+    ).select_related('author', 'group').order_by(*FEED_ORDERING)
+
+
+def follow_feed(user):
+    """Лента подписок пользователя в виде queryset или MergedFeed;
+    у MergedFeed по источнику на каждого популярного автора."""
+    pulled = list(pulled_follows(user.follower.all()).values_list(
+        'author_id', flat=True
+    ))
+    pushed = Post.objects.filter(timeline_entries__user=user).annotate(
+        feed_date=F('timeline_entries__pub_date'),
+        feed_id=F('timeline_entries__post_id'),
+    ).select_related('author', 'group').order_by(*FEED_ORDERING)
+    if not pulled:
+        return pushed
+    pushed = pushed.exclude(author_id__in=pulled)
+    return MergedFeed(
+        pushed,
+        *(pulled_posts([author_id]) for author_id in pulled),
+        ordering=FEED_ORDERING,
+        counted=[pushed, pulled_posts(pulled)],
+    )
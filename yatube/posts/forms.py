@@ -1,5 +1,8 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 
+from . import images
 from .models import Comment, Post
 
 
@@ -13,6 +16,10 @@ class PostForm(forms.ModelForm):
                       'image': "Изображение к посту",
                       }
 
+    def __init__(self, *args, upload_error=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_error = upload_error
+
     def clean_text(self):
         data = self.cleaned_data['text']
         if 'проверка' not in data.lower():
@@ -21,6 +28,26 @@ class PostForm(forms.ModelForm):
 
         return data
 
+    def clean_image(self):
+        if self.upload_error:
+            raise forms.ValidationError(self.upload_error)
+        image = self.cleaned_data['image']
+        if not isinstance(image, UploadedFile):
+            return image
+        width, height = images.header_size(image)
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise forms.ValidationError(
+                'Картинка слишком большая: не больше %(limit)s '
+                'мегапикселей.',
+                params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+            )
+        return images.downscale(image)
+
+    def save(self, commit=True):
+        if 'image' in self.changed_data:
+            images.fill(self.instance, self.cleaned_data.get('image'))
+        return super().save(commit)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
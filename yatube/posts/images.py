@@ -0,0 +1,85 @@
+"""Обработка картинки поста при загрузке.
+
+Размер проверяется по заголовку до распаковки пикселей, слишком большие
+картинки уменьшаются. Размеры и средний цвет считаются один раз и
+хранятся в Post, чтобы шаблонам и миниатюрам не приходилось открывать
+файл только ради них.
+"""
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image
+
+PREVIEW_SIZE = (64, 64)
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'PNG': {'optimize': True},
+}
+
+
+def header_size(file_):
+    """Размеры картинки по заголовку, без распаковки пикселей."""
+    file_.seek(0)
+    try:
+        with Image.open(file_) as image:
+            return image.size
+    finally:
+        file_.seek(0)
+
+
+def downscale(file_):
+    """Уменьшает картинку до POST_IMAGE_MAX_SIDE по большей стороне.
+
+    Возвращает новый временный файл или file_, если уменьшать не нужно.
+    JPEG распаковывается сразу в уменьшенном масштабе (draft), поэтому
+    память ограничена размером результата, а не исходника.
+    """
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    if max(header_size(file_)) <= max_side:
+        return file_
+    with Image.open(file_) as image:
+        format_ = image.format
+        image.draft(image.mode, (max_side, max_side))
+        image.thumbnail((max_side, max_side), Image.LANCZOS,
+                        reducing_gap=3.0)
+        if format_ == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+            image = image.convert('RGB')
+        resized = TemporaryUploadedFile(
+            os.path.basename(file_.name), file_.content_type, 0, None
+        )
+        image.save(resized, format_, **SAVE_OPTIONS.get(format_, {}))
+    resized.size = resized.tell()
+    resized.seek(0)
+    file_.close()
+    return resized
+
+
+def describe(file_):
+    """Возвращает (ширина, высота, цвет '#rrggbb') картинки file_.
+
+    Позиция файла возвращается в начало, чтобы его можно было сохранить.
+    """
+    file_.seek(0)
+    try:
+        with Image.open(file_) as image:
+            width, height = image.size
+            image.draft('RGB', PREVIEW_SIZE)
+            preview = image.convert('RGB')
+            preview.thumbnail(PREVIEW_SIZE)
+            red, green, blue = preview.resize((1, 1), Image.BOX).getpixel(
+                (0, 0)
+            )
+    finally:
+        file_.seek(0)
+    return width, height, f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def fill(post, file_=None):
+    """Заполняет image_width, image_height и image_color поста."""
+    if not post.image:
+        post.image_width = post.image_height = None
+        post.image_color = ''
+        return
+    file_ = file_ or post.image
+    post.image_width, post.image_height, post.image_color = describe(file_)
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from posts import images
+from posts.models import Post
+
+BATCH_SIZE = 200
+FIELDS = ('image_width', 'image_height', 'image_color')
+
+
+class Command(BaseCommand):
+    help = ('Заполняет размеры и цвет картинок у постов, загруженных '
+            'до появления этих полей.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Сколько постов обрабатывать за один запрос.',
+        )
+
+    def handle(self, *args, batch_size, **options):
+        queryset = (
+            Post.objects.exclude(image='')
+            .filter(image_width__isnull=True)
+            .only('pk', 'image', *FIELDS)
+            .order_by('pk')
+        )
+        last_pk = 0
+        filled = failed = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            described = []
+            for post in batch:
+                try:
+                    with post.image.open('rb'):
+                        images.fill(post)
+                except (OSError, ValueError) as error:
+                    failed += 1
+                    self.stderr.write(f'Пост {post.pk}: {error}')
+                    continue
+                described.append(post)
+            Post.objects.bulk_update(described, FIELDS)
+            filled += len(described)
+        self.stdout.write(self.style.SUCCESS(
+            f'Заполнено постов: {filled}, ошибок: {failed}'
+        ))
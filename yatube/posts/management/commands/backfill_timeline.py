@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='id пользователя; можно указать несколько раз.',
+        )
+
+    def handle(self, *args, user_ids=None, **options):
+        with transaction.atomic():
+            count = timeline.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты пересобраны, подписок обработано: {count}'
+        ))
@@ -0,0 +1,106 @@
+import random
+import time
+from statistics import median
+
+from core.utils import CursorPaginator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from posts import counters, timeline
+from posts.feed import FEED_KEY, follow_feed
+from posts.models import Follow, Post
+
+User = get_user_model()
+
+# push — всё раскладывается по лентам; pull — ничего не раскладывается,
+# лента читается исходным join по подпискам; hybrid — порог из --threshold.
+MODES = {
+    'push': None,
+    'pull': 0,
+    'hybrid': 'threshold',
+}
+DISTRIBUTIONS = ('uniform', 'powerlaw')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает push, pull и гибридную ленту подписок на '
+            'синтетических данных. Данные создаются в транзакции и '
+            'откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=300)
+        parser.add_argument('--follows', type=int, default=30,
+                            help='Подписок на одного пользователя.')
+        parser.add_argument('--posts', type=int, default=300,
+                            help='Публикаций на этапе записи.')
+        parser.add_argument('--threshold', type=int, default=50,
+                            help='FEED_PULL_THRESHOLD для гибрида.')
+        parser.add_argument('--reads', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"распределение":<14}{"режим":<8}{"запись, мс/пост":>17}'
+            f'{"строк ленты":>13}{"чтение p50, мс":>16}{"запросов":>10}'
+        )
+        for distribution in DISTRIBUTIONS:
+            for mode, threshold in MODES.items():
+                if threshold == 'threshold':
+                    threshold = options['threshold']
+                with transaction.atomic():
+                    row = self.run(distribution, threshold, options)
+                    transaction.set_rollback(True)
+                self.stdout.write(
+                    f'{distribution:<14}{mode:<8}{row[0]:>17.3f}'
+                    f'{row[1]:>13}{row[2]:>16.3f}{row[3]:>10.1f}'
+                )
+
+    def run(self, distribution, threshold, options):
+        rng = random.Random(options['seed'])
+        User.objects.bulk_create(
+            User(username=f'bench_feed_{i}') for i in range(options['users'])
+        )
+        users = list(User.objects.filter(username__startswith='bench_feed_'))
+        if distribution == 'powerlaw':
+            weights = [1 / (rank + 1) ** 1.2 for rank in range(len(users))]
+        else:
+            weights = [1] * len(users)
+        follows = set()
+        for user in users:
+            for author in rng.choices(users, weights, k=options['follows']):
+                if author != user:
+                    follows.add((user.pk, author.pk))
+        Follow.objects.bulk_create(
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in follows
+        )
+        # Подписки созданы в обход сигналов: счётчики подписчиков, по
+        # которым выбирается pull, пересчитываются.
+        counters.repair()
+        with override_settings(FEED_PULL_THRESHOLD=threshold):
+            timeline.reset_modes()
+            authors = rng.choices(users, weights, k=options['posts'])
+            started = time.perf_counter()
+            for author in authors:
+                Post.objects.create(author=author, text='Проверка')
+            write_ms = ((time.perf_counter() - started) * 1000
+                        / options['posts'])
+            rows = timeline.TimelineEntry.objects.count()
+            timings, queries = [], []
+            for user in rng.choices(users, k=options['reads']):
+                started = time.perf_counter()
+                with CaptureQueriesContext(connection) as captured:
+                    if threshold == 0:
+                        paginator = CursorPaginator(Post.objects.filter(
+                            author__following__user=user
+                        ).select_related('author', 'group'), 10)
+                    else:
+                        paginator = CursorPaginator(follow_feed(user), 10,
+                                                    **FEED_KEY)
+                    list(paginator.get_page())
+                timings.append((time.perf_counter() - started) * 1000)
+                queries.append(len(captured))
+        return (write_ms, rows, median(timings),
+                sum(queries) / len(queries))
@@ -0,0 +1,94 @@
+import time
+import tracemalloc
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from PIL import Image
+
+from posts.forms import PostForm
+
+MB = 1024 * 1024
+# Обработчики Django по умолчанию с порогом, при котором файл остаётся
+# в памяти; так до core.uploads работали загрузки до 2,5 МБ.
+IN_MEMORY = {
+    'FILE_UPLOAD_HANDLERS': [
+        'django.core.files.uploadhandler.MemoryFileUploadHandler',
+        'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+    ],
+    'FILE_UPLOAD_MAX_MEMORY_SIZE': 1024 * MB,
+}
+BOUNDED = {'FILE_UPLOAD_HANDLERS': ['core.uploads.BoundedUploadHandler']}
+
+
+class Command(BaseCommand):
+    help = ('Измеряет пиковую память Python (tracemalloc) на разборе '
+            'загрузки и проверке картинки в PostForm. Память Pillow под '
+            'пиксели tracemalloc не видит, она ограничена '
+            'POST_IMAGE_MAX_SIDE.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megapixels', type=float, default=12,
+                            help='Размер картинки-шума.')
+        parser.add_argument('--limit-mb', type=float, default=None,
+                            help='FILE_UPLOAD_MAX_SIZE для проверки отказа; '
+                                 'по умолчанию половина размера файла.')
+
+    def handle(self, *args, megapixels, limit_mb, **options):
+        content = self.make_jpeg(megapixels)
+        size = len(content)
+        limit = int(limit_mb * MB) if limit_mb else size // 2
+        self.stdout.write(f'Картинка: {megapixels:g} Мп, {size / MB:.1f} МБ')
+        self.stdout.write(
+            f'{"обработчик":<28}{"пик, МБ":>9}{"время, мс":>11}  результат'
+        )
+        cases = (
+            ('в памяти', IN_MEMORY, size * 2),
+            ('на диске с ограничением', BOUNDED, size * 2),
+            ('отказ по размеру', BOUNDED, limit),
+        )
+        for label, handlers, max_size in cases:
+            with override_settings(FILE_UPLOAD_MAX_SIZE=max_size,
+                                   **handlers):
+                peak, elapsed, result = self.measure(content)
+            self.stdout.write(
+                f'{label:<28}{peak / MB:>9.2f}{elapsed * 1000:>11.1f}'
+                f'  {result}'
+            )
+
+    def make_jpeg(self, megapixels):
+        side = int((megapixels * 10 ** 6) ** 0.5)
+        image = Image.effect_noise((side, side), 64).convert('RGB')
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=90)
+        return buffer.getvalue()
+
+    def measure(self, content):
+        request = RequestFactory().post('/create/', {
+            'text': 'проверка',
+            'image': SimpleUploadedFile('bench.jpg', content,
+                                        content_type='image/jpeg'),
+        })
+        tracemalloc.start()
+        started = time.perf_counter()
+        files = {}
+        try:
+            files = request.FILES
+            form = PostForm(request.POST, files)
+            if form.is_valid():
+                result = 'принято'
+            else:
+                result = '; '.join(
+                    error for errors in form.errors.values()
+                    for error in errors
+                )
+        except Exception as error:
+            result = f'{type(error).__name__}: {error}'
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        for file_ in files.values():
+            file_.close()
+        return peak, elapsed, result
@@ -0,0 +1,275 @@
+import json
+import platform
+import time
+from io import StringIO
+from statistics import mean, quantiles
+from unittest import mock
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count
+from django.template.backends.django import Template
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Group, Post
+
+User = get_user_model()
+PREFIX = 'bench_views'
+VIEWS = ('index', 'group_list', 'profile', 'post_detail', 'follow_index')
+# off — кэш страниц отключён, каждый запрос считает страницу;
+# on — рабочий кэш, после прогрева запросы попадают в него.
+CACHE_MODES = ('off', 'on')
+DUMMY_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+METRICS = ('p50', 'p95', 'p99', 'queries', 'render', 'rps')
+
+
+class RenderTimer:
+    """Суммирует время Template.render; вложенные вызовы (виджеты форм)
+    не считаются повторно."""
+
+    def __init__(self):
+        self.total = 0
+        self.depth = 0
+        self.original = Template.render
+
+    def __enter__(self):
+        timer = self
+
+        def render(template, *args, **kwargs):
+            timer.depth += 1
+            started = time.perf_counter()
+            try:
+                return timer.original(template, *args, **kwargs)
+            finally:
+                timer.depth -= 1
+                if not timer.depth:
+                    timer.total += time.perf_counter() - started
+
+        self.patch = mock.patch.object(Template, 'render', render)
+        self.patch.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.patch.stop()
+
+
+class Command(BaseCommand):
+    help = ('Измеряет index, group_list, profile, post_detail и '
+            'follow_index через WSGI-приложение в том же процессе на '
+            'данных команды seed нескольких масштабов: задержки p50/p95/'
+            'p99, запросы к базе и время шаблонов на запрос, запросы в '
+            'секунду. Данные создаются в транзакции и откатываются. '
+            'Результаты сохраняются в JSON (--output) и сравниваются с '
+            'сохранённым ранее прогоном (--baseline).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, action='append',
+                            help='Масштаб seed; можно повторять. По '
+                                 'умолчанию 0.01 и 0.1.')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Измеряемых запросов на представление.')
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--cache', choices=CACHE_MODES, action='append',
+                            help='Режим кэша страниц; по умолчанию off.')
+        parser.add_argument('--view', choices=VIEWS, action='append')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--without-middleware', action='append',
+                            default=[], metavar='PATH',
+                            help='Убрать middleware из MIDDLEWARE, чтобы '
+                                 'измерить его накладные расходы.')
+        parser.add_argument('--output', help='Файл для результатов в JSON.')
+        parser.add_argument('--baseline',
+                            help='JSON прошлого прогона для сравнения.')
+        parser.add_argument('--max-regression', type=float,
+                            help='Ошибка, если p95 какого-либо '
+                                 'представления выросло больше чем на '
+                                 'столько процентов от --baseline.')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as source:
+                baseline = {
+                    self.key(result): result
+                    for result in json.load(source)['results']
+                }
+        unknown = set(options['without_middleware']) - set(
+            settings.MIDDLEWARE
+        )
+        if unknown:
+            raise CommandError(f'Нет в MIDDLEWARE: {", ".join(unknown)}.')
+        with override_settings(MIDDLEWARE=[
+            path for path in settings.MIDDLEWARE
+            if path not in options['without_middleware']
+        ]):
+            self.handler = WSGIHandler()
+        self.stdout.write(
+            f'{"масштаб":>8} {"кэш":<4}{"представление":<14}{"p50":>8}'
+            f'{"p95":>8}{"p99":>8}{"запросов":>10}{"шаблоны":>9}'
+            f'{"зап/с":>8}'
+        )
+        self.stdout.write(f'{"":>8} {"":<4}{"":<14}{"мс":>8}{"мс":>8}'
+                          f'{"мс":>8}{"":>10}{"мс":>9}')
+        results = []
+        for scale in options['scale'] or [0.01, 0.1]:
+            with transaction.atomic():
+                results.extend(self.run_scale(scale, options, baseline))
+                transaction.set_rollback(True)
+        if options['output']:
+            with open(options['output'], 'w') as target:
+                json.dump({
+                    'created': timezone.now().isoformat(),
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'database': connection.vendor,
+                    'requests': options['requests'],
+                    'without_middleware': options['without_middleware'],
+                    'results': results,
+                }, target, ensure_ascii=False, indent=2)
+        if baseline and options['max_regression'] is not None:
+            regressed = [
+                result for result in results
+                if self.key(result) in baseline
+                and self.change(result, baseline[self.key(result)], 'p95')
+                > options['max_regression']
+            ]
+            if regressed:
+                raise CommandError(
+                    f'p95 выросло больше чем на '
+                    f'{options["max_regression"]:g}%: ' + ', '.join(
+                        f'{result["view"]} (масштаб {result["scale"]:g}, '
+                        f'кэш {result["cache"]})' for result in regressed
+                    )
+                )
+
+    @staticmethod
+    def key(result):
+        return result['scale'], result['cache'], result['view']
+
+    @staticmethod
+    def change(result, base, metric):
+        """Изменение метрики относительно base в процентах."""
+        if not base[metric]:
+            return 0
+        return (result[metric] - base[metric]) / base[metric] * 100
+
+    def run_scale(self, scale, options, baseline):
+        call_command('seed', scale=scale, seed=options['seed'],
+                     prefix=PREFIX, stdout=StringIO())
+        paths = self.paths()
+        cookie = self.login()
+        results = []
+        for mode in options['cache'] or ['off']:
+            caches = DUMMY_CACHES if mode == 'off' else settings.CACHES
+            # Бюджеты запросов здесь не проверяются: запросы считает сам
+            # бенчмарк, а нарушение не должно обрывать прогон.
+            with override_settings(CACHES=caches,
+                                   QUERY_BUDGET_SAMPLE_RATE=0):
+                for view in options['view'] or VIEWS:
+                    result = dict(
+                        scale=scale, cache=mode, view=view,
+                        **self.measure(paths[view], cookie, options),
+                    )
+                    results.append(result)
+                    self.report(result, baseline)
+        return results
+
+    def paths(self):
+        """Самые тяжёлые страницы набора: популярная группа, плодовитый
+        автор, пост с наибольшим числом комментариев."""
+        seeded = Post.objects.filter(author__username__startswith=PREFIX)
+        group = Group.objects.filter(slug__startswith=PREFIX).annotate(
+            posts=Count('group_posts')
+        ).order_by('-posts').first()
+        author = User.objects.filter(username__startswith=PREFIX).annotate(
+            posts=Count('user_posts')
+        ).order_by('-posts').first()
+        post = seeded.order_by('-comment_count', 'pk').first()
+        return {
+            'index': reverse('posts:index'),
+            'group_list': reverse('posts:group_list', args=[group.slug]),
+            'profile': reverse('posts:profile', args=[author.username]),
+            'post_detail': reverse('posts:post_detail', args=[post.pk]),
+            'follow_index': reverse('posts:follow_index'),
+        }
+
+    def login(self):
+        """Cookie сессии читателя с наибольшим числом подписок."""
+        reader = User.objects.filter(username__startswith=PREFIX).annotate(
+            follows=Count('follower')
+        ).order_by('-follows').first()
+        client = Client()
+        client.force_login(reader)
+        return f'{settings.SESSION_COOKIE_NAME}=' + client.cookies[
+            settings.SESSION_COOKIE_NAME
+        ].value
+
+    def request(self, path, cookie):
+        environ = RequestFactory().get(path, HTTP_COOKIE=cookie).environ
+        statuses = []
+        response = self.handler(
+            environ, lambda status, headers: statuses.append(status)
+        )
+        try:
+            b''.join(response)
+        finally:
+            response.close()
+        if not statuses[0].startswith('200'):
+            raise CommandError(f'{path}: ответ {statuses[0]}.')
+
+    def measure(self, path, cookie, options):
+        # Как и тестовый клиент, не закрываем соединение вокруг запроса:
+        # данные живут в незавершённой транзакции.
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            for _ in range(options['warmup']):
+                self.request(path, cookie)
+            timings, queries = [], []
+            with RenderTimer() as renders:
+                started = time.perf_counter()
+                for _ in range(options['requests']):
+                    begun = time.perf_counter()
+                    with CaptureQueriesContext(connection) as captured:
+                        self.request(path, cookie)
+                    timings.append(time.perf_counter() - begun)
+                    queries.append(len(captured))
+                elapsed = time.perf_counter() - started
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+        cuts = quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+        return {
+            'path': path,
+            'p50': cuts[49] * 1000,
+            'p95': cuts[94] * 1000,
+            'p99': cuts[98] * 1000,
+            'queries': mean(queries),
+            'render': renders.total / len(timings) * 1000,
+            'rps': len(timings) / elapsed,
+        }
+
+    def report(self, result, baseline):
+        self.stdout.write(
+            f'{result["scale"]:>8g} {result["cache"]:<4}{result["view"]:<14}'
+            f'{result["p50"]:>8.2f}{result["p95"]:>8.2f}{result["p99"]:>8.2f}'
+            f'{result["queries"]:>10.1f}{result["render"]:>9.2f}'
+            f'{result["rps"]:>8.0f}'
+        )
+        base = baseline and baseline.get(self.key(result))
+        if base:
+            self.stdout.write(f'{"":>8} {"":<4}{"к базовому":<14}' + ''.join(
+                f'{self.change(result, base, metric):>+{width}.0f}%'
+                for metric, width in zip(METRICS, (7, 7, 7, 9, 8, 7))
+            ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import uploads
+
+
+class Command(BaseCommand):
+    help = ('Удаляет загрузки по частям, которые не обновлялись '
+            'UPLOAD_STAGING_TTL секунд.')
+
+    def handle(self, *args, **options):
+        count = uploads.clean_stale()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено незавершённых загрузок: {count}'
+        ))
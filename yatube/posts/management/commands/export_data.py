@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = ('Выгружает посты, комментарии или подписки в JSONL или CSV '
+            'потоком, не загружая таблицу в память.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(export.EXPORTS))
+        parser.add_argument('--format', choices=export.FORMATS,
+                            default='jsonl')
+        parser.add_argument('--output', '-o',
+                            help='Файл; по умолчанию stdout.')
+
+    def handle(self, *args, name, output=None, **options):
+        format_ = options['format']
+        started = time.perf_counter()
+        count = 0
+        if output:
+            with open(output, 'w', encoding='utf-8', newline='') as target:
+                for line in export.lines(name, format_):
+                    target.write(line)
+                    count += 1
+        else:
+            for line in export.lines(name, format_):
+                self.stdout.write(line, ending='')
+                count += 1
+        if format_ == 'csv':
+            count -= 1
+        elapsed = time.perf_counter() - started
+        self.stderr.write(
+            f'{name}: {count} строк за {elapsed:.1f} с '
+            f'({count / elapsed if elapsed else 0:.0f} строк/с)'
+        )
@@ -0,0 +1,293 @@
+import csv
+import json
+import os
+import time
+from collections import Counter
+
+from core.caching import bump_generations
+from core.models import Blob
+from core.utils import bulk_batch_size, explicit_auto_now_add
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import cache, counters, thumbnails, timeline
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
+CHUNK_SIZE = 10000
+BATCH_SIZE = 1000
+# Авторов и групп в одном запросе с __in; ограничено числом параметров
+# запроса в SQLite.
+IDS_PER_QUERY = 500
+
+
+def chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), IDS_PER_QUERY):
+        yield ids[start:start + IDS_PER_QUERY]
+
+
+class Command(BaseCommand):
+    help = ('Импортирует посты из JSONL или CSV с полями text, author, '
+            'group, pub_date, image. Вставка пачками bulk_create в '
+            'транзакциях по --chunk-size записей; после каждой '
+            'транзакции позиция пишется в файл контрольной точки, и '
+            'повторный запуск продолжает с неё. Картинка — имя файла в '
+            'MEDIA_ROOT; ссылки на неё учитываются в хранилище, записи с '
+            'несуществующим файлом импортируются без картинки. В конце '
+            'пересчитываются счётчики, ленты подписок и размеры картинок, '
+            'ставятся в очередь миниатюры и сбрасывается кэш страниц.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=('jsonl', 'csv'),
+                            help='По умолчанию — по расширению файла.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Записей в одной транзакции.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Строк в одном INSERT.')
+        parser.add_argument('--checkpoint',
+                            help='Файл контрольной точки; по умолчанию '
+                                 '<path>.checkpoint.')
+        parser.add_argument('--create-missing', action='store_true',
+                            help='Создавать неизвестных авторов и группы '
+                                 'вместо пропуска записей.')
+        parser.add_argument('--no-followup', action='store_true',
+                            help='Не пересчитывать производные данные.')
+
+    def handle(self, *args, path, **options):
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден.')
+        format_ = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'jsonl'
+        )
+        self.checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        self.create_missing = options['create_missing']
+        state = self.load_checkpoint()
+        if state['after_pk'] is None:
+            # Импортированные посты — всё, что новее этого pk: по ним
+            # followup находит авторов, группы и картинки.
+            state['after_pk'] = Post.objects.aggregate(
+                last=Max('pk')
+            )['last'] or 0
+        self.authors = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.images = {}
+        self.storage = Post._meta.get_field('image').storage
+        if state['records']:
+            self.stdout.write(
+                f'Продолжение с записи {state["records"]}.'
+            )
+        started = time.monotonic()
+        imported = 0
+        with open(path, newline='', encoding='utf-8') as source:
+            records = self.read(source, format_)
+            for _ in range(state['records']):
+                next(records, None)
+            chunk = []
+            for record in records:
+                chunk.append(record)
+                if len(chunk) == options['chunk_size']:
+                    imported += self.import_chunk(chunk, state, options)
+                    self.report(state, imported, started)
+                    chunk = []
+            if chunk:
+                imported += self.import_chunk(chunk, state, options)
+                self.report(state, imported, started)
+        if not options['no_followup']:
+            self.followup(state)
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано постов: {imported}, '
+            f'пропущено записей: {state["skipped"]}'
+        ))
+
+    def read(self, source, format_):
+        if format_ == 'csv':
+            yield from csv.DictReader(source)
+            return
+        for line in source:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield record if isinstance(record, dict) else None
+
+    def load_checkpoint(self):
+        state = {'records': 0, 'skipped': 0, 'after_pk': None}
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as checkpoint:
+                state.update(json.load(checkpoint))
+        return state
+
+    def save_checkpoint(self, state):
+        temp_path = f'{self.checkpoint_path}.tmp'
+        with open(temp_path, 'w') as checkpoint:
+            json.dump(state, checkpoint)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def resolve(self, records):
+        """Создаёт недостающих авторов и группы одной пачкой."""
+        if not self.create_missing:
+            return
+        usernames, slugs = set(), set()
+        for record in records:
+            if record and record.get('author'):
+                usernames.add(record['author'])
+            if record and record.get('group'):
+                slugs.add(record['group'])
+        usernames -= self.authors.keys()
+        slugs -= self.groups.keys()
+        if usernames:
+            users = [User(username=username) for username in usernames]
+            for user in users:
+                user.set_unusable_password()
+            User.objects.bulk_create(users, ignore_conflicts=True)
+            self.authors.update(User.objects.filter(
+                username__in=usernames
+            ).values_list('username', 'pk'))
+        if slugs:
+            Group.objects.bulk_create(
+                (Group(title=slug, slug=slug, description='')
+                 for slug in slugs),
+                ignore_conflicts=True,
+            )
+            self.groups.update(Group.objects.filter(
+                slug__in=slugs
+            ).values_list('slug', 'pk'))
+
+    def resolve_images(self, records):
+        """Проверяет картинки пачки: имя из хранилища или '', если файла
+        нет."""
+        names = {
+            record['image'] for record in records
+            if record and record.get('image')
+        } - self.images.keys()
+        if not names:
+            return
+        stored = set(Blob.objects.filter(
+            name__in=names
+        ).values_list('name', flat=True))
+        for name in names:
+            self.images[name] = name
+            if name in stored:
+                continue
+            # Файлы до перехода на ContentAddressedStorage хранилище не
+            # удаляет, на них можно ссылаться без учёта.
+            try:
+                if not self.storage.exists(name):
+                    self.images[name] = ''
+            except SuspiciousFileOperation:
+                self.images[name] = ''
+
+    def build(self, record, now):
+        """Пост из записи или None, если запись не подходит."""
+        if not record or not record.get('text'):
+            return None
+        author_id = self.authors.get(record.get('author'))
+        if author_id is None:
+            return None
+        group_id = None
+        if record.get('group'):
+            group_id = self.groups.get(record['group'])
+            if group_id is None:
+                return None
+        pub_date = now
+        if record.get('pub_date'):
+            try:
+                pub_date = parse_datetime(record['pub_date'])
+            except ValueError:
+                pub_date = None
+            if pub_date is None:
+                return None
+            if timezone.is_naive(pub_date):
+                pub_date = timezone.make_aware(pub_date)
+        return Post(
+            text=record['text'],
+            author_id=author_id,
+            group_id=group_id,
+            image=self.images.get(record.get('image'), ''),
+            pub_date=pub_date,
+        )
+
+    def import_chunk(self, records, state, options):
+        with transaction.atomic():
+            self.resolve(records)
+            self.resolve_images(records)
+            posts = []
+            now = timezone.now()
+            for record in records:
+                post = self.build(record, now)
+                if post is None:
+                    state['skipped'] += 1
+                    continue
+                posts.append(post)
+            with explicit_auto_now_add(Post, 'pub_date'):
+                Post.objects.bulk_create(posts, batch_size=bulk_batch_size(
+                    Post, options['batch_size'], posts
+                ))
+            images = Counter(post.image.name for post in posts if post.image)
+            self.storage.add_references(images)
+        state['records'] += len(records)
+        self.save_checkpoint(state)
+        return len(posts)
+
+    def report(self, state, imported, started):
+        elapsed = time.monotonic() - started
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(
+            f'Обработано записей: {state["records"]}, импортировано в этом '
+            f'запуске: {imported} ({rate:.0f}/с)'
+        )
+
+    def followup(self, state):
+        self.stdout.write('Пересчёт счётчиков...')
+        with transaction.atomic():
+            counters.repair()
+        imported = Post.objects.filter(
+            pk__gt=state['after_pk']
+        ).order_by()
+        authors = imported.values_list('author_id', flat=True).distinct()
+        groups = imported.exclude(group=None).values_list(
+            'group_id', flat=True
+        ).distinct()
+        followers, usernames, slugs = set(), [], []
+        for chunk in chunks(authors):
+            followers.update(Follow.objects.filter(
+                author_id__in=chunk
+            ).values_list('user_id', flat=True))
+            usernames += User.objects.filter(
+                pk__in=chunk
+            ).values_list('username', flat=True)
+        for chunk in chunks(groups):
+            slugs += Group.objects.filter(
+                pk__in=chunk
+            ).values_list('slug', flat=True)
+        if followers:
+            self.stdout.write('Пересборка лент подписок...')
+            with transaction.atomic():
+                timeline.rebuild(followers)
+        if imported.exclude(image='').filter(
+                image_width__isnull=True).exists():
+            call_command('backfill_image_meta', stdout=self.stdout,
+                         stderr=self.stderr)
+        images = imported.exclude(image='').values_list(
+            'image', flat=True
+        ).distinct()
+        for name in images.iterator():
+            thumbnails.schedule(name)
+        bump_generations(
+            cache.INDEX, cache.GROUPS,
+            *map(cache.author_scope, usernames),
+            *map(cache.group_scope, slugs),
+        )
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счётчики постов, '
+            'комментариев и подписчиков и исправляет расхождения.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            repaired = counters.repair()
+        for name, count in repaired.items():
+            self.stdout.write(f'{name}: исправлено {count}')
+        if repaired['author.follower_count']:
+            self.stdout.write(self.style.WARNING(
+                'Изменилось число подписчиков: пересоберите ленты командой '
+                'backfill_timeline.'
+            ))
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны.'))
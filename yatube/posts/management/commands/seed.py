@@ -0,0 +1,199 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from core.caching import bump_generations
+from core.utils import bulk_batch_size, explicit_auto_now_add
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+
+from posts import cache, counters, timeline
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+BATCH_SIZE = 5000
+# Объёмы при --scale 1; посты и комментарии растут линейно.
+USERS = 1000
+GROUPS = 20
+POSTS = 100000
+COMMENTS_PER_POST = 0.3
+MAX_FOLLOWS = 200
+# Чем больше показатель, тем сильнее перекос к первым элементам:
+# индекс = int(n * random() ** SKEW).
+AUTHOR_SKEW = 3
+FOLLOW_SKEW = 4
+COMMENT_SKEW = 4
+TEXT_POOL = 2000
+PERIOD = timedelta(days=365)
+
+
+def skewed(rng, count, skew):
+    """Индекс от 0 до count - 1 со степенным распределением."""
+    return min(int(count * rng.random() ** skew), count - 1)
+
+
+class Command(BaseCommand):
+    help = ('Генерирует воспроизводимый набор данных для нагрузочных '
+            'тестов: пользователей, группы, посты со степенным '
+            'распределением по авторам, подписки на популярных авторов '
+            'и комментарии, сосредоточенные на немногих постах. '
+            'Одинаковые --scale и --seed дают одинаковые данные.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1,
+                            help=f'Множитель объёма; 1 — {USERS} '
+                                 f'пользователей и {POSTS} постов.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--until', default='2025-01-01',
+                            help='Дата последнего поста; посты '
+                                 'распределяются по году до неё.')
+        parser.add_argument('--prefix', default='seed',
+                            help='Префикс имён пользователей и групп.')
+
+    def handle(self, *args, scale, seed, batch_size, until, prefix,
+               **options):
+        self.rng = random.Random(seed)
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(seed)
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.until = timezone.make_aware(datetime.fromisoformat(until))
+        self.texts = [self.fake.paragraph(nb_sentences=3)
+                      for _ in range(TEXT_POOL)]
+        started = time.monotonic()
+        users = self.step('пользователи', self.create_users,
+                          max(int(USERS * scale), 2))
+        groups = self.step('группы', self.create_groups,
+                           max(int(GROUPS * scale ** 0.5), 1))
+        self.step('подписки', self.create_follows, users)
+        posts = self.step('посты', self.create_posts, users, groups,
+                          int(POSTS * scale))
+        self.step('комментарии', self.create_comments, users, posts,
+                  int(POSTS * scale * COMMENTS_PER_POST))
+        self.step('счётчики и ленты', self.followup, users)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с'
+        ))
+
+    def step(self, title, method, *args):
+        started = time.monotonic()
+        with transaction.atomic():
+            result = method(*args)
+        count = len(result) if result is not None else ''
+        self.stdout.write(
+            f'{title}: {count} за {time.monotonic() - started:.1f} с'
+        )
+        return result
+
+    def insert(self, model, objs):
+        model.objects.bulk_create(objs, batch_size=bulk_batch_size(
+            model, self.batch_size, objs
+        ))
+
+    def create_users(self, count):
+        users = [
+            User(
+                username=f'{self.prefix}_{number}',
+                first_name=self.fake.first_name(),
+                last_name=self.fake.last_name(),
+                password=UNUSABLE_PASSWORD_PREFIX,
+            )
+            for number in range(count)
+        ]
+        self.insert(User, users)
+        return list(User.objects.filter(
+            username__startswith=f'{self.prefix}_'
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def create_groups(self, count):
+        groups = [
+            Group(
+                title=self.fake.catch_phrase(),
+                slug=f'{self.prefix}-{number}',
+                description=self.rng.choice(self.texts),
+            )
+            for number in range(count)
+        ]
+        self.insert(Group, groups)
+        return list(Group.objects.filter(
+            slug__startswith=f'{self.prefix}-'
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def create_follows(self, users):
+        # Число подписок и выбор авторов — степенные: у немногих авторов
+        # очень много подписчиков, большинство подписано на нескольких.
+        # Популярность перемешана относительно активности (create_posts),
+        # иначе самый плодовитый автор был бы и самым читаемым, и ленты
+        # разрастались бы до миллионов записей.
+        popular = list(users)
+        self.rng.shuffle(popular)
+        follows = []
+        for user_id in users:
+            count = 1 + skewed(self.rng, min(MAX_FOLLOWS, len(users)),
+                               FOLLOW_SKEW)
+            authors = {popular[skewed(self.rng, len(users), FOLLOW_SKEW)]
+                       for _ in range(count)}
+            authors.discard(user_id)
+            follows.extend(Follow(user_id=user_id, author_id=author_id)
+                           for author_id in sorted(authors))
+            if len(follows) >= self.batch_size:
+                self.insert(Follow, follows)
+                follows = []
+        self.insert(Follow, follows)
+        return users
+
+    def create_posts(self, users, groups, count):
+        start = self.until - PERIOD
+        step = PERIOD / max(count, 1)
+        batch = []
+        with explicit_auto_now_add(Post, 'pub_date'):
+            for number in range(count):
+                group_id = None
+                if self.rng.random() < 0.7:
+                    group_id = groups[skewed(self.rng, len(groups), 2)]
+                batch.append(Post(
+                    author_id=users[skewed(self.rng, len(users),
+                                           AUTHOR_SKEW)],
+                    group_id=group_id,
+                    text=self.rng.choice(self.texts),
+                    pub_date=start + step * number,
+                ))
+                if len(batch) == self.batch_size:
+                    self.insert(Post, batch)
+                    batch = []
+            self.insert(Post, batch)
+        return list(Post.objects.filter(
+            author_id__in=users
+        ).order_by('-pub_date', '-pk').values_list('pk', 'pub_date'))
+
+    def create_comments(self, users, posts, count):
+        # Комментарии достаются в основном свежим постам: у большинства
+        # постов их нет совсем, у немногих — десятки.
+        batch = []
+        with explicit_auto_now_add(Comment, 'created'):
+            for _ in range(count):
+                post_id, pub_date = posts[skewed(self.rng, len(posts),
+                                                 COMMENT_SKEW)]
+                batch.append(Comment(
+                    post_id=post_id,
+                    author_id=self.rng.choice(users),
+                    text=self.fake.sentence(),
+                    created=pub_date + timedelta(
+                        minutes=self.rng.randint(1, 24 * 60)
+                    ),
+                ))
+                if len(batch) == self.batch_size:
+                    self.insert(Comment, batch)
+                    batch = []
+            self.insert(Comment, batch)
+        return range(count)
+
+    def followup(self, users):
+        counters.repair()
+        timeline.rebuild(users)
+        bump_generations(cache.INDEX, cache.GROUPS)
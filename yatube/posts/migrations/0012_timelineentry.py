@@ -0,0 +1,70 @@
+# Generated by Django 2.2.16 on 2026-10-18 01:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_timelines(apps, schema_editor):
+    """Ленты подписок из существующих подписок и постов: без этого лента
+    каждого пользователя пуста до запуска backfill_timeline."""
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    connection = schema_editor.connection
+    quote = connection.ops.quote_name
+    post, follow = Post._meta, Follow._meta
+    timeline = TimelineEntry._meta
+    columns = ', '.join(
+        quote(timeline.get_field(name).column)
+        for name in ('user', 'post', 'author', 'pub_date')
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(timeline.db_table)} ({columns}) '
+            f'SELECT f.{quote(follow.get_field("user").column)}, '
+            f'p.{quote(post.pk.column)}, '
+            f'p.{quote(post.get_field("author").column)}, '
+            f'p.{quote(post.get_field("pub_date").column)} '
+            f'FROM {quote(follow.db_table)} f '
+            f'JOIN {quote(post.db_table)} p '
+            f'ON p.{quote(post.get_field("author").column)} = '
+            f'f.{quote(follow.get_field("author").column)}'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0011_auto_20220518_2008'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-pub_date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date'], name='timeline_user_pub_date'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'author'], name='timeline_user_author'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_post'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
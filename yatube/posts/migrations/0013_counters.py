@@ -0,0 +1,61 @@
+# Generated by Django 2.2.16 on 2026-10-18 01:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.functions
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    AuthorCounter = apps.get_model('posts', 'AuthorCounter')
+
+    def count(model, field):
+        return models.functions.Coalesce(models.Subquery(
+            model.objects.filter(**{field: models.OuterRef('pk')}).order_by(
+            ).values(field).annotate(total=models.Count('pk')).values(
+                'total'
+            ),
+            output_field=models.IntegerField(),
+        ), 0)
+
+    Group.objects.update(post_count=count(Post, 'group'))
+    Post.objects.update(comment_count=count(Comment, 'post'))
+    AuthorCounter.objects.bulk_create(
+        (AuthorCounter(user_id=author_id, post_count=total)
+         for author_id, total in Post.objects.order_by().values(
+             'author'
+         ).annotate(total=models.Count('pk')).values_list('author', 'total')),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0012_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('post_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 2.2.16 on 2026-10-18 10:05
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_blob'),
+        ('posts', '0015_post_image_meta'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/'),
+        ),
+    ]
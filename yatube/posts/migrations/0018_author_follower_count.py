@@ -0,0 +1,41 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:49
+
+from django.db import migrations, models
+import django.db.models.functions
+
+
+def fill_follower_counts(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    AuthorCounter = apps.get_model('posts', 'AuthorCounter')
+    followers = Follow.objects.order_by().values('author').annotate(
+        total=models.Count('pk')
+    )
+    AuthorCounter.objects.update(follower_count=models.functions.Coalesce(
+        models.Subquery(
+            followers.filter(author=models.OuterRef('pk')).values('total'),
+            output_field=models.IntegerField(),
+        ), 0,
+    ))
+    existing = set(AuthorCounter.objects.values_list('user_id', flat=True))
+    AuthorCounter.objects.bulk_create(
+        (AuthorCounter(user_id=author_id, follower_count=total)
+         for author_id, total in followers.values_list('author', 'total')
+         if author_id not in existing),
+        batch_size=300,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorcounter',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_follower_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-18 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_feed_pulled(apps, schema_editor):
+    threshold = settings.FEED_PULL_THRESHOLD
+    if threshold is None:
+        return
+    AuthorCounter = apps.get_model('posts', 'AuthorCounter')
+    AuthorCounter.objects.filter(follower_count__gte=threshold).update(
+        feed_pulled=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_post_image_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorcounter',
+            name='feed_pulled',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(fill_feed_pulled, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,6 @@
+import uuid
+
+from core.storage import ContentAddressedStorage
 from django.contrib.auth import get_user_model
 from django.db import models
 
@@ -9,6 +12,7 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    post_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f'<Group {self.title}>'
@@ -29,15 +33,55 @@ class Post(models.Model):
         null=True,
         related_name='group_posts',
     )
-    image = models.ImageField(upload_to='posts/', blank=True)
+    image = models.ImageField(
+        upload_to='posts/',
+        blank=True,
+        storage=ContentAddressedStorage(),
+    )
+    image_width = models.PositiveIntegerField(
+        null=True, blank=True, editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        null=True, blank=True, editable=False
+    )
+    image_color = models.CharField(max_length=7, blank=True, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date'),
+            models.Index(fields=['image'], name='post_image'),
+        ]
 
     def __str__(self):
         return self.text[:NUM_SYMBOLS]
 
 
+class AuthorCounter(models.Model):
+    """Число постов и подписчиков автора, чтобы не считать их COUNT(*) на
+    каждой странице и при каждой публикации, и способ доставки его постов
+    в ленты (feed_pulled, см. posts.timeline).
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counter',
+    )
+    post_count = models.PositiveIntegerField(default=0)
+    follower_count = models.PositiveIntegerField(default=0)
+    feed_pulled = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f'{self.user}: {self.post_count}'
+
+
 class Comment(models.Model):
     post = models.ForeignKey(
         Post,
@@ -53,7 +97,11 @@ class Comment(models.Model):
     created = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ['-created']
+        ordering = ['-created', '-id']
+        indexes = [
+            models.Index(fields=['post', '-created', '-id'],
+                         name='comment_post_created'),
+        ]
 
     def __str__(self):
         return self.text[:NUM_SYMBOLS]
@@ -78,6 +126,69 @@ class Follow(models.Model):
             models.CheckConstraint(check=~models.Q(author=models.F('user')),
                                    name='author_not_user'),
         ]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user'),
+        ]
 
     def __str__(self):
         return f'{self.user} подписан на автора {self.author}'
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписок пользователя, записанный при публикации."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date', '-post']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_post'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_feed'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author'),
+        ]
+
+    def __str__(self):
+        return f'{self.post} в ленте {self.user}'
+
+
+class ChunkedUpload(models.Model):
+    """Картинка, которую клиент загружает по частям (см. posts.uploads)."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4,
+                          editable=False)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='chunked_uploads',
+    )
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.PositiveIntegerField()
+    offset = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+
+    @property
+    def complete(self):
+        return self.offset == self.size
+
+    def __str__(self):
+        return f'{self.filename}: {self.offset} из {self.size}'
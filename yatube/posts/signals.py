@@ -0,0 +1,204 @@
+import threading
+
+from core.caching import bump_generations
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import cache, counters, thumbnails, timeline
+from .models import Comment, Follow, Group, Post, User
+
+_local = threading.local()
+
+
+def _deleting(model):
+    """id объектов model, которые сейчас удаляются вместе со связанными
+    (pre_delete уже отправлен, post_delete ещё нет)."""
+    deleting = getattr(_local, 'deleting', None)
+    if deleting is None:
+        deleting = _local.deleting = {}
+    return deleting.setdefault(model, set())
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.push_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, raw=False, **kwargs):
+    if instance.image and not raw:
+        name = instance.image.name
+        transaction.on_commit(lambda: thumbnails.schedule(name))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        with transaction.atomic():
+            followers = counters.change_author_followers(
+                instance.author_id, 1
+            )
+            timeline.add_author(instance.user_id, instance.author_id,
+                                followers)
+
+
+@receiver(pre_delete, sender=User)
+def remember_deleted_user(sender, instance, **kwargs):
+    _deleting(User).add(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def forget_deleted_user(sender, instance, **kwargs):
+    _deleting(User).discard(instance.pk)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    # Подписки удаляемого автора уходят вместе с его постами и счётчиком.
+    if instance.author_id in _deleting(User):
+        return
+    with transaction.atomic():
+        timeline.remove_author(instance.user_id, instance.author_id)
+        followers = counters.change_author_followers(
+            instance.author_id, -1
+        )
+        if followers is not None:
+            timeline.unpull(instance.author_id, followers)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_state(sender, instance, raw=False, **kwargs):
+    instance._old_group_id = instance._old_group_slug = None
+    instance._old_image = ''
+    # Новый файл ещё не сохранён: хранилище добавит на него ссылку.
+    instance._image_uploaded = bool(instance.image) and not getattr(
+        instance.image, '_committed', True
+    )
+    if instance.pk and not raw:
+        (instance._old_group_id, instance._old_group_slug,
+         instance._old_image) = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group_id', 'group__slug', 'image'
+            ).first() or (None, None, '')
+        )
+
+
+def _release_image(name):
+    transaction.on_commit(lambda: thumbnails.release(name))
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, raw=False, **kwargs):
+    if raw or not instance._old_image:
+        return
+    if (instance._image_uploaded
+            or instance._old_image != instance.image.name):
+        _release_image(instance._old_image)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_deleted_post(sender, instance, **kwargs):
+    _deleting(Post).add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def forget_deleted_post(sender, instance, **kwargs):
+    _deleting(Post).discard(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        _release_image(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.change_author_posts(instance.author_id, 1)
+        counters.change_group_posts(instance.group_id, 1)
+    elif instance._old_group_id != instance.group_id:
+        counters.change_group_posts(instance._old_group_id, -1)
+        counters.change_group_posts(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_author_posts(instance.author_id, -1)
+    counters.change_group_posts(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_post_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    # Комментарии удаляемого поста уходят вместе с ним и его счётчиком.
+    if instance.post_id not in _deleting(Post):
+        counters.change_post_comments(instance.post_id, -1)
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, raw=False, **kwargs):
+    instance._old_slug = None
+    if instance.pk and not raw:
+        instance._old_slug = Group.objects.filter(
+            pk=instance.pk
+        ).values_list('slug', flat=True).first()
+
+
+def _bump(*scopes):
+    bump_generations(*scopes)
+    # Внутри транзакции параллельный запрос может до её фиксации
+    # закэшировать старые данные под новым поколением на
+    # PAGE_CACHE_TIMEOUT: после фиксации поколение меняется ещё раз.
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: bump_generations(*scopes))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    scopes = cache.post_scopes(instance)
+    old_slug = getattr(instance, '_old_group_slug', None)
+    if old_slug:
+        scopes.append(cache.group_scope(old_slug))
+    _bump(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    # Страницы удаляемого поста сбросит invalidate_post_pages.
+    if instance.post_id in _deleting(Post):
+        return
+    # В лентах показывается число комментариев поста.
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=instance.post_id
+    ).first()
+    if post is not None:
+        _bump(*cache.post_scopes(post))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    scopes = [cache.INDEX, cache.GROUPS, cache.group_scope(instance.slug)]
+    old_slug = getattr(instance, '_old_slug', None)
+    if old_slug:
+        scopes.append(cache.group_scope(old_slug))
+    _bump(*scopes)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_profile_page(sender, instance, **kwargs):
+    _bump(cache.author_scope(instance.author.username))
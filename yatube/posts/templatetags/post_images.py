@@ -0,0 +1,69 @@
+import logging
+
+from django import template
+from django.conf import settings
+from sorl.thumbnail import default
+
+from .. import thumbnails
+
+logger = logging.getLogger(__name__)
+register = template.Library()
+
+
+def _ready_variants(file_):
+    for format_, width, geometry, options in thumbnails.variants():
+        try:
+            thumbnail = default.backend.get_ready_thumbnail(
+                file_, geometry, **options
+            )
+        except Exception:
+            logger.exception('Ошибка чтения миниатюры %s', file_)
+            thumbnail = None
+        yield format_, width, thumbnail
+
+
+@register.simple_tag
+def post_picture(post):
+    """Готовые варианты картинки поста для <picture> или None.
+
+    В <img> — JPEG ширины POST_IMAGE_SIZE, а пока его нет или такой
+    ширины нет в POST_IMAGE_WIDTHS — самый широкий готовый JPEG. None
+    значит, что готовых JPEG ещё нет: их создаёт фоновый пул.
+    Недостающие варианты ставятся в очередь и пропускаются в srcset,
+    как и варианты шире исходной картинки.
+    """
+    file_ = post.image
+    if not file_:
+        return None
+    size_width, size_height = settings.POST_IMAGE_SIZE
+    srcsets = {}
+    fallbacks = {}
+    missing = False
+    for format_, width, thumbnail in _ready_variants(file_):
+        if thumbnail is None:
+            missing = True
+            continue
+        if format_ == thumbnails.FALLBACK_FORMAT:
+            fallbacks[width] = thumbnail
+        if (post.image_width and width > post.image_width
+                and width != size_width):
+            continue
+        srcsets.setdefault(format_, []).append(f'{thumbnail.url} {width}w')
+    if missing:
+        thumbnails.schedule(file_.name)
+    if not fallbacks:
+        return None
+    img_width = size_width if size_width in fallbacks else max(fallbacks)
+    img = fallbacks[img_width]
+    srcset = srcsets.pop(thumbnails.FALLBACK_FORMAT, None)
+    return {
+        'img': img,
+        'srcset': ', '.join(srcset or [f'{img.url} {img_width}w']),
+        'sources': [
+            (thumbnails.mime_type(format_), ', '.join(srcset))
+            for format_, srcset in srcsets.items()
+        ],
+        'sizes': f'(max-width: {size_width}px) 100vw, {size_width}px',
+        'width': size_width,
+        'height': size_height,
+    }
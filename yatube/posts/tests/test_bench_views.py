@@ -0,0 +1,43 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from ..models import Post
+
+
+class BenchViewsTests(TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def bench(self, **options):
+        call_command('bench_views', scale=[0.01], requests=3, warmup=1,
+                     stdout=StringIO(), **options)
+
+    def test_results_and_baseline(self):
+        """Результаты пишутся в JSON, данные откатываются, рост p95
+        относительно базового прогона сверх порога — ошибка."""
+        self.bench(output=self.path)
+        with open(self.path) as source:
+            results = json.load(source)['results']
+        self.assertEqual(
+            [result['view'] for result in results],
+            ['index', 'group_list', 'profile', 'post_detail',
+             'follow_index'],
+        )
+        for result in results:
+            self.assertLessEqual(result['p50'], result['p99'])
+            self.assertGreater(result['queries'], 0)
+            self.assertGreater(result['render'], 0)
+        self.assertFalse(Post.objects.exists())
+        self.bench(baseline=self.path, max_regression=1000)
+        with self.assertRaises(CommandError):
+            self.bench(baseline=self.path, max_regression=-100)
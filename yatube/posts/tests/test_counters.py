@@ -0,0 +1,125 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import AuthorCounter, Comment, Group, Post
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Другое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def counts(self, post=None):
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        counter = AuthorCounter.objects.filter(user=self.user).first()
+        result = [counter.post_count if counter else 0,
+                  self.group.post_count, self.other_group.post_count]
+        if post is not None:
+            post.refresh_from_db()
+            result.append(post.comment_count)
+        return result
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании, переносе и удалении постов и
+        комментариев.
+        """
+        post = Post.objects.create(author=self.user, text='Проверка',
+                                   group=self.group)
+        Post.objects.create(author=self.user, text='Проверка')
+        comment = Comment.objects.create(post=post, author=self.user,
+                                         text='Комментарий')
+        self.assertEqual(self.counts(post), [2, 1, 0, 1])
+        post.group = self.other_group
+        post.save()
+        self.assertEqual(self.counts(post), [2, 0, 1, 1])
+        comment.delete()
+        self.assertEqual(self.counts(post), [2, 0, 1, 0])
+        post.delete()
+        self.assertEqual(self.counts(), [1, 0, 0])
+
+    def test_post_delete_skips_comment_work(self):
+        """Удаление поста не обновляет счётчик и кэш на каждый его
+        комментарий.
+        """
+        def delete_post(comments):
+            post = Post.objects.create(author=self.user, text='Проверка')
+            for number in range(comments):
+                Comment.objects.create(post=post, author=self.user,
+                                       text=f'Комментарий {number}')
+            with CaptureQueriesContext(connection) as queries:
+                post.delete()
+            return len(queries)
+
+        self.assertEqual(delete_post(20), delete_post(2))
+        self.assertFalse(Comment.objects.exists())
+
+    def test_drifted_counters_do_not_go_negative(self):
+        """Уменьшение счётчика, который уже разошёлся до нуля, не
+        мешает удалению комментария и поста.
+        """
+        Post.objects.bulk_create(
+            [Post(author=self.user, text='Проверка', group=self.group)]
+        )
+        post = Post.objects.get()
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.user, text=f'Комментарий {i}')
+            for i in range(2)
+        )
+        AuthorCounter.objects.create(user=self.user)
+        Comment.objects.first().delete()
+        self.assertEqual(self.counts(post), [0, 0, 0, 0])
+        post.delete()
+        self.assertEqual(self.counts(), [0, 0, 0])
+
+    def test_repair_counters_command(self):
+        """repair_counters исправляет расхождение после массовой
+        вставки.
+        """
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Проверка {i}', group=self.group)
+            for i in range(3)
+        )
+        post = Post.objects.first()
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.user, text=f'Комментарий {i}')
+            for i in range(2)
+        )
+        self.assertEqual(self.counts(post), [0, 0, 0, 0])
+        out = StringIO()
+        call_command('repair_counters', stdout=out)
+        self.assertEqual(self.counts(post), [3, 3, 0, 2])
+        self.assertIn('author.post_count: исправлено 1', out.getvalue())
+
+    def test_post_detail_reads_counter(self):
+        """Страница поста не считает посты автора через COUNT(*)."""
+        post = Post.objects.create(author=self.user, text='Проверка')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.pk})
+            )
+        self.assertContains(response, '<span> 1</span>')
+        self.assertFalse(any('COUNT(' in query['sql'].upper()
+                             for query in queries))
@@ -0,0 +1,76 @@
+import csv
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import export
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(title='Группа', slug='group',
+                                     description='')
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'пост {number}',
+                                group=group if number % 2 else None)
+            for number in range(5)
+        ]
+        Comment.objects.create(post=cls.posts[0], author=cls.reader,
+                               text='комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def export(self, *args):
+        out = StringIO()
+        call_command('export_data', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_jsonl(self):
+        """Каждый пост — отдельная строка JSON по возрастанию id."""
+        records = [json.loads(line)
+                   for line in self.export('posts').splitlines()]
+        self.assertEqual([record['id'] for record in records],
+                         [post.pk for post in self.posts])
+        self.assertEqual(records[1]['group'], 'group')
+        self.assertIsNone(records[0]['group'])
+        self.assertEqual(records[0]['author'], 'author')
+        self.assertEqual(records[0]['comment_count'], 1)
+
+    def test_csv(self):
+        """CSV начинается с заголовка."""
+        rows = list(csv.DictReader(StringIO(
+            self.export('comments', '--format', 'csv')
+        )))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['author'], 'reader')
+        self.assertEqual(rows[0]['text'], 'комментарий')
+
+    def test_rows_are_streamed_in_chunks(self):
+        """Строки читаются итератором, без кэша queryset."""
+        with self.assertNumQueries(1):
+            lines = export.lines('follows')
+            self.assertEqual(json.loads(next(lines))['user'], 'reader')
+
+    def test_admin_action_streams(self):
+        """Действие админки отдаёт выгрузку потоком."""
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        client = Client()
+        client.force_login(admin)
+        response = client.post(reverse('admin:posts_post_changelist'), {
+            'action': 'export_csv',
+            '_selected_action': [post.pk for post in self.posts[:2]],
+        })
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="posts.csv"')
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(content.splitlines()), 3)
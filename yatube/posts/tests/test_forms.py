@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 
@@ -13,7 +14,7 @@ TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 User = get_user_model()
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class PostFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -71,8 +72,12 @@ class PostFormTests(TestCase):
         self.assertEqual(Post.objects.count(), posts_count + 1)
         self.assertEqual(Post.objects.order_by('pk').last().text,
                          form_data['text'])
+        digest = hashlib.sha256(small_gif).hexdigest()
         self.assertEqual(Post.objects.order_by('pk').last().image,
-                         f'posts/{form_data["image"]}')
+                         f'posts/{digest[:2]}/{digest}.gif')
+        post = Post.objects.order_by('pk').last()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertRegex(post.image_color, r'^#[0-9a-f]{6}$')
         self.assertRedirects(response,
                              reverse('posts:profile',
                                      kwargs={'username': 'auth'}))
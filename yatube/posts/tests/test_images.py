@@ -0,0 +1,126 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+
+from .. import images
+from ..forms import PostForm
+from ..models import Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+
+
+def make_image(name, size=(40, 20), color=(255, 0, 0)):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ImageMetaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_describe(self):
+        """describe возвращает размеры и средний цвет и не сдвигает файл."""
+        file_ = make_image('red.png')
+        self.assertEqual(images.describe(file_), (40, 20, '#ff0000'))
+        self.assertEqual(file_.tell(), 0)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_form_rejects_too_many_pixels(self):
+        """Картинка больше лимита пикселей отклоняется формой."""
+        form = PostForm({'text': 'проверка'},
+                        {'image': make_image('big.png')})
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    @override_settings(POST_IMAGE_MAX_SIDE=20)
+    def test_form_downscales_large_image(self):
+        """Слишком большая картинка уменьшается до сохранения."""
+        form = PostForm({'text': 'проверка'},
+                        {'image': make_image('wide.png')})
+        self.assertTrue(form.is_valid())
+        form.instance.author = self.user
+        post = form.save()
+        self.assertEqual((post.image_width, post.image_height), (20, 10))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (20, 10))
+            self.assertEqual(image.format, 'PNG')
+
+    def test_backfill(self):
+        """Команда заполняет поля у старых постов пачками."""
+        posts = [
+            Post.objects.create(author=self.user, text=str(number),
+                                image=make_image(f'{number}.png'))
+            for number in range(3)
+        ]
+        Post.objects.create(author=self.user, text='без картинки')
+        broken = Post.objects.create(author=self.user, text='нет файла',
+                                     image='posts/missing.png')
+        out, err = StringIO(), StringIO()
+        call_command('backfill_image_meta', batch_size=2,
+                     stdout=out, stderr=err)
+        self.assertIn('Заполнено постов: 3, ошибок: 1', out.getvalue())
+        self.assertIn(f'Пост {broken.pk}', err.getvalue())
+        for post in posts:
+            post.refresh_from_db()
+            self.assertEqual(
+                (post.image_width, post.image_height, post.image_color),
+                (40, 20, '#ff0000'),
+            )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class SharedImageTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='auth')
+
+    def test_duplicate_uploads_share_file_and_thumbnails(self):
+        """Одинаковые картинки хранятся один раз и удаляются с последним
+        постом."""
+        first, second = (
+            Post.objects.create(author=self.user, text=str(number),
+                                image=make_image(f'{number}.png'))
+            for number in range(2)
+        )
+        self.assertEqual(first.image.name, second.image.name)
+        storage = first.image.storage
+        self.assertEqual(storage.refcount(first.image.name), 2)
+        first.delete()
+        self.assertTrue(storage.exists(second.image.name))
+        second.delete()
+        self.assertFalse(storage.exists(second.image.name))
+
+    def test_replaced_image_is_released(self):
+        """Замена картинки снимает ссылку со старой, даже одинаковой."""
+        post = Post.objects.create(author=self.user, text='пост',
+                                   image=make_image('old.png'))
+        old_name = post.image.name
+        post.image = make_image('same.png')
+        post.save()
+        self.assertEqual(post.image.storage.refcount(old_name), 1)
+        post.image = make_image('new.png', color=(0, 0, 255))
+        post.save()
+        self.assertFalse(post.image.storage.exists(old_name))
+        self.assertEqual(post.image.storage.refcount(post.image.name), 1)
@@ -0,0 +1,178 @@
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+
+from .. import thumbnails
+from ..models import AuthorCounter, Follow, Group, Post, TimelineEntry
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+
+
+class ImportPostsTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.group = Group.objects.create(title='Группа', slug='group',
+                                          description='')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file_:
+            file_.write(content)
+        return path
+
+    def jsonl(self, records):
+        return self.write('posts.jsonl', '\n'.join(
+            json.dumps(record, ensure_ascii=False) for record in records
+        ))
+
+    def run_import(self, path, **options):
+        out = StringIO()
+        call_command('import_posts', path, stdout=out, **options)
+        return out.getvalue()
+
+    def test_import_jsonl(self):
+        """Посты вставляются пачками, производные данные пересчитываются."""
+        path = self.jsonl([
+            {'text': f'пост {number}', 'author': 'author', 'group': 'group',
+             'pub_date': f'2020-01-0{number + 1}T10:00:00+00:00'}
+            for number in range(5)
+        ] + [
+            {'text': 'чужой', 'author': 'nobody'},
+            {'text': '', 'author': 'author'},
+        ])
+        out = self.run_import(path, chunk_size=2, batch_size=2)
+        self.assertIn('Импортировано постов: 5, пропущено записей: 2', out)
+        posts = Post.objects.filter(author=self.author)
+        self.assertEqual(posts.count(), 5)
+        self.assertEqual(posts.first().pub_date.year, 2020)
+        self.assertEqual(AuthorCounter.objects.get(user=self.author)
+                         .post_count, 5)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.post_count, 5)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 5
+        )
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+    def test_followup_reads_authors_in_chunks(self):
+        """Авторы импортированных постов читаются пачками: число
+        параметров запроса ограничено."""
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.author, author=other)
+        path = self.jsonl([
+            {'text': 'пост', 'author': 'author'},
+            {'text': 'пост', 'author': 'other', 'group': 'group'},
+        ])
+        with mock.patch(
+                'posts.management.commands.import_posts.IDS_PER_QUERY', 1):
+            self.run_import(path)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 1
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.author).count(), 1
+        )
+
+    def test_import_csv_creates_missing(self):
+        """CSV с --create-missing создаёт авторов и группы."""
+        path = self.write(
+            'posts.csv',
+            'text,author,group,pub_date\n'
+            'первый,newcomer,new-group,\n'
+            'второй,newcomer,,2021-05-01 12:00:00\n'
+        )
+        self.run_import(path, create_missing=True)
+        newcomer = User.objects.get(username='newcomer')
+        self.assertFalse(newcomer.has_usable_password())
+        self.assertEqual(Group.objects.get(slug='new-group').post_count, 1)
+        self.assertEqual(newcomer.counter.post_count, 2)
+
+    def test_resume_from_checkpoint(self):
+        """После сбоя импорт продолжается с последней контрольной точки."""
+        path = self.jsonl([
+            {'text': f'пост {number}', 'author': 'author'}
+            for number in range(6)
+        ])
+        original = Post.objects.bulk_create
+        calls = []
+
+        def failing_bulk_create(posts, **kwargs):
+            calls.append(len(posts))
+            if len(calls) == 2:
+                raise RuntimeError('сбой')
+            return original(posts, **kwargs)
+
+        with mock.patch.object(Post.objects, 'bulk_create',
+                               failing_bulk_create):
+            with self.assertRaises(RuntimeError):
+                self.run_import(path, chunk_size=2)
+        with open(f'{path}.checkpoint') as checkpoint:
+            state = json.load(checkpoint)
+        self.assertEqual(state['records'], 2)
+        self.assertNotIn('authors', state)
+        out = self.run_import(path, chunk_size=2)
+        self.assertIn('Продолжение с записи 2.', out)
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            [f'пост {number}' for number in range(6)],
+        )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ImportImagesTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        buffer = BytesIO()
+        Image.new('RGB', (40, 20), (255, 0, 0)).save(buffer, 'PNG')
+        self.post = Post.objects.create(
+            author=self.author, text='оригинал',
+            image=SimpleUploadedFile('image.png', buffer.getvalue(),
+                                     content_type='image/png'),
+        )
+        self.path = os.path.join(TEMP_MEDIA_ROOT, 'posts.jsonl')
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def test_imported_images_are_counted(self):
+        """Импортированная картинка учитывается в ссылках хранилища и не
+        удаляется вместе с исходным постом; миниатюры ставятся в
+        очередь."""
+        name = self.post.image.name
+        with open(self.path, 'w', encoding='utf-8') as file_:
+            for text, image in (('копия', name),
+                                ('без файла', 'posts/missing.png')):
+                file_.write(json.dumps({'text': text, 'author': 'author',
+                                        'image': image}) + '\n')
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            call_command('import_posts', self.path, stdout=StringIO())
+        schedule.assert_called_once_with(name)
+        storage = self.post.image.storage
+        self.assertEqual(storage.refcount(name), 2)
+        self.assertEqual(Post.objects.get(text='без файла').image.name, '')
+        self.post.delete()
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(storage.refcount(name), 1)
@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.test import TestCase
+
+from ..feed import FEED_ORDERING, follow_feed, pulled_posts
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedIndexesTests(TestCase):
+    """Запросы лент читают строки в порядке индекса, без сортировки во
+    временном B-дереве.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(author=cls.user, text='Проверка',
+                                       group=cls.group)
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_feed_queries_use_indexes(self):
+        """index, group_list, profile и комментарии поста используют
+        составные индексы.
+        """
+        querysets = {
+            'post_pub_date': Post.objects.select_related('author', 'group'),
+            'post_group_pub_date': self.group.group_posts.all(),
+            'post_author_pub_date': self.user.user_posts.select_related(
+                'group'
+            ),
+            'comment_post_created': self.post.comments.select_related(
+                'author'
+            ),
+        }
+        for index, queryset in querysets.items():
+            with self.subTest(index=index):
+                self.assertUsesIndex(queryset[:10], index)
+                field = ('created' if queryset.model is Comment
+                         else 'pub_date')
+                date = self.post.pub_date
+                keyset = queryset.filter(
+                    Q(**{f'{field}__lt': date})
+                    | Q(**{field: date, 'pk__lt': self.post.pk})
+                ).order_by(f'-{field}', '-pk')
+                self.assertUsesIndex(keyset[:11], index)
+
+    def test_follow_feed_uses_timeline_index(self):
+        """Лента подписок читается диапазоном индекса timeline_user_feed,
+        а не сортирует всю ленту пользователя.
+        """
+        feed = follow_feed(self.reader)
+        date, pk = self.post.pub_date, self.post.pk
+        self.assertUsesIndex(feed[:11], 'timeline_user_feed')
+        keyset = feed.filter(
+            Q(feed_date__lt=date) | Q(feed_date=date, feed_id__lt=pk)
+        ).order_by(*FEED_ORDERING)
+        self.assertUsesIndex(keyset[:11], 'timeline_user_feed')
+
+    def test_pulled_author_uses_author_index(self):
+        """Посты популярного автора читаются диапазоном индекса
+        post_author_pub_date в обе стороны курсора."""
+        queryset = pulled_posts([self.user.pk])
+        date, pk = self.post.pub_date, self.post.pk
+        self.assertUsesIndex(queryset[:11], 'post_author_pub_date')
+        for lookup, ordering in (('lt', FEED_ORDERING),
+                                 ('gt', ('feed_date', 'feed_id'))):
+            with self.subTest(lookup=lookup):
+                keyset = queryset.filter(
+                    Q(**{f'feed_date__{lookup}': date})
+                    | Q(**{'feed_date': date, f'feed_id__{lookup}': pk})
+                ).order_by(*ordering)
+                self.assertUsesIndex(keyset[:11], 'post_author_pub_date')
+
+    def test_follow_lookup_uses_index(self):
+        """Подписчики автора ищутся по индексу (author, user)."""
+        self.assertUsesIndex(
+            Follow.objects.filter(author=self.user).values('user'),
+            'follow_author_user',
+        )
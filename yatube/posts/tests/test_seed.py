@@ -0,0 +1,75 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase
+
+from ..models import Comment, Follow, Group, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class SeedTests(TestCase):
+    def seed(self, **options):
+        call_command('seed', scale=0.02, stdout=StringIO(), **options)
+
+    def snapshot(self):
+        return (
+            list(User.objects.order_by('username').values_list(
+                'username', 'first_name', 'last_name'
+            )),
+            list(Group.objects.order_by('slug').values_list('slug', 'title')),
+            list(Follow.objects.order_by(
+                'user__username', 'author__username'
+            ).values_list('user__username', 'author__username')),
+            list(Post.objects.order_by('pub_date').values_list(
+                'author__username', 'group__slug', 'text', 'pub_date',
+                'comment_count',
+            )),
+            list(Comment.objects.order_by('created', 'text').values_list(
+                'post__pub_date', 'author__username', 'text', 'created'
+            )),
+        )
+
+    def test_volumes_and_derived_data(self):
+        """Объёмы растут со scale, счётчики и ленты пересчитаны."""
+        self.seed()
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Post.objects.count(), 2000)
+        self.assertEqual(Comment.objects.count(), 600)
+        self.assertFalse(Follow.objects.filter(
+            user_id=F('author_id')
+        ).exists())
+        post = Post.objects.order_by('-comment_count').first()
+        self.assertEqual(post.comment_count, post.comments.count())
+        follow = Follow.objects.first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user_id=follow.user_id, author_id=follow.author_id
+            ).count(),
+            Post.objects.filter(author_id=follow.author_id).count(),
+        )
+
+    def test_skew(self):
+        """Большинство постов без комментариев, у немногих их много."""
+        self.seed()
+        counts = sorted(
+            Post.objects.values_list('comment_count', flat=True),
+            reverse=True,
+        )
+        self.assertGreater(counts.count(0), len(counts) // 2)
+        self.assertGreater(sum(counts[:20]), sum(counts) // 4)
+
+    def test_reproducible(self):
+        """Одинаковый seed даёт одинаковые данные, другой — другие."""
+        self.seed(seed=7)
+        first = self.snapshot()
+        for model in (Comment, Post, Follow, Group, User):
+            model.objects.all().delete()
+        self.seed(seed=7)
+        self.assertEqual(self.snapshot(), first)
+        for model in (Comment, Post, Follow, Group, User):
+            model.objects.all().delete()
+        self.seed(seed=8)
+        self.assertNotEqual(self.snapshot(), first)
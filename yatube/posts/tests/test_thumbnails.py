@@ -0,0 +1,153 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+
+from .. import thumbnails
+from ..models import Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+GEOMETRY, OPTIONS = '960x339', {
+    'crop': 'center', 'upscale': True, 'format': 'JPEG', 'quality': 80,
+}
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    THUMBNAIL_WORKERS=0,
+    POST_IMAGE_SIZE=(960, 339),
+    POST_IMAGE_WIDTHS=[480, 960],
+    POST_IMAGE_FORMATS={'AVIF': 50, 'WEBP': 75, 'JPEG': 80},
+)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='small.gif',
+                content=(
+                    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                    b'\x0A\x00\x3B'
+                ),
+                content_type='image/gif'
+            )
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_ready_thumbnail_does_not_generate(self):
+        """get_ready_thumbnail не создаёт миниатюру сам."""
+        self.assertIsNone(default.backend.get_ready_thumbnail(
+            self.post.image, GEOMETRY, **OPTIONS
+        ))
+        thumbnails.generate(self.post.image.name)
+        thumbnail = default.backend.get_ready_thumbnail(
+            self.post.image, GEOMETRY, **OPTIONS
+        )
+        self.assertIsNotNone(thumbnail)
+        self.assertEqual((thumbnail.width, thumbnail.height), (960, 339))
+
+    def test_schedule_once_for_all_processes(self):
+        """Картинку, которую уже взял другой процесс, schedule не
+        ставит снова; после создания миниатюр ключ снимается.
+        """
+        name = self.post.image.name
+        cache.add(thumbnails.PENDING_KEY.format(name), True)
+        thumbnails.schedule(name)
+        self.assertIsNone(default.backend.get_ready_thumbnail(
+            self.post.image, GEOMETRY, **OPTIONS
+        ))
+        cache.delete(thumbnails.PENDING_KEY.format(name))
+        thumbnails.schedule(name)
+        self.assertIsNotNone(default.backend.get_ready_thumbnail(
+            self.post.image, GEOMETRY, **OPTIONS
+        ))
+        self.assertIsNone(cache.get(thumbnails.PENDING_KEY.format(name)))
+
+    def test_posts_by_image_use_index(self):
+        """Посты с картинкой ищутся по индексу, а не перебором."""
+        plan = Post.objects.filter(image=self.post.image.name).explain()
+        self.assertIn('post_image', plan)
+
+    def test_placeholder_until_thumbnail_is_ready(self):
+        """Пока миниатюры нет, лента показывает заглушку, потом картинку."""
+        client = Client()
+        response = client.get(reverse('posts:index'))
+        self.assertContains(response, 'aspect-ratio: 960 / 339')
+        self.assertNotContains(response, '<img class="card-img')
+        response = client.get(reverse('posts:index'))
+        self.assertContains(response, '<img class="card-img')
+
+    def test_picture_srcset(self):
+        """В srcset попадают все ширины, современные форматы — в <source>."""
+        thumbnails.generate(self.post.image.name)
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, '480w')
+        self.assertContains(response, '960w')
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertContains(response, 'loading="lazy"')
+        Image.init()
+        for format_, mime in (('WEBP', 'image/webp'), ('AVIF', 'image/avif')):
+            with self.subTest(format_=format_):
+                if format_ in Image.SAVE:
+                    self.assertContains(response, f'type="{mime}"')
+                else:
+                    self.assertNotContains(response, f'type="{mime}"')
+
+    @override_settings(POST_IMAGE_FORMATS={'BMP3': 10, 'JPEG': 80})
+    def test_unsupported_formats_are_skipped(self):
+        """Форматы, которые Pillow не умеет писать, не создаются."""
+        self.assertEqual(thumbnails.image_formats(), ['JPEG'])
+        self.assertEqual(
+            [variant[:3] for variant in thumbnails.variants()],
+            [('JPEG', 480, '480x170'), ('JPEG', 960, '960x339')],
+        )
+
+    @override_settings(POST_IMAGE_WIDTHS=[480, 960, 1440])
+    def test_srcset_skips_upscaled_widths(self):
+        """Варианты шире исходной картинки не попадают в srcset."""
+        Post.objects.filter(pk=self.post.pk).update(image_width=500)
+        thumbnails.generate(self.post.image.name)
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, '480w')
+        self.assertContains(response, '960w')
+        self.assertNotContains(response, '1440w')
+
+    @override_settings(POST_IMAGE_WIDTHS=[480, 720],
+                       POST_IMAGE_FORMATS={'PNG': 0, 'JPEG': 80})
+    def test_picture_without_main_width(self):
+        """Без ширины POST_IMAGE_SIZE в <img> попадает самый широкий
+        JPEG; MIME-тип любого формата берётся из Pillow."""
+        Post.objects.filter(pk=self.post.pk).update(image_width=1000)
+        thumbnails.generate(self.post.image.name)
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, '<img class="card-img')
+        self.assertContains(response, 'type="image/png"')
+        self.assertContains(response, '720w')
+        widest = default.backend.get_ready_thumbnail(
+            self.post.image, '720x254', **OPTIONS
+        )
+        self.assertContains(response, f'src="{widest.url}"')
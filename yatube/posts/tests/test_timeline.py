@@ -0,0 +1,179 @@
+from io import StringIO
+
+from core.templatetags.user_filters import next_cursor
+from core.utils import CursorPaginator
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..feed import FEED_KEY, MergedFeed, follow_feed
+from ..models import AuthorCounter, Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def timeline_posts(self):
+        return list(Post.objects.filter(timeline_entries__user=self.reader))
+
+    def test_new_post_pushed_to_followers(self):
+        """Новый пост попадает в ленту подписчика, но не в чужую."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Проверка')
+        self.assertEqual(self.timeline_posts(), [post])
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.author).exists()
+        )
+
+    def test_follow_and_unfollow_update_timeline(self):
+        """Подписка добавляет старые посты автора, отписка убирает их."""
+        post = Post.objects.create(author=self.author, text='Проверка')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.timeline_posts(), [post])
+        follow.delete()
+        self.assertEqual(self.timeline_posts(), [])
+
+    def test_post_delete_removes_entries(self):
+        """Удалённый пост пропадает из лент."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Проверка')
+        post.delete()
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_feed_pages_by_timeline_key(self):
+        """Лента подписок листается по дате и id поста из ленты; посты с
+        одинаковой датой не теряются и не повторяются.
+        """
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [Post.objects.create(author=self.author, text=f'Пост {i}')
+                 for i in range(3)]
+        TimelineEntry.objects.update(pub_date=posts[0].pub_date)
+        paginator = CursorPaginator(follow_feed(self.reader), 1, **FEED_KEY)
+        page_obj = paginator.get_page()
+        seen = list(page_obj)
+        while page_obj.has_next():
+            page_obj = paginator.get_page(next_cursor(page_obj))
+            seen.extend(page_obj)
+        self.assertEqual(seen, posts[::-1])
+
+    def test_backfill_command(self):
+        """Команда backfill_timeline восстанавливает ленты после
+        массовой вставки в обход сигналов.
+        """
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Проверка {i}') for i in range(3)
+        )
+        self.assertEqual(self.timeline_posts(), [])
+        call_command('backfill_timeline', stdout=StringIO())
+        self.assertEqual(len(self.timeline_posts()), 3)
+
+
+@override_settings(FEED_PULL_THRESHOLD=2)
+class HybridFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.star = User.objects.create_user(username='star')
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=cls.reader, author=cls.star)
+        Follow.objects.create(user=cls.fan, author=cls.star)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_popular_author_is_pulled(self):
+        """Посты популярного автора не раскладываются по лентам, но
+        попадают в ленту подписок в порядке публикации.
+        """
+        posts = [
+            Post.objects.create(author=author, text=f'Проверка {i}')
+            for i, author in enumerate(
+                [self.star, self.author, self.star, self.author]
+            )
+        ]
+        self.assertFalse(
+            TimelineEntry.objects.filter(author=self.star).exists()
+        )
+        feed = follow_feed(self.reader)
+        self.assertIsInstance(feed, MergedFeed)
+        self.assertEqual(list(feed), posts[::-1])
+        with self.assertNumQueries(2):
+            self.assertEqual(feed.count(), 4)
+
+    def test_author_below_threshold_keeps_posts(self):
+        """Когда отписка опускает автора ниже порога, его посты
+        раскладываются по лентам и не пропадают.
+        """
+        post = Post.objects.create(author=self.star, text='Проверка')
+        self.assertIsInstance(follow_feed(self.reader), MergedFeed)
+        Follow.objects.filter(user=self.fan).delete()
+        self.assertEqual(
+            AuthorCounter.objects.get(user=self.star).follower_count, 1
+        )
+        feed = follow_feed(self.reader)
+        self.assertNotIsInstance(feed, MergedFeed)
+        self.assertEqual(list(feed), [post])
+        later = Post.objects.create(author=self.star, text='Позже')
+        self.assertEqual(list(follow_feed(self.reader)), [later, post])
+
+    @override_settings(FEED_PUSH_THRESHOLD=1)
+    def test_author_between_thresholds_stays_pulled(self):
+        """Автор возвращается в push только ниже FEED_PUSH_THRESHOLD:
+        отписка и повторная подписка у порога не раскладывают его посты
+        заново."""
+        post = Post.objects.create(author=self.star, text='Проверка')
+        for _ in range(2):
+            Follow.objects.filter(user=self.fan).delete()
+            self.assertTrue(
+                AuthorCounter.objects.get(user=self.star).feed_pulled
+            )
+            self.assertFalse(
+                TimelineEntry.objects.filter(author=self.star).exists()
+            )
+            self.assertEqual(list(follow_feed(self.reader)), [post])
+            Follow.objects.create(user=self.fan, author=self.star)
+        Follow.objects.filter(author=self.star).delete()
+        self.assertFalse(
+            AuthorCounter.objects.get(user=self.star).feed_pulled
+        )
+
+    def test_backfill_resets_modes(self):
+        """backfill_timeline заново выбирает pull или push по числу
+        подписчиков."""
+        post = Post.objects.create(author=self.star, text='Проверка')
+        with self.settings(FEED_PULL_THRESHOLD=3):
+            call_command('backfill_timeline', stdout=StringIO())
+        self.assertFalse(
+            AuthorCounter.objects.get(user=self.star).feed_pulled
+        )
+        self.assertEqual(list(follow_feed(self.fan)), [post])
+
+    def test_deleted_author_leaves_feeds(self):
+        """Удаление популярного автора не раскладывает его посты."""
+        Post.objects.create(author=self.star, text='Проверка')
+        User.objects.get(pk=self.star.pk).delete()
+        self.assertEqual(list(follow_feed(self.reader)), [])
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_merged_feed_cursor_pages(self):
+        """Слияние лент работает с курсорной пагинацией."""
+        posts = [
+            Post.objects.create(author=author, text=f'Проверка {i}')
+            for i, author in enumerate([self.star, self.author] * 3)
+        ]
+        paginator = CursorPaginator(follow_feed(self.reader), 4,
+                                    **FEED_KEY)
+        first = paginator.get_page()
+        self.assertEqual(list(first), posts[:1:-1])
+        self.assertTrue(first.has_next())
+        cursor = next_cursor(first)
+        self.assertEqual(list(paginator.get_page(cursor)), posts[1::-1])
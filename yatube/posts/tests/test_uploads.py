@@ -0,0 +1,175 @@
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from .. import uploads
+from ..models import ChunkedUpload, Post
+
+TEMP_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+
+
+def png_bytes(size=(40, 20)):
+    buffer = BytesIO()
+    Image.new('RGB', size, (0, 128, 0)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@override_settings(
+    MEDIA_ROOT=os.path.join(TEMP_ROOT, 'media'),
+    UPLOAD_STAGING_ROOT=os.path.join(TEMP_ROOT, 'uploads'),
+    THUMBNAIL_WORKERS=0,
+)
+class ChunkedUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.content = png_bytes()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def start(self):
+        response = self.client.post(reverse('posts:upload_create'), {
+            'filename': 'photo.png',
+            'size': len(self.content),
+            'content_type': 'image/png',
+        })
+        self.assertEqual(response.status_code, 201)
+        return response['Location']
+
+    def put(self, url, start, end):
+        return self.client.generic(
+            'PUT', url, self.content[start:end + 1],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(self.content)}',
+        )
+
+    def test_upload_in_chunks_and_attach_to_new_post(self):
+        """Файл из кусков прикрепляется к новому посту, черновик удаляется."""
+        url = self.start()
+        middle = len(self.content) // 2
+        self.assertEqual(self.put(url, 0, middle - 1).json()['offset'],
+                         middle)
+        state = self.put(url, middle, len(self.content) - 1).json()
+        self.assertTrue(state['complete'])
+        response = self.client.post(reverse('posts:post_create'), {
+            'text': 'проверка загрузки',
+            'upload': state['id'],
+        })
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get(text='проверка загрузки')
+        self.assertEqual((post.image_width, post.image_height), (40, 20))
+        with post.image.open('rb') as image:
+            self.assertEqual(image.read(), self.content)
+        self.assertFalse(ChunkedUpload.objects.exists())
+        upload = ChunkedUpload(pk=uuid.UUID(state['id']))
+        self.assertFalse(os.path.exists(uploads.staging_path(upload)))
+
+    def test_attach_to_existing_post(self):
+        """Готовую загрузку можно прикрепить при редактировании поста."""
+        post = Post.objects.create(author=self.user, text='без картинки')
+        url = self.start()
+        state = self.put(url, 0, len(self.content) - 1).json()
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            {'text': 'проверка с картинкой', 'upload': state['id']},
+        )
+        post.refresh_from_db()
+        self.assertTrue(post.image)
+        self.assertEqual(post.image_width, 40)
+
+    def test_resume_after_interrupted_chunk(self):
+        """После обрыва принятые байты сохраняются, докачка с offset."""
+        upload = uploads.create(self.user, 'photo.png', len(self.content))
+        broken = BytesIO(self.content[:10])
+        offset = uploads.write_chunk(upload, broken, 0,
+                                     len(self.content) - 1)
+        self.assertEqual(offset, 10)
+        url = reverse('posts:upload_detail', kwargs={'upload_id': upload.pk})
+        self.assertEqual(self.client.get(url).json()['offset'], 10)
+        self.assertTrue(
+            self.put(url, 10, len(self.content) - 1).json()['complete']
+        )
+        with open(uploads.staging_path(upload), 'rb') as staged:
+            self.assertEqual(staged.read(), self.content)
+
+    def test_gap_and_bad_range_are_rejected(self):
+        """Кусок дальше offset и неверный Content-Range отклоняются."""
+        url = self.start()
+        self.assertEqual(self.put(url, 5, 9).status_code, 409)
+        response = self.client.generic(
+            'PUT', url, b'x', HTTP_CONTENT_RANGE='bytes 0-0/1'
+        )
+        self.assertEqual(response.status_code, 416)
+
+    def test_incomplete_or_foreign_upload_is_not_attached(self):
+        """Незавершённую или чужую загрузку прикрепить нельзя: форма
+        показывает ошибку поля картинки."""
+        url = self.start()
+        upload_id = url.rstrip('/').rsplit('/', 1)[-1]
+        data = {'text': 'проверка', 'upload': upload_id}
+        response = self.client.post(reverse('posts:post_create'), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response, 'form', 'image',
+                             'Загрузка не завершена.')
+        self.put(url, 0, len(self.content) - 1)
+        other = Client()
+        other.force_login(User.objects.create_user(username='other'))
+        self.assertEqual(other.get(url).status_code, 404)
+        response = other.post(reverse('posts:post_create'), data)
+        self.assertFormError(response, 'form', 'image',
+                             'Загрузка не найдена.')
+        self.assertFalse(Post.objects.filter(text='проверка').exists())
+
+    @override_settings(UPLOAD_STAGING_PER_USER=2)
+    def test_open_uploads_are_limited(self):
+        """Сверх UPLOAD_STAGING_PER_USER загрузок начать нельзя."""
+        self.start()
+        url = self.start()
+        response = self.client.post(reverse('posts:upload_create'),
+                                    {'size': len(self.content)})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.start()
+
+    @override_settings(FILE_UPLOAD_MAX_SIZE=10)
+    def test_too_large_upload_is_refused(self):
+        """Загрузку больше FILE_UPLOAD_MAX_SIZE начать нельзя."""
+        response = self.client.post(reverse('posts:upload_create'),
+                                    {'size': 11})
+        self.assertEqual(response.status_code, 413)
+
+    def test_stale_uploads_are_cleaned(self):
+        """Брошенные загрузки удаляются вместе с файлами."""
+        stale = uploads.create(self.user, 'old.png', 100)
+        fresh = uploads.create(self.user, 'new.png', 100)
+        ChunkedUpload.objects.filter(pk=stale.pk).update(
+            updated=timezone.now() - timedelta(
+                seconds=settings.UPLOAD_STAGING_TTL + 1
+            )
+        )
+        out = StringIO()
+        call_command('clean_uploads', stdout=out)
+        self.assertIn('Удалено незавершённых загрузок: 1', out.getvalue())
+        self.assertFalse(os.path.exists(uploads.staging_path(stale)))
+        self.assertTrue(os.path.exists(uploads.staging_path(fresh)))
+        self.assertEqual(list(ChunkedUpload.objects.all()), [fresh])
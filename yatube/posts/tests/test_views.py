@@ -1,21 +1,33 @@
+import hashlib
 import shutil
 import tempfile
+from datetime import timedelta
+from types import SimpleNamespace
 
+from core.caching import get_generations
+from core.queries import QueryBudgetMixin
+from core.templatetags.user_filters import next_cursor, previous_cursor
+from core.utils import CursorPaginator, encode_cursor
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.db import connection, transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
-from ..models import Follow, Group, Post
+from .. import cache as page_cache
+from ..models import Comment, Follow, Group, Post
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 User = get_user_model()
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class PostViewTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -34,6 +46,8 @@ class PostViewTests(TestCase):
             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
             b'\x0A\x00\x3B'
         )
+        digest = hashlib.sha256(small_gif).hexdigest()
+        cls.image_name = f'posts/{digest[:2]}/{digest}.gif'
         cls.post = Post.objects.create(
             author=cls.user,
             text='Тестовый пост',
@@ -98,7 +112,7 @@ class PostViewTests(TestCase):
                 post_image_0 = first_object.image
                 self.assertEqual(post_author_0, 'auth')
                 self.assertEqual(post_text_0, 'Тестовый пост')
-                self.assertEqual(post_image_0, 'posts/small.gif')
+                self.assertEqual(post_image_0, self.image_name)
 
     def test_post_detail_page_show_correct_context(self):
         """Шаблон post_detail сформирован с правильным контекстом."""
@@ -111,7 +125,7 @@ class PostViewTests(TestCase):
         post_image_0 = first_object.image
         self.assertEqual(post_author_0, 'auth')
         self.assertEqual(post_text_0, 'Тестовый пост')
-        self.assertEqual(post_image_0, 'posts/small.gif')
+        self.assertEqual(post_image_0, self.image_name)
 
     def test_create_post_page_show_correct_context(self):
         """Шаблон create_post сформирован с правильным контекстом."""
@@ -219,6 +233,84 @@ class PaginatorViewsTest(TestCase):
         self.assertEqual(len(response.context.get('page_obj')),
                          self.COUNT_POST_SECOND_PAGE_GROUP_LIST)
 
+    def test_cursor_pages_walk_forward_and_back(self):
+        """Курсорная пагинация index, group_list, profile переходит на
+        следующую и предыдущую страницы без номеров.
+        """
+        pages_names = {
+            reverse('posts:index'):
+            self.COUNT_POST_SECOND_PAGE_INDEX_PROFILE,
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}):
+            self.COUNT_POST_SECOND_PAGE_GROUP_LIST,
+            reverse('posts:profile', kwargs={'username': 'auth'}):
+            self.COUNT_POST_SECOND_PAGE_INDEX_PROFILE,
+        }
+        for address, count_second in pages_names.items():
+            with self.subTest(address=address):
+                first = self.client.get(address).context['page_obj']
+                second = self.client.get(
+                    address, {'cursor': next_cursor(first)}
+                ).context['page_obj']
+                self.assertIsInstance(second.paginator, CursorPaginator)
+                self.assertEqual(len(second), count_second)
+                self.assertFalse(second.has_next())
+                self.assertTrue(second.has_previous())
+                self.assertEqual(
+                    {post.pk for post in first} & {post.pk for post in second},
+                    set(),
+                )
+                back = self.client.get(
+                    address, {'cursor': previous_cursor(second)}
+                ).context['page_obj']
+                self.assertEqual([post.pk for post in back],
+                                 [post.pk for post in first])
+
+    def test_cursor_page_does_not_count(self):
+        """Первая страница и страница по курсору не выполняют COUNT(*) и
+        OFFSET и не ссылаются на номера страниц.
+        """
+        address = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(address)
+        first = response.context['page_obj']
+        self.assertIsInstance(first.paginator, CursorPaginator)
+        self.assertNotContains(response, '?page=')
+        with CaptureQueriesContext(connection) as cursor_queries:
+            self.client.get(address, {'cursor': next_cursor(first)})
+        sql = ' '.join(query['sql']
+                       for query in [*queries, *cursor_queries]).upper()
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_invalid_cursor_shows_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.client.get(reverse('posts:index'),
+                                   {'cursor': 'испорчен'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), self.COUNT_POST_FIRST_PAGE)
+        self.assertFalse(page_obj.has_previous())
+
+    def test_cursor_past_end_shows_first_page(self):
+        """Курсор за концом ленты (устаревшая ссылка) открывает первую
+        страницу ленты и комментариев."""
+        old = timezone.now() - timedelta(days=3650)
+        token = encode_cursor(SimpleNamespace(pub_date=old, pk=1))
+        response = self.client.get(reverse('posts:index'),
+                                   {'cursor': token})
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), self.COUNT_POST_FIRST_PAGE)
+        self.assertFalse(page_obj.has_previous())
+        token = encode_cursor(SimpleNamespace(created=old, pk=1),
+                              date_field='created')
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            {'comments': token},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['comments'].has_previous())
+        self.assertEqual(next_cursor([]), '')
+        self.assertEqual(previous_cursor([]), '')
+
     def test_post_with_group_in_correct_group_list(self):
         """При создании пост попадает на страницу выбранной группы."""
         response = (self.client.
@@ -301,12 +393,195 @@ class CacheTests(TestCase):
         self.guest_client = Client()
 
     def test_cache_index_page(self):
+        """Главная страница берётся из кэша, пока в базе нет записей
+        через модели, и обновляется сразу после удаления поста.
+        """
         self.client.get(reverse('posts:index'))
-        Post.objects.get(pk=self.post.pk).delete()
-        response_before = self.client.get(reverse('posts:index'))
-        self.assertNotEqual(response_before.content.decode('utf-8').
+        Post.objects.filter(pk=self.post.pk).update(text='Изменён в обход')
+        response_cached = self.client.get(reverse('posts:index'))
+        self.assertNotEqual(response_cached.content.decode('utf-8').
                             find(self.post.text), -1)
-        cache.clear()
+        Post.objects.get(pk=self.post.pk).delete()
         response_after = self.client.get(reverse('posts:index'))
         self.assertEqual(response_after.content.decode('utf-8').
                          find(self.post.text), -1)
+
+    def test_write_invalidates_only_touched_pages(self):
+        """Новый пост сбрасывает кэш своих страниц и не трогает страницу
+        другой группы.
+        """
+        other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Другое описание',
+        )
+        pages = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_list',
+                             kwargs={'slug': 'test-slug'}),
+            'profile': reverse('posts:profile', kwargs={'username': 'auth'}),
+            'other_group': reverse('posts:group_list',
+                                   kwargs={'slug': 'other-slug'}),
+        }
+        for address in pages.values():
+            self.client.get(address)
+        Group.objects.filter(pk=other_group.pk).update(
+            description='Изменено в обход'
+        )
+        Post.objects.create(author=self.user, text='Свежая проверка',
+                            group=self.group)
+        for name, address in pages.items():
+            with self.subTest(page=name):
+                content = self.client.get(address).content.decode('utf-8')
+                if name == 'other_group':
+                    self.assertNotIn('Изменено в обход', content)
+                else:
+                    self.assertIn('Свежая проверка', content)
+
+
+class CacheCommitTests(TransactionTestCase):
+    def test_generation_bumped_again_after_commit(self):
+        """Запись в транзакции меняет поколение сразу и ещё раз после
+        фиксации: страница, закэшированная до фиксации, не переживёт её.
+        """
+        user = User.objects.create_user(username='auth')
+
+        def generation():
+            return get_generations([page_cache.INDEX], cache)[0]
+
+        before = generation()
+        with transaction.atomic():
+            Post.objects.create(author=user, text='Проверка')
+            self.assertEqual(generation(), before + 1)
+        self.assertEqual(generation(), before + 2)
+        Post.objects.create(author=user, text='Без транзакции')
+        self.assertEqual(generation(), before + 3)
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    COUNT_COMMENTS = 60
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(author=cls.author, text='Проверка',
+                                       group=cls.group)
+        commenters = [
+            User.objects.create_user(username=f'commenter{i}')
+            for i in range(5)
+        ]
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=commenters[i % 5],
+                    text=f'Комментарий {i}')
+            for i in range(cls.COUNT_COMMENTS)
+        )
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_post_detail_and_edit_budget(self):
+        """Число запросов post_detail и post_edit не зависит от числа
+        комментариев и их авторов.
+        """
+        budgets = {
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}): 4,
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}): 4,
+        }
+        for address, budget in budgets.items():
+            with self.subTest(address=address):
+                with self.assertNumQueries(budget):
+                    response = self.reader_client.get(address)
+                self.assertEqual(len(response.context['comments']), 50)
+
+    def test_list_pages_budget(self):
+        """Ленты укладываются в QUERY_BUDGETS и не читают автора или
+        группу каждого поста отдельным запросом.
+        """
+        for number in range(10):
+            author = User.objects.create_user(username=f'writer{number}')
+            Post.objects.create(author=author, group=self.group,
+                                text=f'Пост {number}')
+            Follow.objects.create(user=self.reader, author=author)
+        pages = {
+            'posts:index': {},
+            'posts:group_list': {'slug': self.group.slug},
+            'posts:profile': {'username': self.author.username},
+            'posts:post_detail': {'post_id': self.post.pk},
+            'posts:follow_index': {},
+        }
+        for name, kwargs in pages.items():
+            with self.subTest(name=name):
+                cache.clear()
+                with self.assertQueryBudget(name):
+                    response = self.reader_client.get(
+                        reverse(name, kwargs=kwargs)
+                    )
+                self.assertEqual(response.status_code, 200)
+
+    def test_admin_post_list(self):
+        """Список постов в админке не читает автора, группу и список
+        групп для каждой строки."""
+        groups = [
+            Group.objects.create(title=f'Группа {number}',
+                                 slug=f'group-{number}', description='')
+            for number in range(3)
+        ]
+        for number in range(8):
+            author = User.objects.create_user(username=f'writer{number}')
+            Post.objects.create(author=author, group=groups[number % 3],
+                                text=f'Пост {number}')
+        admin = User.objects.create_superuser('admin', 'admin@example.com',
+                                              'password')
+        self.client.force_login(admin)
+        with self.assertQueryBudget():
+            response = self.client.get(
+                reverse('admin:posts_post_changelist')
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Группа 2', count=9)
+
+    @override_settings(FEED_PULL_THRESHOLD=2)
+    def test_follow_index_budget_with_pulled_authors(self):
+        """Лента подписок выполняет сверх бюджета ровно по запросу на
+        популярного автора, которого читают при запросе.
+        """
+        fan = User.objects.create_user(username='fan')
+        for number in range(8):
+            author = User.objects.create_user(username=f'star{number}')
+            Follow.objects.create(user=self.reader, author=author)
+            if number < 6:
+                Follow.objects.create(user=fan, author=author)
+            for _ in range(2):
+                Post.objects.create(author=author, text=f'Пост {number}')
+        address = reverse('posts:follow_index')
+        with self.assertQueryBudget('posts:follow_index', expected=6):
+            response = self.reader_client.get(address)
+        self.assertEqual(response.status_code, 200)
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 10)
+        with self.assertQueryBudget('posts:follow_index', expected=6):
+            response = self.reader_client.get(
+                address, {'cursor': next_cursor(page_obj)}
+            )
+        self.assertEqual(len(response.context['page_obj']), 6)
+
+    def test_comments_loaded_by_cursor(self):
+        """Длинная ветка комментариев догружается по курсору."""
+        address = reverse('posts:post_detail',
+                          kwargs={'post_id': self.post.pk})
+        first = self.client.get(address).context['comments']
+        self.assertTrue(first.has_next())
+        with self.assertNumQueries(2):
+            rest = self.client.get(
+                address, {'comments': next_cursor(first)}
+            ).context['comments']
+        self.assertEqual(len(rest), self.COUNT_COMMENTS - 50)
+        self.assertFalse(rest.has_next())
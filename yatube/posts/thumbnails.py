@@ -0,0 +1,218 @@
+"""Фоновое создание миниатюр картинок постов.
+
+Все варианты картинки (см. variants) создаются в пуле процессов сразу
+после сохранения поста, а не при первом показе страницы в том воркере,
+которому повезло её отрисовать. Пока основной миниатюры нет, шаблоны
+показывают заглушку (см. posts.templatetags.post_images).
+
+Задание на картинку ставится одно на все процессы: schedule занимает
+ключ в общем кэше (cache.add), а снимает его после создания миниатюр.
+Если создание упало, ключ истекает через PENDING_TIMEOUT секунд, и
+только тогда страница поставит задание снова.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from core import metrics
+from core.caching import bump_generations
+from core.queries import untracked
+from core.timing import timed
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import close_old_connections
+from PIL import Image
+from sorl.thumbnail import base, default, get_thumbnail
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import cache
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+PENDING_KEY = 'thumbnails:pending:{}'
+PENDING_TIMEOUT = 10 * 60
+
+FALLBACK_FORMAT = 'JPEG'
+
+base.EXTENSIONS.setdefault('AVIF', 'avif')
+
+
+class ThumbnailBackend(base.ThumbnailBackend):
+    @timed('thumbnail')
+    def get_thumbnail(self, file_, geometry_string, **options):
+        return super().get_thumbnail(file_, geometry_string, **options)
+
+    @timed('thumbnail')
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        """Готовая миниатюра из KV-хранилища или None; сама не создаёт."""
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+def image_formats():
+    """Форматы из POST_IMAGE_FORMATS, которые умеет записывать Pillow.
+
+    Запасной JPEG всегда последний.
+    """
+    Image.init()
+    formats = [
+        format_ for format_ in settings.POST_IMAGE_FORMATS
+        if format_ != FALLBACK_FORMAT and format_ in Image.SAVE
+    ]
+    return formats + [FALLBACK_FORMAT]
+
+
+def mime_type(format_):
+    """MIME-тип формата Pillow для <source type="...">."""
+    Image.init()
+    return Image.MIME.get(format_) or f'image/{format_.lower()}'
+
+
+def variants():
+    """Все варианты картинки поста: (формат, ширина, geometry, options)."""
+    size_width, size_height = settings.POST_IMAGE_SIZE
+    for format_ in image_formats():
+        options = {
+            'crop': 'center',
+            'upscale': True,
+            'format': format_,
+            'quality': settings.POST_IMAGE_FORMATS.get(format_, 80),
+        }
+        for width in settings.POST_IMAGE_WIDTHS:
+            height = round(width * size_height / size_width)
+            yield format_, width, f'{width}x{height}', options
+
+
+def _storage():
+    from .models import Post
+
+    return Post._meta.get_field('image').storage
+
+
+def release(name):
+    """Снимает ссылку поста на картинку name.
+
+    Когда ссылок не осталось, хранилище удаляет файл, а вместе с ним
+    удаляются и миниатюры.
+    """
+    storage = _storage()
+    try:
+        storage.delete(name)
+        if not storage.exists(name):
+            default.backend.delete(ImageFile(name, storage),
+                                   delete_file=False)
+    except SuspiciousFileOperation:
+        logger.warning('Картинка %s вне MEDIA_ROOT', name)
+
+
+def _setup_worker():
+    import django
+    django.setup()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_setup_worker,
+        )
+    return _executor
+
+
+def generate(name):
+    """Создаёт все варианты картинки name.
+
+    Если что-то было создано, сбрасывает кэш страниц с этой картинкой,
+    чтобы вместо заглушки появилась миниатюра.
+    """
+    from .models import Post
+
+    close_old_connections()
+    try:
+        source = ImageFile(name, _storage())
+        created = False
+        for _, _, geometry, options in variants():
+            if default.backend.get_ready_thumbnail(source, geometry,
+                                                   **options):
+                continue
+            get_thumbnail(source, geometry, **options)
+            metrics.inc('yatube_thumbnails_generated_total',
+                        format=options['format'])
+            created = True
+        if created:
+            # Картинка может быть общей у многих постов: каждую область
+            # сбрасываем один раз.
+            scopes = set()
+            posts = Post.objects.filter(image=name).select_related(
+                'author', 'group'
+            )
+            for post in posts.iterator():
+                scopes.update(cache.post_scopes(post))
+            bump_generations(*scopes)
+            metrics.flush()
+    finally:
+        close_old_connections()
+
+
+def _claim(name):
+    return caches['default'].add(PENDING_KEY.format(name), True,
+                                 PENDING_TIMEOUT)
+
+
+def _unclaim(name):
+    caches['default'].delete(PENDING_KEY.format(name))
+
+
+def _done(name, future):
+    with _lock:
+        _pending.discard(name)
+    if future.exception() is not None:
+        logger.error('Не удалось создать миниатюры %s', name,
+                     exc_info=future.exception())
+    else:
+        _unclaim(name)
+
+
+def schedule(name):
+    """Ставит создание миниатюр в очередь пула процессов, если его ещё
+    не поставил этот или другой процесс.
+
+    При THUMBNAIL_WORKERS = 0 миниатюры создаются сразу, в текущем
+    процессе.
+    """
+    if not name or name in _pending or not _claim(name):
+        return
+    try:
+        if not _storage().exists(name):
+            return
+    except SuspiciousFileOperation:
+        logger.warning('Картинка %s вне MEDIA_ROOT', name)
+        return
+    if not settings.THUMBNAIL_WORKERS:
+        with untracked():
+            generate(name)
+        _unclaim(name)
+        return
+    with _lock:
+        _pending.add(name)
+        future = _get_executor().submit(generate, name)
+    future.add_done_callback(lambda future: _done(name, future))
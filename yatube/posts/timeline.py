@@ -0,0 +1,177 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Лента пользователя хранится в TimelineEntry и пополняется при публикации
+поста, а не собирается join'ом по подпискам при каждом запросе. Посты
+популярных авторов (AuthorCounter.feed_pulled) в ленты не
+раскладываются, их читает posts.feed.
+
+Автор становится популярным, когда подписчиков набирается
+FEED_PULL_THRESHOLD, и перестаёт им быть, только когда их становится
+меньше FEED_PUSH_THRESHOLD: автор у порога не переключается туда и
+обратно с каждой подпиской. При возврате в push его посты раскладываются
+по лентам всех подписчиков (unpull), чтобы они не пропали из лент; это
+дорого, и разрыв между порогами не даёт повторять это подписками и
+отписками одного пользователя. После изменения порогов или исправления
+счётчиков подписчиков ленты нужно пересобрать командой
+backfill_timeline.
+"""
+from core.utils import bulk_batch_size
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import AuthorCounter, Follow, Post, TimelineEntry
+
+BATCH_SIZE = 1000
+# Пользователей в одном INSERT ... SELECT при пересборке; ограничено
+# числом параметров запроса в SQLite.
+REBUILD_USERS = 500
+
+
+def _push_threshold():
+    threshold = settings.FEED_PUSH_THRESHOLD
+    if threshold is None:
+        return settings.FEED_PULL_THRESHOLD
+    return min(threshold, settings.FEED_PULL_THRESHOLD)
+
+
+def pulled_follows(follows):
+    """Подписки на авторов, чьи посты читаются при запросе."""
+    if settings.FEED_PULL_THRESHOLD is None:
+        return follows.none()
+    return follows.filter(author__counter__feed_pulled=True)
+
+
+def _pushed_follows(follows):
+    if settings.FEED_PULL_THRESHOLD is None:
+        return follows
+    return follows.exclude(author__counter__feed_pulled=True)
+
+
+def reset_modes():
+    """Выбирает pull или push для всех авторов заново по числу
+    подписчиков и FEED_PULL_THRESHOLD."""
+    threshold = settings.FEED_PULL_THRESHOLD
+    if threshold is None:
+        AuthorCounter.objects.filter(feed_pulled=True).update(
+            feed_pulled=False
+        )
+        return
+    AuthorCounter.objects.filter(
+        follower_count__gte=threshold, feed_pulled=False
+    ).update(feed_pulled=True)
+    AuthorCounter.objects.filter(
+        follower_count__lt=threshold, feed_pulled=True
+    ).update(feed_pulled=False)
+
+
+def _entries(user_ids, posts):
+    return [
+        TimelineEntry(user_id=user_id, post_id=post.pk,
+                      author_id=post.author_id, pub_date=post.pub_date)
+        for user_id in user_ids
+        for post in posts
+    ]
+
+
+def _insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries,
+        batch_size=bulk_batch_size(TimelineEntry, BATCH_SIZE, entries),
+        ignore_conflicts=True,
+    )
+
+
+def push_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    with transaction.atomic():
+        # Блокировка счётчика: отписка, которая вернёт автора в push,
+        # дождётся этой транзакции и разложит пост сама (unpull).
+        pulled = AuthorCounter.objects.select_for_update().filter(
+            user_id=post.author_id
+        ).values_list('feed_pulled', flat=True).first()
+        if pulled and settings.FEED_PULL_THRESHOLD is not None:
+            return
+        user_ids = Follow.objects.filter(
+            author_id=post.author_id
+        ).values_list('user_id', flat=True)
+        _insert(_entries(user_ids.iterator(), [post]))
+
+
+def add_author(user_id, author_id, followers):
+    """Добавляет в ленту пользователя все посты нового автора; автор,
+    набравший FEED_PULL_THRESHOLD подписчиков, переходит в pull."""
+    threshold = settings.FEED_PULL_THRESHOLD
+    if threshold is not None:
+        counter = AuthorCounter.objects.filter(user_id=author_id)
+        if followers >= threshold:
+            counter.filter(feed_pulled=False).update(feed_pulled=True)
+            return
+        if counter.filter(feed_pulled=True).exists():
+            return
+    posts = Post.objects.filter(author_id=author_id).only(
+        'pk', 'author_id', 'pub_date'
+    ).order_by()
+    _insert(_entries([user_id], posts.iterator()))
+
+
+def remove_author(user_id, author_id):
+    """Убирает из ленты пользователя посты автора после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 author_id=author_id).delete()
+
+
+def unpull(author_id, followers):
+    """Возвращает автора в push, если после отписки у него меньше
+    FEED_PUSH_THRESHOLD подписчиков, и раскладывает его посты по лентам
+    подписчиков: иначе посты, не попавшие в ленты при публикации,
+    пропали бы из них.
+    """
+    if (settings.FEED_PULL_THRESHOLD is None
+            or followers >= _push_threshold()):
+        return
+    if AuthorCounter.objects.filter(
+            user_id=author_id, feed_pulled=True
+    ).update(feed_pulled=False):
+        _rebuild(Follow.objects.filter(author_id=author_id))
+
+
+def rebuild(user_ids=None):
+    """Пересобирает ленты с нуля по текущим подпискам; без user_ids —
+    все ленты, заново выбрав pull или push для авторов (reset_modes).
+
+    Записи вставляются одним INSERT ... SELECT на пачку пользователей,
+    без загрузки постов в Python.
+    """
+    if user_ids is None:
+        reset_modes()
+        TimelineEntry.objects.all().delete()
+        return _rebuild(Follow.objects.all())
+    user_ids = list(user_ids)
+    count = 0
+    for start in range(0, len(user_ids), REBUILD_USERS):
+        chunk = user_ids[start:start + REBUILD_USERS]
+        TimelineEntry.objects.filter(user_id__in=chunk).delete()
+        count += _rebuild(Follow.objects.filter(user_id__in=chunk))
+    return count
+
+
+def _rebuild(follows):
+    pushed = _pushed_follows(follows).order_by()
+    posts = Post.objects.filter(author__following__in=pushed).order_by()
+    sql, params = posts.values_list(
+        'author__following__user_id', 'pk', 'author_id', 'pub_date'
+    ).query.sql_with_params()
+    meta = TimelineEntry._meta
+    columns = ', '.join(
+        connection.ops.quote_name(meta.get_field(name).column)
+        for name in ('user', 'post', 'author', 'pub_date')
+    )
+    # Записи, оставшиеся с тех пор, как автор был ниже порога, не мешают.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{connection.ops.insert_statement(ignore_conflicts=True)} '
+            f'{connection.ops.quote_name(meta.db_table)} ({columns}) {sql} '
+            f'{connection.ops.ignore_conflicts_suffix_sql(True)}',
+            params,
+        )
+    return follows.count()
@@ -0,0 +1,161 @@
+"""Загрузка картинок поста по частям с докачкой.
+
+Клиент создаёт загрузку (create), затем шлёт куски с заголовком
+Content-Range. Каждый кусок пишется прямо на своё место во временном
+файле в UPLOAD_STAGING_ROOT, поэтому собирать файл в конце не нужно, а
+в памяти держится только буфер чтения. Если соединение оборвалось
+посреди куска, принятые байты сохраняются, и клиент продолжает с
+offset, который вернёт GET. Готовый файл прикрепляется к посту полем
+upload формы создания или редактирования (см. attach).
+
+Загрузки, которые не обновлялись UPLOAD_STAGING_TTL секунд, удаляются
+при создании новых и командой clean_uploads. Одновременно у пользователя
+может быть не больше UPLOAD_STAGING_PER_USER загрузок, дальше create
+отказывает, пока старые не прикреплены, не удалены или не устарели.
+"""
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ChunkedUpload, User
+
+READ_SIZE = 64 * 1024
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+CLEAN_BATCH_SIZE = 100
+
+
+class UploadError(Exception):
+    """Кусок нельзя принять; status — код ответа для клиента."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class StagedFile(UploadedFile):
+    """Собранная загрузка в виде файла формы."""
+
+    def __init__(self, upload):
+        super().__init__(
+            open(staging_path(upload), 'rb'), upload.filename,
+            upload.content_type, upload.size,
+        )
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def staging_path(upload):
+    return os.path.join(settings.UPLOAD_STAGING_ROOT, f'{upload.pk.hex}.part')
+
+
+def create(user, filename, size, content_type=''):
+    if size <= 0 or size > settings.FILE_UPLOAD_MAX_SIZE:
+        raise UploadError('Недопустимый размер файла.', status=413)
+    clean_stale(CLEAN_BATCH_SIZE)
+    os.makedirs(settings.UPLOAD_STAGING_ROOT, exist_ok=True)
+    with transaction.atomic():
+        # Блокировка строки пользователя: параллельные create не обойдут
+        # ограничение.
+        User.objects.select_for_update().filter(pk=user.pk).exists()
+        if (user.chunked_uploads.count()
+                >= settings.UPLOAD_STAGING_PER_USER):
+            raise UploadError('Слишком много незавершённых загрузок.',
+                              status=429)
+        upload = ChunkedUpload.objects.create(
+            user=user,
+            filename=os.path.basename(filename)[:255],
+            content_type=content_type[:100],
+            size=size,
+        )
+    open(staging_path(upload), 'wb').close()
+    return upload
+
+
+def parse_content_range(header, upload):
+    match = CONTENT_RANGE.match(header or '')
+    if not match:
+        raise UploadError('Нужен заголовок Content-Range: bytes a-b/size.')
+    start, end, total = map(int, match.groups())
+    if total != upload.size or start > end or end >= total:
+        raise UploadError('Content-Range не совпадает с загрузкой.',
+                          status=416)
+    return start, end
+
+
+def write_chunk(upload, stream, start, end):
+    """Пишет байты start..end из stream и возвращает новый offset.
+
+    Кусок может перекрывать уже принятые байты (повтор после обрыва),
+    но не может начинаться дальше offset.
+    """
+    if start > upload.offset:
+        raise UploadError(
+            f'Ожидается кусок с байта {upload.offset}.', status=409
+        )
+    position = start
+    with open(staging_path(upload), 'r+b') as staged:
+        staged.seek(start)
+        remaining = end - start + 1
+        while remaining:
+            data = stream.read(min(READ_SIZE, remaining))
+            if not data:
+                break
+            staged.write(data)
+            position += len(data)
+            remaining -= len(data)
+    # Если соединение оборвалось посреди куска, принятое сохраняется.
+    if position > upload.offset:
+        upload.offset = position
+    upload.save(update_fields=['offset', 'updated'])
+    return upload.offset
+
+
+def discard(upload):
+    try:
+        os.remove(staging_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def clean_stale(limit=None):
+    """Удаляет устаревшие загрузки и их файлы; возвращает их число."""
+    cutoff = timezone.now() - timedelta(seconds=settings.UPLOAD_STAGING_TTL)
+    stale = ChunkedUpload.objects.filter(updated__lt=cutoff).order_by(
+        'updated'
+    )
+    if limit is not None:
+        stale = stale[:limit]
+    count = 0
+    for upload in stale:
+        discard(upload)
+        count += 1
+    return count
+
+
+def attach(request):
+    """Файлы формы поста с завершённой загрузкой из поля upload.
+
+    Возвращает (files, upload, error); upload равен None, если поле не
+    задано или загрузку прикрепить нельзя, error — текст ошибки для поля
+    картинки формы.
+    """
+    upload_id = request.POST.get('upload')
+    if request.method != 'POST' or not upload_id:
+        return request.FILES, None, None
+    try:
+        upload = ChunkedUpload.objects.get(pk=upload_id, user=request.user)
+    except (ChunkedUpload.DoesNotExist, ValidationError):
+        return request.FILES, None, 'Загрузка не найдена.'
+    if not upload.complete:
+        return request.FILES, None, 'Загрузка не завершена.'
+    files = request.FILES.copy()
+    files['image'] = StagedFile(upload)
+    return files, upload, None
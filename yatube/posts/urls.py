@@ -18,4 +18,7 @@ urlpatterns = [
          views.profile_follow, name='profile_follow'),
     path('profile/<str:username>/unfollow/',
          views.profile_unfollow, name='profile_unfollow'),
+    path('uploads/', views.upload_create, name='upload_create'),
+    path('uploads/<uuid:upload_id>/',
+         views.upload_detail, name='upload_detail'),
 ]
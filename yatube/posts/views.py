@@ -1,13 +1,25 @@
-from core.utils import page
+from core.caching import cache_page_versioned
+from core.queries import expect_queries
+from core.utils import CursorPaginator, page
 from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.urls import reverse
+from django.views.decorators.http import require_POST
 
+from . import cache, uploads
+from .feed import FEED_KEY, MergedFeed, follow_feed
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import ChunkedUpload, Follow, Group, Post, User
 
 
-@cache_page(20, key_prefix='index_page')
+PAGE_CACHE_TIMEOUT = 60 * 60
+PAGE_CACHE_STALE = 5 * 60
+COUNT_COMMENTS = 50
+
+
+@cache_page_versioned(PAGE_CACHE_TIMEOUT, 'index_page',
+                      lambda: [cache.INDEX], stale=PAGE_CACHE_STALE)
 def index(request):
     post_list = Post.objects.select_related('author', 'group')
     page_obj = page(request, post_list)
@@ -17,9 +29,12 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@cache_page_versioned(PAGE_CACHE_TIMEOUT, 'group_page',
+                      lambda slug: [cache.group_scope(slug)],
+                      stale=PAGE_CACHE_STALE)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.group_posts.all()
+    post_list = group.group_posts.select_related('author')
     page_obj = page(request, post_list)
     context = {
         'group': group,
@@ -28,9 +43,13 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_page_versioned(PAGE_CACHE_TIMEOUT, 'profile_page',
+                      lambda username: [cache.author_scope(username),
+                                        cache.GROUPS],
+                      stale=PAGE_CACHE_STALE)
 def profile(request, username):
-    author = User.objects.get(username=username)
-    post_list = author.user_posts.all()
+    author = User.objects.select_related('counter').get(username=username)
+    post_list = author.user_posts.select_related('group')
     page_obj = page(request, post_list)
     if request.user.is_authenticated:
         if request.user.follower.filter(author=author).exists():
@@ -50,9 +69,18 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+def comments_page(request, post):
+    comments = post.comments.select_related('author')
+    return CursorPaginator(
+        comments, COUNT_COMMENTS, date_field='created'
+    ).get_page(request.GET.get('comments'))
+
+
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__counter', 'group'), pk=post_id
+    )
+    comments = comments_page(request, post)
     form = CommentForm(request.POST or None)
     context = {
         'post': post,
@@ -65,15 +93,19 @@ def post_detail(request, post_id):
 @login_required
 def post_create(request):
     template = 'posts/create_post.html'
+    files, upload, upload_error = uploads.attach(request)
     form = PostForm(
         request.POST or None,
-        files=request.FILES or None,
+        files=files or None,
+        upload_error=upload_error,
     )
     if request.method == 'POST':
         if form.is_valid():
             post_new = form.save(commit=False)
             post_new.author = request.user
             post_new.save()
+            if upload is not None:
+                uploads.discard(upload)
             return redirect('posts:profile', username=request.user.username)
         return render(request, template, {'form': form})
     return render(request, template, {'form': PostForm()})
@@ -81,13 +113,17 @@ def post_create(request):
 
 def post_edit(request, post_id):
     template = 'posts/post_detail.html'
-    post = Post.objects.get(pk=post_id)
+    post = Post.objects.select_related('author__counter', 'group').get(
+        pk=post_id
+    )
     if request.user == post.author:
         is_edit = 1
+        files, upload, upload_error = uploads.attach(request)
         form = PostForm(
             request.POST or None,
-            files=request.FILES or None,
-            instance=post
+            files=files or None,
+            instance=post,
+            upload_error=upload_error,
         )
         if request.method != 'POST':
             return render(request, 'posts/create_post.html', {
@@ -97,12 +133,14 @@ def post_edit(request, post_id):
             })
         if form.is_valid():
             form.save()
+            if upload is not None:
+                uploads.discard(upload)
             return redirect('posts:post_detail', post_id=post_id)
         return render(request, template, {
             'post': post,
             'is_edit': is_edit,
         })
-    comments = post.comments.all()
+    comments = comments_page(request, post)
     form = CommentForm(request.POST or None)
     context = {
         'post': post,
@@ -127,8 +165,11 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     if request.user.follower.all().exists():
-        post_list = Post.objects.filter(author__following__user=request.user)
-        page_obj = page(request, post_list)
+        feed = follow_feed(request.user)
+        if isinstance(feed, MergedFeed):
+            # Запрос на каждого популярного автора.
+            expect_queries(request, len(feed.querysets) - 1)
+        page_obj = page(request, feed, **FEED_KEY)
         context = {
             'page_obj': page_obj,
         }
@@ -154,3 +195,58 @@ def profile_unfollow(request, username):
     author = User.objects.get(username=username)
     Follow.objects.get(user=request.user, author=author).delete()
     return redirect('posts:profile', username=username)
+
+
+def _upload_state(upload):
+    return {
+        'id': str(upload.pk),
+        'size': upload.size,
+        'offset': upload.offset,
+        'complete': upload.complete,
+    }
+
+
+@login_required
+@require_POST
+def upload_create(request):
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Нужен размер файла size.'},
+                            status=400)
+    try:
+        upload = uploads.create(
+            request.user,
+            request.POST.get('filename') or 'image',
+            size,
+            request.POST.get('content_type', ''),
+        )
+    except uploads.UploadError as error:
+        return JsonResponse({'error': str(error)}, status=error.status)
+    response = JsonResponse(_upload_state(upload), status=201)
+    response['Location'] = reverse('posts:upload_detail',
+                                   kwargs={'upload_id': upload.pk})
+    return response
+
+
+@login_required
+def upload_detail(request, upload_id):
+    upload = get_object_or_404(ChunkedUpload, pk=upload_id,
+                               user=request.user)
+    if request.method == 'GET':
+        return JsonResponse(_upload_state(upload))
+    if request.method == 'DELETE':
+        uploads.discard(upload)
+        return HttpResponse(status=204)
+    if request.method != 'PUT':
+        return HttpResponseNotAllowed(['GET', 'PUT', 'DELETE'])
+    try:
+        start, end = uploads.parse_content_range(
+            request.META.get('HTTP_CONTENT_RANGE'), upload
+        )
+        uploads.write_chunk(upload, request, start, end)
+    except uploads.UploadError as error:
+        state = _upload_state(upload)
+        state['error'] = str(error)
+        return JsonResponse(state, status=error.status)
+    return JsonResponse(_upload_state(upload))
@@ -51,6 +51,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.timing.ServerTimingMiddleware',
+    'core.queries.QueryBudgetMiddleware',
+    'core.slow_queries.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,6 +61,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -148,10 +152,123 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки пишутся на диск кусками и обрываются на FILE_UPLOAD_MAX_SIZE
+# байтах (см. core.uploads).
+FILE_UPLOAD_HANDLERS = ['core.uploads.BoundedUploadHandler']
+FILE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+
+# Загрузки по частям (см. posts.uploads): каталог недокачанных файлов,
+# время, через которое брошенная загрузка удаляется, и сколько загрузок
+# может быть у пользователя одновременно.
+UPLOAD_STAGING_ROOT = os.path.join(BASE_DIR, 'uploads')
+UPLOAD_STAGING_TTL = 24 * 60 * 60
+UPLOAD_STAGING_PER_USER = 5
+
+# LRU в памяти процесса перед общим для всех воркеров кэшем в файле
+# SQLite (см. core.cache_backends).
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backends.tiered.TieredCache',
+        'OPTIONS': {
+            'L2': 'shared',
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 5,
+            'STAMP_INTERVAL': 1,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache_backends.sqlite.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
     }
 }
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+THUMBNAIL_BACKEND = 'posts.thumbnails.ThumbnailBackend'
+
+# Варианты картинки поста, которые создаются в фоне сразу после
+# сохранения: каждая ширина из POST_IMAGE_WIDTHS в каждом формате из
+# POST_IMAGE_FORMATS (формат: качество), который умеет записывать Pillow.
+# JPEG — запасной формат, он создаётся всегда.
+POST_IMAGE_SIZE = (960, 339)
+POST_IMAGE_WIDTHS = [480, 960, 1440]
+POST_IMAGE_FORMATS = {'AVIF': 50, 'WEBP': 75, 'JPEG': 80}
+
+# Картинки больше POST_IMAGE_MAX_PIXELS отклоняются по заголовку, не
+# распаковываясь; стороны больше POST_IMAGE_MAX_SIDE уменьшаются при
+# загрузке.
+POST_IMAGE_MAX_PIXELS = 40_000_000
+POST_IMAGE_MAX_SIDE = 2560
+
+# Процессов в пуле создания миниатюр; 0 — создавать сразу в запросе.
+THUMBNAIL_WORKERS = 2
+
+# Авторы, набравшие FEED_PULL_THRESHOLD подписчиков, читаются в ленту при
+# запросе (pull), остальные раскладываются по лентам при публикации
+# (push). В push автор возвращается, когда подписчиков меньше
+# FEED_PUSH_THRESHOLD (None — тот же порог). FEED_PULL_THRESHOLD = None —
+# только push. После изменения — backfill_timeline.
+FEED_PULL_THRESHOLD = 1000
+FEED_PUSH_THRESHOLD = 800
+
+# Наибольшее число SQL-запросов на страницу по имени URL и число
+# повторов одного запроса, после которого он считается N+1 (см.
+# core.queries). При отладке проверяется каждый запрос и нарушение
+# поднимает исключение, в работе — каждый сотый и пишется в лог.
+QUERY_BUDGETS = {
+    'posts:index': 4,
+    'posts:group_list': 5,
+    'posts:profile': 6,
+    'posts:post_detail': 4,
+    # Плюс запрос на каждого популярного автора в подписках (см.
+    # posts.feed).
+    'posts:follow_index': 8,
+}
+QUERY_REPEAT_THRESHOLD = 5
+# Хранилище ключей sorl-thumbnail читается из базы только при промахе
+# кэша, по запросу на вариант картинки; такие запросы не считаются.
+QUERY_BUDGET_IGNORE = ('thumbnail_kvstore',)
+QUERY_BUDGET_SAMPLE_RATE = 1 if DEBUG else 0.01
+QUERY_BUDGET_RAISE = DEBUG
+
+# Время SQL, шаблонов, кэша и миниатюр в заголовке Server-Timing (только
+# при отладке: заголовок раскрывает устройство сайта) и в функциях
+# SERVER_TIMING_SINKS(request, response, timings), см. core.timing.
+SERVER_TIMING_HEADER = DEBUG
+SERVER_TIMING_SINKS = ['core.metrics.record_request']
+
+# Метрики Prometheus на /metrics (см. core.metrics): каталог файлов
+# процессов, период их записи, границы гистограммы времени запроса в
+# секундах и токен, с которым /metrics доступен без входа сотрудника
+# (Authorization: Bearer <токен>; не задан — только сотрудникам).
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+METRICS_FLUSH_INTERVAL = 1
+METRICS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+# Тесты пишут метрики во временный каталог (см. core.testing).
+TEST_RUNNER = 'core.testing.TestRunner'
+
+# Профилирование доли PROFILING_SAMPLE_RATE запросов к страницам
+# PROFILING_URL_NAMES (0 — выключено): 'sampler' — сэмплер стеков раз в
+# PROFILING_INTERVAL секунд, 'cprofile' — cProfile. Профили хранятся в
+# PROFILING_DIR, пока занимают не больше PROFILING_MAX_BYTES; страница
+# admin/profiles/ показывает PROFILING_LIST_SIZE последних и самых
+# медленных (см. core.profiling).
+PROFILING_SAMPLE_RATE = 0
+PROFILING_URL_NAMES = ['posts:follow_index', 'posts:post_detail']
+PROFILING_MODE = 'sampler'
+PROFILING_INTERVAL = 0.005
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILING_MAX_BYTES = 50 * 1024 * 1024
+PROFILING_LIST_SIZE = 20
+
+# Запросы дольше SLOW_QUERY_THRESHOLD секунд (None — не отслеживать)
+# пишутся с планом выполнения в лог и в SLOW_QUERY_LOG; сводка — команда
+# slow_queries (см. core.slow_queries).
+SLOW_QUERY_THRESHOLD = 0.1
+SLOW_QUERY_LOG = os.path.join(BASE_DIR, 'slow_queries.jsonl')
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
@@ -21,6 +21,9 @@ from django.urls import include, path
 
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
+    path('admin/profiles/', views.profiles, name='profiles'),
+    path('admin/profiles/<str:name>', views.profile_file,
+         name='profile_file'),
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
@@ -31,6 +34,10 @@ handler500 = 'core.views.server_error'
 handler403 = 'core.views.permission_denied'
 
 urlpatterns.append(path('500/', views.server_error))
+urlpatterns.append(path('cache/stats/', views.page_cache_stats,
+                        name='page_cache_stats'))
+urlpatterns.append(path('metrics/', views.prometheus_metrics,
+                        name='metrics'))
 
 if settings.DEBUG:
     urlpatterns += static(